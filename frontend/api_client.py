@@ -1,16 +1,72 @@
 # api_client.py
+import json
+import time
 import requests
 
-def upload_pdf(file, upload_url: str):
+def upload_pdf(file, upload_url: str, collection: str = "default"):
     files = {
         "file": (file.name, file, "application/pdf")
     }
-    response = requests.post(upload_url, files=files)
+    response = requests.post(upload_url, files=files, data={"collection": collection})
     response.raise_for_status()
     return response.json()
 
 
-def query_rag(payload: dict, query_url: str):
-    response = requests.post(query_url, json=payload)
+def get_job(job_id: str, jobs_url: str):
+    response = requests.get(f"{jobs_url}/{job_id}")
     response.raise_for_status()
     return response.json()
+
+
+def wait_for_job(job_id: str, jobs_url: str, on_progress=None, poll_interval: float = 1.0, timeout: float = 600):
+    """Poll an ingestion job until it completes or fails"""
+    deadline = time.time() + timeout
+    while True:
+        job = get_job(job_id, jobs_url)
+        if on_progress:
+            on_progress(job)
+        if job["status"] == "completed":
+            return job
+        if job["status"] == "failed":
+            raise RuntimeError(job.get("error") or "Ingestion failed")
+        if time.time() > deadline:
+            raise TimeoutError(f"Ingestion of {job['filename']} is still {job['status']}")
+        time.sleep(poll_interval)
+
+
+def query_rag(payload: dict, query_url: str, on_token=None):
+    """
+    Ask a question through the streaming endpoint.
+
+    on_token(text_so_far) is called as answer tokens arrive; the return value
+    has the same shape as the non-streaming /query response, plus metrics.
+    """
+    result = {"query": payload["query"], "answer": "", "sources": []}
+    for event, data in _iter_events(payload, query_url):
+        if event == "sources":
+            result["sources"] = data["sources"]
+        elif event == "token":
+            result["answer"] += data["text"]
+            if on_token:
+                on_token(result["answer"])
+        elif event == "done":
+            result["answer"] = data["answer"]
+            result["metrics"] = data["metrics"]
+        elif event == "error":
+            raise RuntimeError(data["detail"])
+    return result
+
+
+def _iter_events(payload: dict, stream_url: str):
+    """Yield (event, data) pairs from a Server-Sent Events response"""
+    with requests.post(stream_url, json=payload, stream=True) as response:
+        response.raise_for_status()
+        event, data = None, []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data.append(line[len("data:"):].strip())
+            elif not line and event:
+                yield event, json.loads("\n".join(data))
+                event, data = None, []
@@ -1,8 +1,8 @@
 # app.py
 import streamlit as st
-from api_client import upload_pdf, query_rag
+from api_client import upload_pdf, wait_for_job, query_rag
 from components import render_chat, render_sources
-from config import UPLOAD_ENDPOINT, QUERY_ENDPOINT
+from config import UPLOAD_ENDPOINT, JOBS_ENDPOINT, QUERY_ENDPOINT
 
 st.set_page_config(page_title="PDF QA Chatbot", layout="wide")
 
@@ -23,6 +23,8 @@ if "uploaded_files" not in st.session_state:
 with st.sidebar:
     st.header("📄 Upload PDFs")
 
+    collection = st.text_input("Collection", value="default")
+
     uploaded_file = st.file_uploader(
         "Upload a PDF",
         type=["pdf"],
@@ -32,8 +34,18 @@ with st.sidebar:
     if uploaded_file and st.button("Upload"):
         with st.spinner("Uploading and processing PDF..."):
             try:
-                response = upload_pdf(uploaded_file, UPLOAD_ENDPOINT)
-                st.success(response["message"])
+                job = upload_pdf(uploaded_file, UPLOAD_ENDPOINT, collection)
+                progress = st.empty()
+                job = wait_for_job(
+                    job["job_id"],
+                    JOBS_ENDPOINT,
+                    on_progress=lambda j: progress.caption(
+                        f"{j['status']}: {j['pages_parsed']} pages parsed, "
+                        f"{j['chunks_embedded']}/{j['chunks_total']} chunks embedded"
+                    )
+                )
+                progress.empty()
+                st.success(f"Successfully processed {job['chunks_indexed']} chunks from {job['filename']}")
                 st.session_state.uploaded_files.append(uploaded_file.name)
             except Exception as e:
                 st.error(str(e))
@@ -62,10 +74,13 @@ if query:
             payload = {
                 "query": query,
                 "conversation_history": st.session_state.chat_history[:-1],
-                "top_k": 3
+                "top_k": 3,
+                "collections": [collection]
             }
 
-            response = query_rag(payload, QUERY_ENDPOINT)
+            # Show the answer as it streams in
+            placeholder = st.chat_message("assistant").empty()
+            response = query_rag(payload, QUERY_ENDPOINT, on_token=placeholder.write)
 
             # Assistant message
             st.session_state.chat_history.append({
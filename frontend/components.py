@@ -15,9 +15,12 @@ def render_sources(sources):
 
     with st.expander("📄 Sources"):
         for i, src in enumerate(sources, 1):
+            page = src.get("page_number", "N/A")
+            if src.get("page_end") and src["page_end"] != page:
+                page = f"{page}-{src['page_end']}"
             st.markdown(
                 f"""
-**Source {i} (Page {src.get("page_number", "N/A")})**  
+**Source {i} (Page {page})**  
 Score: `{src["score"]:.4f}`  
 
 {src["content"]}
@@ -2,4 +2,5 @@
 
 BACKEND_BASE_URL = "http://localhost:8000"
 UPLOAD_ENDPOINT = f"{BACKEND_BASE_URL}/api/v1/document/upload"
-QUERY_ENDPOINT = f"{BACKEND_BASE_URL}/api/v1/message/query"
\ No newline at end of file
+JOBS_ENDPOINT = f"{BACKEND_BASE_URL}/api/v1/document/jobs"
+QUERY_ENDPOINT = f"{BACKEND_BASE_URL}/api/v1/message/query/stream"
\ No newline at end of file
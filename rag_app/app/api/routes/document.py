@@ -1,9 +1,10 @@
 
-from fastapi import APIRouter, FastAPI, HTTPException, UploadFile, File, status
+import asyncio
+from fastapi import APIRouter, FastAPI, HTTPException, Response, UploadFile, File, Form, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from uuid import UUID
-from typing import List
+from typing import List, Union
 # from app.core.database import get_db
 # from app.models.conversation import Conversation
 # from app.models.message import Message
@@ -13,10 +14,14 @@ from typing import List
 #     ConversationWithMessages
 # )
 import os
-from app.schemas.document import UploadResponse
+from app.schemas.document import CollectionInfo, DocumentDeleted, IngestionJob
 from app.services.document_service import DocumentProcessor
 from app.services.vector_service import vector_store
-from app.services.doc_service import doc_process
+from app.services.ingestion_service import ingestion_service, new_job
+from app.services.answer_cache import answer_cache
+from app.services.llm_provider import llm_provider
+from app.services.collection_service import validate_collection_name
+from app.services.compaction_service import compaction_service
 from app.core.config import get_settings
 
 settings = get_settings()
@@ -30,48 +35,117 @@ settings = get_settings()
 doc_router = APIRouter(prefix="/api/v1/document", tags=["document"])
 
 
-@doc_router.post("/upload", response_model=UploadResponse)
-async def upload_pdf(file: UploadFile = File(...)):
-    """
-    Upload a PDF file, extract text, chunk it, and create embeddings
-    
-    The file will be processed and added to the vector store for querying.
-    """
+def _check_collection(collection: str) -> str:
+    try:
+        return validate_collection_name(collection)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+async def _spool_upload(file: UploadFile, collection: str, filename: str = None, replace: bool = False) -> dict:
+    """Validate an upload, stream it to UPLOAD_DIR and queue an ingestion job for it"""
+    filename = filename or file.filename
     # Validate file type
-    if not file.filename.endswith(settings.FILE_TYPE):
+    if not filename.endswith(settings.FILE_TYPE):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND , detail="Only PDF files are supported")
     
+    job = new_job(filename, collection, replace=replace)
+    path = ingestion_service.spool_path(job["job_id"])
+    await asyncio.to_thread(os.makedirs, settings.UPLOAD_DIR, exist_ok=True)
+    
+    # Copy in 1MB pieces, enforcing the size limit without holding the whole file.
+    # Disk writes run in a thread so a slow disk does not stall the event loop
+    size = 0
+    out = await asyncio.to_thread(open, path, "wb")
     try:
-        # Read file content
-        pdf_content = await file.read()
-        # print(pdf_content)
-        # Validate file size (max 10MB)
-        if len(pdf_content) > settings.MAX_FILE_SIZE:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"File size exceeds Max File size of {settings.MAX_FILE_SIZE} limit")
-        
-        # Process PDF
-        result = await doc_process.process_pdf(pdf_content, file.filename)
-        
-        # Add to vector store
-        total_chunks = vector_store.add_documents(
-            chunks=result["chunks"],
-            embeddings=result["embeddings"],
-            metadata=result["metadata"]
-        )
-        print("VECTOR STORE ID:", id(vector_store))
-
-        return UploadResponse(
-            filename=file.filename,
-            total_chunks=total_chunks,
-            status="success",
-            message=f"Successfully processed {total_chunks} chunks from {file.filename}"
-        )
-        
-    except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error processing PDF: {str(e)}")
+        while True:
+            piece = await file.read(1024 * 1024)
+            if not piece:
+                break
+            size += len(piece)
+            if size > settings.MAX_FILE_SIZE:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"File size exceeds Max File size of {settings.MAX_FILE_SIZE} limit")
+            await asyncio.to_thread(out.write, piece)
+    except BaseException:
+        await asyncio.to_thread(out.close)
+        await asyncio.to_thread(os.remove, path)
+        raise
+    await asyncio.to_thread(out.close)
+    
+    return ingestion_service.submit(job)
+
+
+@doc_router.post("/upload", response_model=IngestionJob, status_code=status.HTTP_202_ACCEPTED)
+async def upload_pdf(file: UploadFile = File(...), collection: str = Form(settings.DEFAULT_COLLECTION)):
+    """
+    Upload a PDF file for ingestion into a collection (created on first use)
+    
+    The file is queued and processed in the background (extract, chunk, embed,
+    index). Poll GET /api/v1/document/jobs/{job_id} for progress.
+    """
+    return IngestionJob(**await _spool_upload(file, _check_collection(collection)))
+
+
+@doc_router.post("/upload/batch", response_model=List[IngestionJob], status_code=status.HTTP_202_ACCEPTED)
+async def upload_pdf_batch(files: List[UploadFile] = File(...), collection: str = Form(settings.DEFAULT_COLLECTION)):
+    """Queue several PDFs at once into one collection; returns one job per file"""
+    collection = _check_collection(collection)
+    return [IngestionJob(**await _spool_upload(file, collection)) for file in files]
+
+
+@doc_router.get("/jobs", response_model=List[IngestionJob])
+async def list_jobs(limit: int = 50):
+    """Most recent ingestion jobs first"""
+    return [IngestionJob(**job) for job in ingestion_service.list_jobs(limit)]
+
+
+@doc_router.get("/jobs/{job_id}", response_model=IngestionJob)
+async def get_job(job_id: str):
+    """Status and progress of an ingestion job"""
+    job = ingestion_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found")
+    return IngestionJob(**job)
+
+
+@doc_router.put("/documents/{filename}", response_model=IngestionJob, status_code=status.HTTP_202_ACCEPTED)
+async def replace_document(filename: str, file: UploadFile = File(...), collection: str = Form(settings.DEFAULT_COLLECTION)):
+    """
+    Upload a new version of a document
+    
+    Once the job completes, the file's previous chunks are replaced in one step;
+    searches never see a mix of both versions.
+    """
+    return IngestionJob(**await _spool_upload(file, _check_collection(collection), filename=filename, replace=True))
+
+
+@doc_router.delete("/documents/{filename}", response_model=Union[IngestionJob, DocumentDeleted])
+async def delete_document(filename: str, response: Response, collection: str = settings.DEFAULT_COLLECTION):
+    """
+    Delete every chunk of a document; space is reclaimed by background compaction
     
+    In reader mode the deletion is queued for the ingest writer and a 202 job is returned.
+    """
+    collection = _check_collection(collection)
+    not_found = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Document {filename} not found in collection {collection}")
+    if vector_store.read_only:
+        if not vector_store.has_document(collection, filename):
+            raise not_found
+        response.status_code = status.HTTP_202_ACCEPTED
+        return IngestionJob(**ingestion_service.submit(new_job(filename, collection, delete=True)))
+    
+    deleted = await asyncio.to_thread(vector_store.delete_document, collection, filename)
+    if not deleted:
+        raise not_found
+    compaction_service.notify()
+    return DocumentDeleted(collection=collection, filename=filename, deleted_chunks=deleted)
+
+
+@doc_router.get("/collections", response_model=List[CollectionInfo])
+async def list_collections():
+    """Collections with their chunk counts and the files they contain"""
+    return [CollectionInfo(**info) for info in vector_store.list_collections()]
+
 stats_router = APIRouter(prefix="/api/v1/statistics", tags=["statistics"])
 @stats_router.get("/stats")
 async def get_stats():
@@ -80,5 +154,7 @@ async def get_stats():
     return {
         "status": "healthy",
         "vector_store": stats,
+        "answer_cache": answer_cache.get_stats(),
+        "llm": llm_provider.get_stats(),
         "openai_configured": bool(os.getenv("OPENAI_API_KEY"))
     }
\ No newline at end of file
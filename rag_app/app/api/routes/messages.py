@@ -12,19 +12,49 @@ from typing import List
 #     ConversationResponse,
 #     ConversationWithMessages
 # )
+import asyncio
 import openai
-from app.schemas.document import UploadResponse
+import json
+import logging
+import time
+from fastapi.responses import StreamingResponse
+from app.core.config import get_settings
 from app.schemas.message import *
 from app.services.rag_service import SimpleRAGService
+from app.services.tokens import count_tokens
 import os
 
 # vector_store = VectorStoreService()
 # doc_processor = DocumentProcessor()
 from app.services.vector_service import vector_store
 
+settings = get_settings()
 rag_service = SimpleRAGService()
+logger = logging.getLogger(__name__)
 
 
+def _to_source(chunk: dict) -> Source:
+    return Source(
+        content=chunk["content"][:200] + "..." if len(chunk["content"]) > 200 else chunk["content"],
+        score=chunk["score"],
+        chunk_id=chunk["chunk_id"],
+        page_number=chunk.get("page_number"),
+        page_end=chunk.get("page_end"),
+        char_start=chunk.get("char_start"),
+        char_end=chunk.get("char_end"),
+        filename=chunk.get("filename"),
+        collection=chunk.get("collection")
+    )
+
+
+def _sse(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _replay(answer: str):
+    """A cached answer, sent as a single token event"""
+    yield answer
 
 
 router = APIRouter(prefix="/api/v1/message", tags=["message"])
@@ -41,40 +71,60 @@ async def query_endpoint(request: QueryRequest):
     }
     """
     try:
-        # Step 0: query rephraser
-        resolved_query = await rag_service._resolve_followup_query(
+        started = time.perf_counter()
+        
+        # Step 0 + 1: rewrite follow-ups and retrieve context, overlapped where possible
+        resolved_query, context_chunks, timings = await rag_service.retrieve_for_turn(
             query=request.query,
-            conversation_history=request.conversation_history or []
+            conversation_history=request.conversation_history or [],
+            top_k=request.top_k,
+            nprobe=request.nprobe,
+            ef_search=request.ef_search,
+            search_mode=request.search_mode,
+            alpha=request.alpha,
+            collections=request.collections,
+            filenames=request.filenames,
+            rerank=request.rerank,
+            mmr_lambda=request.mmr_lambda,
+            rerank_candidates=request.rerank_candidates
         )
         
-        # Step 1: Retrieve relevant context
-        context_chunks = await rag_service.retrieve_context(
-            resolved_query, 
-            top_k=request.top_k
+        # Step 2: Fit chunks and history into the prompt token budget
+        packing_started = time.perf_counter()
+        context_chunks, history, token_counts = rag_service.pack_context(
+            request.query, context_chunks, request.conversation_history or []
         )
+        timings["packing_ms"] = round((time.perf_counter() - packing_started) * 1000, 1)
         
-        print('retrieved chunks', context_chunks)
-        # Step 2: Generate answer with LLM
-        answer = await rag_service.generate_answer(
-            query=request.query,
-            context_chunks=context_chunks,
-            conversation_history=request.conversation_history or []
+        # Step 3: Generate answer with LLM, unless a near-identical question was just answered
+        generation_started = time.perf_counter()
+        # Keyed on the history the prompt actually carries, after packing
+        answer = rag_service.lookup_cached_answer(
+            resolved_query, context_chunks, history
         )
-        print("VECTOR STORE ID: query endpoint", id(vector_store))
+        timings["answer_cache_hit"] = float(answer is not None)
+        if answer is None:
+            answer = await rag_service.generate_answer(
+                query=request.query,
+                context_chunks=context_chunks,
+                conversation_history=history
+            )
+        timings["generation_ms"] = round((time.perf_counter() - generation_started) * 1000, 1)
+        if not timings["answer_cache_hit"]:
+            rag_service.cache_answer(
+                resolved_query, context_chunks, history, answer, timings["generation_ms"]
+            )
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        token_counts["answer"] = count_tokens(answer, settings.LLM_MODEL)
         
-        # Step 3: Return response
+        # Step 4: Return response
         return QueryResponse(
             answer=answer,
-            sources=[
-                Source(
-                    content=chunk["content"][:200] + "..." if len(chunk["content"]) > 200 else chunk["content"],
-                    score=chunk["score"],
-                    chunk_id=chunk["chunk_id"],
-                    page_number=chunk.get("page_number")
-                )
-                for chunk in context_chunks
-            ],
-            query=request.query
+            sources=[_to_source(chunk) for chunk in context_chunks],
+            query=request.query,
+            resolved_query=resolved_query,
+            timings=timings,
+            tokens=token_counts
         )
         
     except openai.APIError as e:
@@ -82,3 +132,190 @@ async def query_endpoint(request: QueryRequest):
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error processing query: {str(e)}")
 
+
+@router.post("/query/stream")
+async def query_stream_endpoint(request: QueryRequest):
+    """
+    Same as /query, but streamed as Server-Sent Events:
+    
+    - `sources`: retrieved chunks, sent as soon as retrieval finishes
+    - `token`: answer text deltas as the model produces them
+    - `done`: the full answer plus timings (per-stage retrieval timings, answer_cache_hit, ttfb_ms, ttft_ms, total_ms)
+      and token counts (prompt budget and usage, chunks packed)
+    - `error`: sent instead of `done` if the request fails mid-stream
+    """
+    started = time.perf_counter()
+    
+    async def events():
+        metrics = {}
+        answer = []
+        try:
+            resolved_query, context_chunks, timings = await rag_service.retrieve_for_turn(
+                query=request.query,
+                conversation_history=request.conversation_history or [],
+                top_k=request.top_k,
+                nprobe=request.nprobe,
+                ef_search=request.ef_search,
+                search_mode=request.search_mode,
+                alpha=request.alpha,
+                collections=request.collections,
+                filenames=request.filenames,
+                rerank=request.rerank,
+                mmr_lambda=request.mmr_lambda,
+                rerank_candidates=request.rerank_candidates
+            )
+            metrics.update(timings)
+            context_chunks, history, token_counts = rag_service.pack_context(
+                request.query, context_chunks, request.conversation_history or []
+            )
+            
+            # First byte: sources go out before generation starts
+            metrics["ttfb_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            yield _sse("sources", {
+                "query": request.query,
+                "resolved_query": resolved_query,
+                "sources": [_to_source(chunk).model_dump() for chunk in context_chunks]
+            })
+            
+            generation_started = time.perf_counter()
+            cached = rag_service.lookup_cached_answer(
+                resolved_query, context_chunks, history
+            )
+            metrics["answer_cache_hit"] = float(cached is not None)
+            if cached is not None:
+                tokens = _replay(cached)
+            else:
+                tokens = rag_service.stream_answer(
+                    query=request.query,
+                    context_chunks=context_chunks,
+                    conversation_history=history
+                )
+            
+            async for token in tokens:
+                if not answer:
+                    metrics["ttft_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                answer.append(token)
+                yield _sse("token", {"text": token})
+            
+            metrics["generation_ms"] = round((time.perf_counter() - generation_started) * 1000, 1)
+            if cached is None:
+                rag_service.cache_answer(
+                    resolved_query, context_chunks, history, "".join(answer), metrics["generation_ms"]
+                )
+            
+            metrics["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            logger.info("query/stream ttfb_ms=%s ttft_ms=%s total_ms=%s", metrics.get("ttfb_ms"), metrics.get("ttft_ms"), metrics["total_ms"])
+            token_counts["answer"] = count_tokens("".join(answer), settings.LLM_MODEL)
+            yield _sse("done", {"answer": "".join(answer), "metrics": metrics, "tokens": token_counts})
+        
+        except openai.APIError as e:
+            yield _sse("error", {"detail": f"OpenAI API error: {str(e)}"})
+        except Exception as e:
+            yield _sse("error", {"detail": f"Error processing query: {str(e)}"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/query/batch")
+async def query_batch_endpoint(request: BatchQueryRequest):
+    """
+    Answer many standalone questions in one call, streamed back as NDJSON.
+    
+    All questions are embedded together and searched as one matrix per
+    collection; answers are then generated with at most
+    BATCH_QUERY_CONCURRENCY in flight. Each line is a BatchQueryResult, sent
+    as its answer completes (so out of order; `index` is the question's
+    position), and the last line is a BatchQuerySummary. A question that
+    fails gets an `error` instead of an answer; the others carry on.
+    """
+    if len(request.queries) > settings.BATCH_QUERY_MAX_QUERIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.BATCH_QUERY_MAX_QUERIES} queries per batch"
+        )
+    started = time.perf_counter()
+    try:
+        # One embeddings pass and one search per collection for the whole batch
+        candidates, batch_timings = await rag_service.retrieve_batch(
+            request.queries,
+            top_k=request.top_k,
+            rerank=request.rerank,
+            mmr_lambda=request.mmr_lambda,
+            rerank_candidates=request.rerank_candidates,
+            nprobe=request.nprobe,
+            ef_search=request.ef_search,
+            search_mode=request.search_mode,
+            alpha=request.alpha,
+            collections=request.collections,
+            filenames=request.filenames
+        )
+    except openai.APIError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"OpenAI API error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error processing query: {str(e)}")
+    
+    semaphore = asyncio.Semaphore(settings.BATCH_QUERY_CONCURRENCY)
+    
+    async def answer_one(position: int, query: str, context_chunks: List[dict]) -> BatchQueryResult:
+        queued = time.perf_counter()
+        async with semaphore:
+            timings = {"queued_ms": round((time.perf_counter() - queued) * 1000, 1)}
+            try:
+                context_chunks, history, token_counts = rag_service.pack_context(query, context_chunks, [])
+                answer = None
+                if request.generate:
+                    generation_started = time.perf_counter()
+                    answer = rag_service.lookup_cached_answer(query, context_chunks, history)
+                    timings["answer_cache_hit"] = float(answer is not None)
+                    if answer is None:
+                        answer = await rag_service.generate_answer(
+                            query=query,
+                            context_chunks=context_chunks,
+                            conversation_history=history
+                        )
+                    timings["generation_ms"] = round((time.perf_counter() - generation_started) * 1000, 1)
+                    if not timings["answer_cache_hit"]:
+                        rag_service.cache_answer(query, context_chunks, history, answer, timings["generation_ms"])
+                    token_counts["answer"] = count_tokens(answer, settings.LLM_MODEL)
+                timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                return BatchQueryResult(
+                    index=position,
+                    query=query,
+                    answer=answer,
+                    sources=[_to_source(chunk) for chunk in context_chunks],
+                    timings=timings,
+                    tokens=token_counts
+                )
+            except openai.APIError as e:
+                return BatchQueryResult(index=position, query=query, timings=timings, error=f"OpenAI API error: {str(e)}")
+            except Exception as e:
+                return BatchQueryResult(index=position, query=query, timings=timings, error=f"Error processing query: {str(e)}")
+    
+    async def lines():
+        tasks = [
+            asyncio.ensure_future(answer_one(position, query, chunks))
+            for position, (query, chunks) in enumerate(zip(request.queries, candidates))
+        ]
+        failed = 0
+        try:
+            for completed in asyncio.as_completed(tasks):
+                result = await completed
+                failed += result.error is not None
+                yield result.model_dump_json() + "\n"
+            batch_timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            logger.info("query/batch queries=%s failed=%s total_ms=%s", len(tasks), failed, batch_timings["total_ms"])
+            yield BatchQuerySummary(queries=len(tasks), failed=failed, timings=batch_timings).model_dump_json() + "\n"
+        finally:
+            # The client went away: stop generating answers nobody will read
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
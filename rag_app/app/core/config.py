@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -11,23 +12,112 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL: str = "text-embedding-3-small"
     EMBEDDING_MODEL_DIM: int = 1536
     LLM_MODEL: str = "gpt-4o"
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100_000  # Tokens per embeddings request
+    EMBEDDING_BATCH_MAX_INPUTS: int = 2048  # Inputs per embeddings request (API limit)
+    EMBEDDING_MAX_CONCURRENCY: int = 4  # Embedding batches in flight at once
+    EMBEDDING_RPM_LIMIT: int = 3000  # Client-side requests-per-minute budget
+    EMBEDDING_TPM_LIMIT: int = 1_000_000  # Client-side tokens-per-minute budget
+    EMBEDDING_MAX_RETRIES: int = 5
+    EMBEDDING_RETRY_BASE_DELAY: float = 1.0  # Seconds, doubled on every retry
+    LLM_BACKEND: str = "openai"  # "openai" or "mock" (deterministic local embeddings / chat for offline load tests)
+    LLM_HTTP2: bool = True  # Multiplex API calls over HTTP/2 when the h2 package is installed
+    LLM_MAX_CONNECTIONS: int = 100  # Shared connection pool size
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_MAX_CONCURRENCY: int = 64  # API calls in flight at once, across all callers
+    LLM_CONNECT_TIMEOUT: float = 5.0  # Seconds
+    LLM_EMBED_TIMEOUT: float = 20.0  # Seconds per embeddings request
+    LLM_CHAT_TIMEOUT: float = 60.0  # Seconds per chat completion
+    LLM_MAX_RETRIES: int = 2  # SDK retries with backoff on 429 / 5xx / connection errors
+    LLM_HEDGE_DELAY: float = 1.0  # Seconds before a slow query embedding / rewrite is sent again; 0 disables hedging
+    MOCK_LLM_LATENCY: float = 0.0  # Seconds added to every mock backend call
     TEMPERATURE : float = 0.1
     MAX_TOKENS: int = 200
+    CONTEXT_TOKEN_BUDGET: int = 6000  # Prompt tokens for answer generation: instructions, history, context and question
+    HISTORY_TOKEN_BUDGET: int = 1000  # Part of the budget conversation history may use; older messages are dropped first
+    CONTEXT_MIN_CHUNK_TOKENS: int = 64  # A chunk trimmed to fit must keep at least this many tokens, else it is dropped
     
     # RAG Configuration
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    CHUNK_MIN_SIZE: int = 250  # A document's last chunk is merged into the previous one when it adds fewer characters
+    PDF_PROCESS_WORKERS: int = 2  # Processes for PDF extraction / chunking; 0 runs them in a thread instead
+    PDF_PAGES_PER_TASK: int = 16  # Pages handed to a worker per task
+    PDF_PREFETCH_TASKS: int = 4  # Page ranges per upload extracted ahead of embedding / indexing
     TOP_K_RETRIEVAL: int = 5
-    HYBRID_SEARCH_ALPHA: float = 0.5
+    HYBRID_SEARCH_ALPHA: float = 0.5  # Weight of dense vs BM25 scores in hybrid search
+    SEARCH_MODE: str = "dense"  # "dense", "lexical" or "hybrid" (opt-in: its fused scores are relative to each collection)
+    HYBRID_FUSION: str = "weighted"  # "weighted" (min-max blended scores) or "rrf"
+    HYBRID_CANDIDATE_MULTIPLIER: int = 4  # Candidates fetched per retriever = top_k * multiplier
+    RRF_K: int = 60
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+    
+    # Reranking
+    RERANK_MODE: str = "mmr"  # "none", "mmr" (diversify over stored vectors) or "cross_encoder" (local model, then MMR)
+    RERANK_CANDIDATES: int = 30  # Candidates over-fetched for the rerank stage
+    RERANK_MMR_LAMBDA: float = 0.7  # MMR trade-off: 1.0 ranks by relevance only, lower values favour diversity
+    RERANK_DUPLICATE_THRESHOLD: float = 0.95  # Candidates this similar to an already selected chunk are dropped
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"  # sentence-transformers CrossEncoder, run on CPU
+    
+    # Query Embedding Cache
+    QUERY_CACHE_SIZE: int = 10_000  # Max query embeddings held in memory (LRU)
+    QUERY_CACHE_TTL: float = 24 * 3600  # Seconds; 0 disables expiry
+    QUERY_CACHE_PATH: Optional[str] = None  # SQLite file for the on-disk tier, e.g. "./faiss_index/query_cache.db"
+    CHUNK_EMBEDDING_STORE_PATH: Optional[str] = "./faiss_index/chunk_embeddings.db"  # Content-hash -> vector store; None keeps it in memory
+    
+    # Batch Queries
+    BATCH_QUERY_MAX_QUERIES: int = 1000  # Questions accepted per /query/batch request
+    BATCH_QUERY_CONCURRENCY: int = 8  # Answers generated at once per batch request, leaving LLM capacity for interactive queries
+    
+    # Semantic Answer Cache
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIZE: int = 1000  # Cached answers kept (LRU)
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # Min cosine similarity between queries to reuse an answer
+    
+    # Vector Index
+    INDEX_FACTORY: str = "Flat"  # FAISS factory string, e.g. "HNSW32,Flat" or "OPQ64,IVF1024,PQ64"
+    INDEX_MIGRATION_THRESHOLD: int = 50_000  # Stay on Flat until the corpus reaches this many vectors
+    INDEX_TRAIN_SIZE: int = 100_000  # Max vectors sampled to train IVF / PQ / OPQ
+    INDEX_MAX_DELTA_SEGMENTS: int = 8  # Small segments new rows are indexed in before they are merged together
+    INDEX_DELTA_MERGE_RATIO: float = 0.1  # Merge delta segments into the base once they hold this share of its rows
+    IVF_NPROBE: int = 16  # Default inverted lists probed per query
+    HNSW_EF_SEARCH: int = 64  # Default HNSW search beam width
+    INDEX_DIMENSION: Optional[int] = None  # Keep only the leading dimensions in the index (text-embedding-3 models, e.g. 256 or 512); None keeps all
+    INDEX_QUANTIZATION: str = "none"  # Codes of the brute-force base index: "none" (float32), "fp16", "sq8" or "binary"
+    RESCORE_MULTIPLIER: int = 4  # With a reduced index, fetch top_k x this and rescore them on the full stored embeddings; 0 disables
+    
+    # Collections
+    DEFAULT_COLLECTION: str = "default"  # Stored directly in FAISS_INDEX_DIR; others under FAISS_INDEX_DIR/collections/<name>
+    # Deletion / compaction
+    COMPACTION_TOMBSTONE_RATIO: float = 0.2  # Compact a collection once this fraction of its rows is deleted
+    COMPACTION_INTERVAL: float = 60.0  # Seconds between background compaction checks
     # Conversation
     MAX_HISTORY_MESSAGES: int = 1  # Include 1 previous message
+    SPECULATIVE_RETRIEVAL: bool = True  # Retrieve on the raw query while the follow-up rewrite runs; skip the rewrite for standalone queries
+    
+    # Observability
+    SLOW_REQUEST_SECONDS: float = 2.0  # Requests at least this slow are logged with their per-stage spans
+    PROFILER_ENABLED: bool = False  # Sample stacks while requests run and save a profile of each slow one
+    PROFILER_INTERVAL: float = 0.005  # Seconds between stack samples
+    PROFILER_DIR: str = "./profiles"  # Collapsed-stack profiles of slow requests (flamegraph.pl / speedscope)
     
     # File Upload
     UPLOAD_DIR: str = "./uploads"
     FAISS_INDEX_DIR: str = "./faiss_index"
+    PERSIST_INDEX: bool = True  # Snapshot the index to FAISS_INDEX_DIR after every upload
+    INDEX_MMAP: bool = True  # Memory-map the index file when restoring at startup
+    VECTOR_STORE_MODE: str = "standalone"  # "standalone" or "reader" (API workers serving snapshots from `python -m app.writer`)
+    INDEX_RELOAD_INTERVAL: float = 1.0  # Seconds between snapshot generation checks in reader mode
     MAX_FILE_SIZE: int = 20 * 1024 * 1024  # 10MB
     FILE_TYPE: str = '.pdf'
     
+    # Ingestion Jobs
+    INGEST_QUEUE_BACKEND: str = "memory"  # "memory" or "sqlite"
+    INGEST_QUEUE_PATH: str = "./uploads/ingestion_jobs.db"  # Used by the sqlite backend
+    INGEST_WORKERS: int = 2  # Concurrent ingestion jobs
+    INGEST_POLL_INTERVAL: float = 1.0  # Seconds between queue polls when idle
+    INGEST_BATCH_CHUNKS: int = 256  # Chunks embedded and indexed together; each batch is searchable as soon as it lands
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
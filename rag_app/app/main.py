@@ -1,16 +1,47 @@
 # main.py
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from openai import AsyncOpenAI
+from contextlib import asynccontextmanager
 import os
 import io
 from app.api.routes import document, messages
 from app.api.routes.document import doc_router, stats_router
+from app.services.vector_service import vector_store
+from app.services.document_service import shutdown_pdf_executor
+from app.services.ingestion_service import ingestion_service
+from app.services.compaction_service import compaction_service
+from app.services.snapshot_watcher import snapshot_watcher
+from app.services.llm_provider import llm_provider
+from app.services.telemetry import TelemetryMiddleware, registry
 
 
-app = FastAPI(title="Simple RAG API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if vector_store.read_only:
+        # Reader worker: serve the writer's snapshots and only queue jobs for it
+        ingestion_service.check_backend()
+        vector_store.load()
+        await snapshot_watcher.start()
+        yield
+        await snapshot_watcher.stop()
+        await llm_provider.close()
+        return
+    
+    # Restore the persisted index so uploads survive restarts
+    vector_store.load()
+    await ingestion_service.start()
+    await compaction_service.start()
+    yield
+    await compaction_service.stop()
+    await ingestion_service.stop()
+    await llm_provider.close()
+    shutdown_pdf_executor()
+
+
+app = FastAPI(title="Simple RAG API", version="1.0.0", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -20,6 +51,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TelemetryMiddleware)
 
 # app.include_router(document.router)
 app.include_router(messages.router)
@@ -33,12 +65,22 @@ async def root():
     return {
         "message": "Simple RAG API",
         "endpoints": {
-            "POST /upload": "Upload and process a PDF file",
+            "POST /upload": "Queue a PDF file for processing",
+            "GET /jobs/{job_id}": "Ingestion progress of an uploaded PDF",
             "POST /query": "Send a question and get an answer",
-            "GET /stats": "Get vector store statistics"
+            "GET /collections": "Collections and the files they contain",
+            "PUT /documents/{filename}": "Replace a document with a new version",
+            "DELETE /documents/{filename}": "Delete a document's chunks",
+            "GET /stats": "Get vector store statistics",
+            "GET /metrics": "Per-stage latency histograms and request metrics (Prometheus format)"
         }
     }
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -1,7 +1,35 @@
 from pydantic import BaseModel
+from typing import List, Optional
 
-class UploadResponse(BaseModel):
+
+class IngestionJob(BaseModel):
+    job_id: str
     filename: str
+    collection: str = "default"
+    status: str  # queued | processing | completed | failed
+    pages_parsed: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_indexed: int = 0
+    reused_embeddings: int = 0
+    new_embeddings: int = 0
+    duplicate_chunks: int = 0
+    replace: bool = False  # Re-upload replacing the file's previous chunks
+    delete: bool = False  # Deletion queued for the ingest writer (reader mode)
+    deleted_chunks: int = 0  # Previous chunks removed by a replace or delete
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
+
+class CollectionInfo(BaseModel):
+    name: str
     total_chunks: int
-    status: str
-    message: str
\ No newline at end of file
+    filenames: List[str] = []
+
+
+class DocumentDeleted(BaseModel):
+    collection: str
+    filename: str
+    deleted_chunks: int
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Annotated, Dict, List, Literal, Optional
 
 
 # ========== Schemas ==========
@@ -7,6 +7,15 @@ class QueryRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=5000, description="User's question")
     conversation_history: Optional[List[dict]] = Field(default=[], description="Previous messages")
     top_k: Optional[int] = Field(default=3, ge=1, le=10, description="Number of chunks to retrieve")
+    nprobe: Optional[int] = Field(default=None, ge=1, description="IVF lists to probe (IVF indexes only)")
+    ef_search: Optional[int] = Field(default=None, ge=1, description="HNSW search beam width (HNSW indexes only)")
+    search_mode: Optional[Literal["dense", "lexical", "hybrid"]] = Field(default=None, description="Retriever to use; lexical skips the embedding call")
+    alpha: Optional[float] = Field(default=None, ge=0.0, le=1.0, description="Hybrid weight of dense vs keyword scores")
+    collections: Optional[List[str]] = Field(default=None, description="Collections to search; all when omitted")
+    filenames: Optional[List[str]] = Field(default=None, description="Only search chunks from these files")
+    rerank: Optional[Literal["none", "mmr", "cross_encoder"]] = Field(default=None, description="Rerank stage: MMR diversification, a local cross-encoder (then MMR) or none")
+    mmr_lambda: Optional[float] = Field(default=None, ge=0.0, le=1.0, description="MMR relevance vs diversity trade-off; 1.0 ranks by relevance only")
+    rerank_candidates: Optional[int] = Field(default=None, ge=1, le=100, description="Candidates retrieved for the rerank stage")
 
 
 class Source(BaseModel):
@@ -14,9 +23,50 @@ class Source(BaseModel):
     score: float
     chunk_id: str
     page_number: Optional[int] = None
+    page_end: Optional[int] = None  # Last page of a chunk running across a page break
+    char_start: Optional[int] = None  # Character offsets of the chunk in the document text
+    char_end: Optional[int] = None
+    filename: Optional[str] = None
+    collection: Optional[str] = None
 
 
 class QueryResponse(BaseModel):
     answer: str
     sources: List[Source] = []
-    query: str
\ No newline at end of file
+    query: str
+    resolved_query: Optional[str] = None  # Query actually used for retrieval after follow-up rewriting
+    timings: Dict[str, float] = {}  # Per-stage latency in milliseconds
+    tokens: Dict[str, int] = {}  # Prompt token budget and usage (context, history, answer) and chunks packed
+
+class BatchQueryRequest(BaseModel):
+    queries: List[Annotated[str, Field(min_length=1, max_length=5000)]] = Field(..., min_length=1, description="Standalone questions, answered independently")
+    generate: bool = Field(default=True, description="Generate answers; false returns retrieved sources only")
+    top_k: Optional[int] = Field(default=3, ge=1, le=10, description="Number of chunks to retrieve per question")
+    nprobe: Optional[int] = Field(default=None, ge=1, description="IVF lists to probe (IVF indexes only)")
+    ef_search: Optional[int] = Field(default=None, ge=1, description="HNSW search beam width (HNSW indexes only)")
+    search_mode: Optional[Literal["dense", "lexical", "hybrid"]] = Field(default=None, description="Retriever to use; lexical skips the embedding call")
+    alpha: Optional[float] = Field(default=None, ge=0.0, le=1.0, description="Hybrid weight of dense vs keyword scores")
+    collections: Optional[List[str]] = Field(default=None, description="Collections to search; all when omitted")
+    filenames: Optional[List[str]] = Field(default=None, description="Only search chunks from these files")
+    rerank: Optional[Literal["none", "mmr", "cross_encoder"]] = Field(default=None, description="Rerank stage: MMR diversification, a local cross-encoder (then MMR) or none")
+    mmr_lambda: Optional[float] = Field(default=None, ge=0.0, le=1.0, description="MMR relevance vs diversity trade-off; 1.0 ranks by relevance only")
+    rerank_candidates: Optional[int] = Field(default=None, ge=1, le=100, description="Candidates retrieved for the rerank stage")
+
+
+class BatchQueryResult(BaseModel):
+    """One NDJSON line of /query/batch per question, in completion order"""
+    index: int  # Position of the question in the request
+    query: str
+    answer: Optional[str] = None  # None when generate is false or the question failed
+    sources: List[Source] = []
+    timings: Dict[str, float] = {}  # Per-question latency in milliseconds
+    tokens: Dict[str, int] = {}
+    error: Optional[str] = None
+
+
+class BatchQuerySummary(BaseModel):
+    """Last NDJSON line of /query/batch"""
+    done: bool = True
+    queries: int
+    failed: int
+    timings: Dict[str, float] = {}  # Shared retrieval stages and the whole batch, in milliseconds
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import faiss
+import numpy as np
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+def history_fingerprint(conversation_history: List[dict]) -> str:
+    """Answers depend on the history sent to the LLM, so it is part of the cache key"""
+    return hashlib.blake2b(json.dumps(conversation_history, sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
+
+
+# ========== Semantic Answer Cache ==========
+class SemanticAnswerCache:
+    """
+    Reuse generated answers for near-identical questions.
+
+    Past query embeddings live in a small dedicated FAISS index. A cached
+    answer is returned only when a past query is at least `threshold` cosine
+    similar, was answered from exactly the same retrieved chunk ids with the
+    same conversation history, and the corpus has not changed since
+    (tracked by the vector store's version counter).
+    """
+
+    def __init__(self, dimension: int, max_entries: int = 1000, threshold: float = 0.95):
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self.entries: "OrderedDict[int, dict]" = OrderedDict()
+        self.next_id = 0
+        self.corpus_version = None
+        self.lookups = 0
+        self.hits = 0
+        self.saved_ms = 0.0
+
+    def clear(self):
+        self.index.reset()
+        self.entries.clear()
+
+    def _sync_version(self, corpus_version: int):
+        # Any corpus change can alter what the best answer is: drop everything
+        if corpus_version != self.corpus_version:
+            self.clear()
+            self.corpus_version = corpus_version
+
+    def lookup(
+        self,
+        query_vector: np.ndarray,
+        chunk_ids: List[str],
+        history_key: str,
+        corpus_version: int
+    ) -> Optional[dict]:
+        self._sync_version(corpus_version)
+        self.lookups += 1
+        if self.index.ntotal == 0:
+            return None
+
+        scores, ids = self.index.search(query_vector.reshape(1, -1), min(8, self.index.ntotal))
+        wanted = tuple(chunk_ids)
+        for score, entry_id in zip(scores[0], ids[0]):
+            if entry_id < 0 or score < self.threshold:
+                break
+            entry = self.entries.get(int(entry_id))
+            if entry and entry["chunk_ids"] == wanted and entry["history_key"] == history_key:
+                self.entries.move_to_end(int(entry_id))
+                self.hits += 1
+                self.saved_ms += entry["generation_ms"]
+                return entry
+        return None
+
+    def store(
+        self,
+        query_vector: np.ndarray,
+        chunk_ids: List[str],
+        history_key: str,
+        answer: str,
+        generation_ms: float,
+        corpus_version: int
+    ):
+        self._sync_version(corpus_version)
+        entry_id = self.next_id
+        self.next_id += 1
+        self.index.add_with_ids(query_vector.reshape(1, -1), np.array([entry_id], dtype=np.int64))
+        self.entries[entry_id] = {
+            "answer": answer,
+            "chunk_ids": tuple(chunk_ids),
+            "history_key": history_key,
+            "generation_ms": generation_ms,
+            "created_at": time.time()
+        }
+
+        # LRU eviction
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self.index.remove_ids(np.array([evicted], dtype=np.int64))
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "saved_generation_ms": round(self.saved_ms, 1)
+        }
+
+
+# SINGLE shared instance
+answer_cache = SemanticAnswerCache(
+    settings.EMBEDDING_MODEL_DIM,
+    max_entries=settings.ANSWER_CACHE_SIZE,
+    threshold=settings.ANSWER_CACHE_THRESHOLD
+)
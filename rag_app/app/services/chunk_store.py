@@ -0,0 +1,377 @@
+import bisect
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+SPAN_KEYS = ("page_end", "char_start", "char_end")  # Metadata held in ChunkSegment.spans
+FILE_KEY_MULTIPLIER = np.int64(-0x61C8864680B583EB)  # 0x9E3779B97F4A7C15 as int64; spreads file ids over 64 bits
+
+
+def hash_keys(hashes: np.ndarray) -> np.ndarray:
+    """First 8 bytes of each 16-byte content hash as int64 keys"""
+    return np.ascontiguousarray(hashes[:, :8]).view(np.int64).ravel()
+
+
+def dedup_keys(hashes: np.ndarray, file_ids: np.ndarray) -> np.ndarray:
+    """
+    int64 dedup keys of (file, content) pairs: the content hash key mixed with
+    the interned file id, so the same content in another file is not a duplicate
+    """
+    return hash_keys(hashes) ^ (np.asarray(file_ids, dtype=np.int64) * FILE_KEY_MULTIPLIER)
+
+
+def hashes_from_hex(content_hashes: List[str]) -> np.ndarray:
+    return np.frombuffer(b"".join(bytes.fromhex(h) for h in content_hashes), dtype=np.uint8).reshape(-1, 16)
+
+
+# ========== Chunk Segment ==========
+class ChunkSegment:
+    """
+    One append-only batch of rows, held column by column.
+
+    text     -> UTF-8 chunk texts concatenated (bytes, or a read-only mmap)
+    offsets  -> int64 offsets into text (rows + 1)
+    pages    -> int32 page numbers (-1 when missing)
+    spans    -> int64 (rows, 3) last page, start and end character offsets
+                in the document (-1 when missing)
+    file_ids -> int32 ids into the owning ChunkStore's interned filenames
+    ids      -> int64 chunk ids
+    hashes   -> uint8 (rows, 16) content hashes
+
+    Arrays loaded from a snapshot may be np.memmap views of the files on disk.
+    """
+
+    __slots__ = ("text", "offsets", "pages", "spans", "file_ids", "ids", "hashes")
+
+    def __init__(self, text, offsets, pages, spans, file_ids, ids, hashes):
+        self.text = text
+        self.offsets = offsets
+        self.pages = pages
+        self.spans = spans
+        self.file_ids = file_ids
+        self.ids = ids
+        self.hashes = hashes
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def text_at(self, i: int) -> str:
+        return self.text[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.text) + sum(
+            column.nbytes for column in (self.offsets, self.pages, self.spans, self.file_ids, self.ids, self.hashes)
+        )
+
+
+# ========== Chunk Store ==========
+class ChunkStore:
+    """
+    Chunk texts and metadata for one collection, stored as columnar segments.
+
+    Replaces parallel Python lists of strings and metadata dicts: a row costs
+    its UTF-8 bytes plus ~60 bytes of array columns, filenames are interned
+    once per collection, and segments restored from a snapshot stay
+    memory-mapped. Row lookups bisect the (few) segment start rows and then
+    index straight into the columns.
+
+    Deleted rows are tombstoned rather than removed: they drop out of the
+    per-file rows and the dedup keys at once, and compacted() later builds a
+    store without them. Chunk ids increase with row order and survive
+    compaction, which renumbers rows.
+
+    A store that searches may be reading is never modified: writers change a
+    copy() and publish it. Copies share the segments and column arrays, which
+    are never written in place.
+    """
+
+    def __init__(self):
+        self.segments: List[ChunkSegment] = []
+        self.starts: List[int] = []  # First row of each segment
+        self.first_ids: List[int] = []  # First chunk id of each segment
+        self.rows = 0
+        self.next_id = 0
+        self.filenames: List[str] = []
+        self.filename_ids: Dict[str, int] = {}
+        self.file_rows: Dict[int, array] = {}  # filename id -> rows, used for filtered search
+        self.hash_index = np.empty(0, dtype=np.int64)  # Sorted (file, content) dedup keys, used to skip duplicate chunks
+        self.deleted_rows = np.empty(0, dtype=np.int64)  # Tombstoned rows, sorted
+        self.deleted_ids = np.empty(0, dtype=np.int64)  # Their chunk ids, sorted
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def live(self) -> int:
+        return self.rows - len(self.deleted_rows)
+
+    @property
+    def tombstone_ratio(self) -> float:
+        return len(self.deleted_rows) / self.rows if self.rows else 0.0
+
+    def copy(self) -> "ChunkStore":
+        """A store that can be changed without affecting this one; costs O(segments + files)"""
+        store = ChunkStore.__new__(ChunkStore)
+        store.__dict__.update(self.__dict__)
+        for name in ("segments", "starts", "first_ids", "filenames"):
+            setattr(store, name, list(getattr(self, name)))
+        store.filename_ids = dict(self.filename_ids)
+        store.file_rows = dict(self.file_rows)
+        return store
+
+    def intern(self, filename: Optional[str]) -> int:
+        file_id = self.filename_ids.get(filename)
+        if file_id is None:
+            file_id = len(self.filenames)
+            self.filename_ids[filename] = file_id
+            self.filenames.append(filename)
+        return file_id
+
+    # ---------- Writes ----------
+    def _attach(self, segment: ChunkSegment):
+        start = self.rows
+        self.segments.append(segment)
+        self.starts.append(start)
+        self.first_ids.append(int(segment.ids[0]) if len(segment) else self.next_id)
+        self.rows += len(segment)
+        if len(segment.ids):
+            self.next_id = max(self.next_id, int(segment.ids.max()) + 1)
+
+        file_ids = np.asarray(segment.file_ids)
+        for file_id in np.unique(file_ids):
+            # Extend a copy: the existing array may belong to a published store
+            rows = array("q", self.file_rows.get(int(file_id), ()))
+            rows.extend((np.flatnonzero(file_ids == file_id) + start).tolist())
+            self.file_rows[int(file_id)] = rows
+
+        keys = np.sort(dedup_keys(np.asarray(segment.hashes), file_ids))
+        self.hash_index = np.insert(self.hash_index, np.searchsorted(self.hash_index, keys), keys)
+
+    def append(self, chunks: List[str], metadata: List[dict], content_hashes: List[str]) -> ChunkSegment:
+        """Add rows as a new in-memory segment and return it, e.g. for the snapshot to persist"""
+        encoded = [chunk.encode("utf-8") for chunk in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+
+        pages = np.array(
+            [-1 if meta.get("page_number") is None else meta["page_number"] for meta in metadata],
+            dtype=np.int32
+        )
+        spans = np.array(
+            [[meta.get(key, -1) for key in SPAN_KEYS] for meta in metadata],
+            dtype=np.int64
+        ).reshape(-1, len(SPAN_KEYS))
+        file_ids = np.array([self.intern(meta.get("filename")) for meta in metadata], dtype=np.int32)
+        ids = np.arange(self.next_id, self.next_id + len(chunks), dtype=np.int64)
+
+        segment = ChunkSegment(b"".join(encoded), offsets, pages, spans, file_ids, ids, hashes_from_hex(content_hashes))
+        self._attach(segment)
+        return segment
+
+    def adopt(self, segment: dict):
+        """
+        Attach a segment read from a snapshot, without copying its columns.
+
+        Filename ids on disk index the segment's own filename list and are
+        remapped to this store's interned ids; segments written before chunk
+        ids became integers (16-byte uuids) get sequential ids.
+        """
+        remap = np.array([self.intern(name) for name in segment["filenames"]], dtype=np.int32)
+        file_ids = remap[segment["file_ids"]] if len(remap) else np.asarray(segment["file_ids"], dtype=np.int32)
+
+        ids = segment["ids"]
+        if ids.ndim != 1:
+            ids = np.arange(self.next_id, self.next_id + len(segment["pages"]), dtype=np.int64)
+
+        self._attach(ChunkSegment(
+            segment["text"], segment["offsets"], segment["pages"], segment["spans"], file_ids, ids, segment["hashes"]
+        ))
+
+    def extend(self, other: "ChunkStore") -> List[ChunkSegment]:
+        """
+        Attach the segments of another store without deleted rows (e.g. a file
+        version staged apart) after this store's rows, and return them.
+        Chunk ids are renumbered from next_id and filenames interned here; the
+        other columns are shared, not copied.
+        """
+        remap = np.array([self.intern(name) for name in other.filenames], dtype=np.int32)
+        attached = []
+        for segment in other.segments:
+            segment = ChunkSegment(
+                segment.text,
+                segment.offsets,
+                segment.pages,
+                segment.spans,
+                remap[np.asarray(segment.file_ids)],
+                np.arange(self.next_id, self.next_id + len(segment), dtype=np.int64),
+                segment.hashes
+            )
+            self._attach(segment)
+            attached.append(segment)
+        return attached
+
+    def new_rows(self, content_hashes: List[str], filenames: List[Optional[str]]) -> List[int]:
+        """
+        Positions in content_hashes whose content is not stored yet for the
+        same file (first occurrence only); identical content in another file
+        is kept, so each file's rows, filtered searches and deletes stay whole
+        """
+        if not content_hashes:
+            return []
+        # A file not interned yet has no rows; -1 matches no stored key
+        file_ids = np.array([self.filename_ids.get(name, -1) for name in filenames], dtype=np.int64)
+        keys = dedup_keys(hashes_from_hex(content_hashes), file_ids)
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        positions = np.searchsorted(self.hash_index, keys[first])
+        found = positions < len(self.hash_index)
+        found[found] = self.hash_index[positions[found]] == keys[first][found]
+        return first[~found].tolist()
+
+    def _tombstone(self, rows: np.ndarray) -> np.ndarray:
+        if not len(rows):
+            return np.empty(0, dtype=np.int64)
+        ids = self.ids_of(rows)
+
+        # Remove one dedup key per row; a key repeats when deleted content was uploaded again
+        keys = np.sort(dedup_keys(self._gather(rows, "hashes"), self._gather(rows, "file_ids")))
+        positions = np.searchsorted(self.hash_index, keys) + np.arange(len(keys)) - np.searchsorted(keys, keys)
+        valid = positions < len(self.hash_index)
+        valid[valid] = self.hash_index[positions[valid]] == keys[valid]
+        self.hash_index = np.delete(self.hash_index, positions[valid])
+        self.deleted_rows = np.union1d(self.deleted_rows, rows)
+        self.deleted_ids = np.union1d(self.deleted_ids, ids)
+        return ids
+
+    def delete_file(self, filename: str) -> np.ndarray:
+        """Tombstone every row that came from a file; returns their chunk ids"""
+        file_id = self.filename_ids.get(filename)
+        rows = self.file_rows.pop(file_id, None) if file_id is not None else None
+        if rows is None:
+            return np.empty(0, dtype=np.int64)
+        return self._tombstone(np.frombuffer(rows, dtype=np.int64).copy())
+
+    def delete_ids(self, ids: np.ndarray):
+        """Tombstone rows by chunk id, e.g. when restoring a snapshot's tombstones"""
+        if not len(ids):
+            return
+        rows = self.rows_of(np.asarray(ids, dtype=np.int64))
+        for file_id in list(self.file_rows):
+            file_rows = np.frombuffer(self.file_rows[file_id], dtype=np.int64)
+            remaining = file_rows[~np.isin(file_rows, rows)]
+            if len(remaining):
+                self.file_rows[file_id] = array("q", remaining.tobytes())
+            else:
+                del self.file_rows[file_id]
+        self._tombstone(rows)
+
+    def compacted(self) -> "ChunkStore":
+        """A new store with only the live rows, merged into one segment; chunk ids are kept"""
+        store = ChunkStore()
+        store.next_id = self.next_id
+        parts, columns = [], {"pages": [], "spans": [], "file_ids": [], "ids": [], "hashes": []}
+        for segment, start in zip(self.segments, self.starts):
+            keep = np.ones(len(segment), dtype=bool)
+            dead = self.deleted_rows[(self.deleted_rows >= start) & (self.deleted_rows < start + len(segment))]
+            keep[dead - start] = False
+            rows = np.flatnonzero(keep)
+            parts.extend(segment.text[int(segment.offsets[i]):int(segment.offsets[i + 1])] for i in rows)
+            for name, values in columns.items():
+                values.append(np.asarray(getattr(segment, name))[rows])
+        if not parts:
+            return store
+
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum([len(part) for part in parts], out=offsets[1:])
+        # Re-intern only the filenames that still have rows
+        used, file_ids = np.unique(np.concatenate(columns["file_ids"]), return_inverse=True)
+        for file_id in used:
+            store.intern(self.filenames[file_id])
+
+        store._attach(ChunkSegment(
+            b"".join(parts),
+            offsets,
+            np.concatenate(columns["pages"]),
+            np.concatenate(columns["spans"]),
+            file_ids.astype(np.int32),
+            np.concatenate(columns["ids"]),
+            np.concatenate(columns["hashes"])
+        ))
+        return store
+
+    # ---------- Reads ----------
+    def _gather(self, rows: np.ndarray, column: str) -> np.ndarray:
+        """Values of one column for the given rows, across segments"""
+        rows = np.asarray(rows, dtype=np.int64)
+        segments = np.searchsorted(self.starts, rows, side="right") - 1
+        values = None
+        for s in np.unique(segments):
+            mask = segments == s
+            chunk = np.asarray(getattr(self.segments[s], column))[rows[mask] - self.starts[s]]
+            if values is None:
+                values = np.empty((len(rows),) + chunk.shape[1:], dtype=chunk.dtype)
+            values[mask] = chunk
+        return values if values is not None else np.empty(0, dtype=np.int64)
+
+    def ids_of(self, rows: np.ndarray) -> np.ndarray:
+        return self._gather(rows, "ids")
+
+    def hashes_of(self, rows: np.ndarray) -> List[str]:
+        """Hex content hashes of rows, the keys of their embeddings in the chunk embedding store"""
+        return [row_hash.tobytes().hex() for row_hash in self._gather(rows, "hashes")]
+
+    def rows_of(self, ids: np.ndarray) -> np.ndarray:
+        """Rows holding the given chunk ids"""
+        segments = np.searchsorted(self.first_ids, ids, side="right") - 1
+        rows = np.empty(len(ids), dtype=np.int64)
+        for s in np.unique(segments):
+            mask = segments == s
+            rows[mask] = self.starts[s] + np.searchsorted(self.segments[s].ids, ids[mask])
+        return rows
+
+    def locate(self, row: int) -> Tuple[ChunkSegment, int]:
+        segment = bisect.bisect_right(self.starts, row) - 1
+        return self.segments[segment], row - self.starts[segment]
+
+    def text(self, row: int) -> str:
+        segment, i = self.locate(row)
+        return segment.text_at(i)
+
+    def row(self, row: int) -> dict:
+        """Text and metadata of one row"""
+        segment, i = self.locate(row)
+        page = int(segment.pages[i])
+        page_end, char_start, char_end = (None if value < 0 else int(value) for value in segment.spans[i])
+        return {
+            "content": segment.text_at(i),
+            "chunk_id": int(segment.ids[i]),
+            "page_number": None if page < 0 else page,
+            "page_end": page_end,
+            "char_start": char_start,
+            "char_end": char_end,
+            "filename": self.filenames[segment.file_ids[i]]
+        }
+
+    def texts(self) -> Iterator[str]:
+        for segment in self.segments:
+            for i in range(len(segment)):
+                yield segment.text_at(i)
+
+    def rows_for_files(self, filenames: List[str]) -> np.ndarray:
+        """Rows of the chunks that came from any of the given files"""
+        parts = [
+            np.frombuffer(self.file_rows[self.filename_ids[filename]], dtype=np.int64)
+            for filename in filenames
+            if filename in self.filename_ids and self.filename_ids[filename] in self.file_rows
+        ]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def file_names(self) -> List[str]:
+        return [self.filenames[file_id] for file_id in self.file_rows]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(segment.nbytes for segment in self.segments)
@@ -0,0 +1,168 @@
+"""
+Document-level chunking in a single linear pass.
+
+Kept free of settings, like pdf_worker, so it imports cheaply anywhere;
+sizes are passed in.
+"""
+import bisect
+from typing import List, NamedTuple, Optional
+
+PAGE_SEPARATOR = "\n"  # A page break is no stronger a boundary than a line break
+# Preferred chunk boundaries, strongest first: paragraphs, sentences, lines, words
+BOUNDARIES = (("\n\n",), (". ", "? ", "! ", ".\n", "?\n", "!\n"), ("\n",), (" ",))
+# Separators only searched for once the document is seen to contain them (the probe);
+# most text has no '?', '!' or blank lines, and failed searches are most of the cost
+PROBES = {"\n\n": "\n\n", "? ": "?", "?\n": "?", "! ": "!", "!\n": "!"}
+WHITESPACE = " \t\r\n"
+
+
+class Chunk(NamedTuple):
+    """
+    A chunk with its position in the document text, the pages joined by
+    PAGE_SEPARATOR: text == document[start:end]. A chunk crossing a page
+    break has page_start < page_end.
+    """
+    text: str
+    start: int
+    end: int
+    page_start: int
+    page_end: int
+
+
+class DocumentChunker:
+    """
+    Splits a whole document into overlapping chunks of at most chunk_size
+    characters, fed one page at a time, so sentences running across a page
+    break stay in one chunk.
+
+    Each cut is placed at the strongest boundary (paragraph, sentence, line,
+    word) in the second half of the window, found with a bounded reverse
+    search, and the next chunk starts chunk_overlap characters earlier on a
+    word boundary. Text before the current chunk start is dropped when the
+    next page arrives, so memory holds about one page plus one chunk and
+    the work is linear in the document length. The last chunk of the
+    document is merged into the one before it when it is shorter than
+    min_chunk_size characters past it, instead of becoming a tiny chunk of
+    its own; chunks are therefore returned one cut late.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, min_chunk_size: Optional[int] = None):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.min_chunk_size = chunk_size // 4 if min_chunk_size is None else min_chunk_size
+        self.reset()
+
+    def reset(self):
+        """Forget the document fed so far"""
+        self.buffer = ""  # Document text from buffer_start on
+        self.buffer_start = 0
+        self.position = 0  # Start of the next chunk, in the buffer
+        self.page_starts: List[int] = []  # Document offset of each page fed, in order
+        self.page_numbers: List[int] = []
+        self.held: Optional[Chunk] = None
+        self.probes_found = set()
+        self.boundaries = self._active_boundaries()
+
+    def _active_boundaries(self) -> tuple:
+        groups = (
+            tuple(separator for separator in separators if separator not in PROBES or PROBES[separator] in self.probes_found)
+            for separators in BOUNDARIES
+        )
+        return tuple(group for group in groups if group)
+
+    def _page_at(self, offset: int) -> int:
+        return self.page_numbers[bisect.bisect_right(self.page_starts, offset) - 1]
+
+    def _chunk(self, start: int, end: int) -> Optional[Chunk]:
+        """The buffer span [start, end) without surrounding whitespace; None if blank"""
+        text = self.buffer[start:end]
+        stripped = text.strip(WHITESPACE)
+        if not stripped:
+            return None
+        start += len(text) - len(text.lstrip(WHITESPACE))
+        begin = self.buffer_start + start
+        end = begin + len(stripped)
+        return Chunk(stripped, begin, end, self._page_at(begin), self._page_at(end - 1))
+
+    def _cut(self) -> int:
+        """Where the chunk starting at position ends: the last strong boundary past its midpoint"""
+        buffer = self.buffer
+        low = self.position + self.chunk_size // 2
+        high = self.position + self.chunk_size
+        for separators in self.boundaries:
+            best = -1
+            for separator in separators:
+                found = buffer.rfind(separator, low, high)
+                if found > best:
+                    best = found
+            if best >= 0:
+                # Keep sentence punctuation in the chunk; paragraph and line breaks go with neither
+                return best if separators[0] == "\n\n" else best + 1
+        return high
+
+    def _next_start(self, chunk: Optional[Chunk], cut: int) -> int:
+        """Start of the chunk after one ending at cut: chunk_overlap back, moved forward to a word start"""
+        # Past the previous chunk's first character, so no chunk contains another
+        floor = chunk.start - self.buffer_start + 1 if chunk is not None else self.position + 1
+        start = max(floor, cut - self.chunk_overlap)
+        if start >= cut:
+            return cut
+        space = self.buffer.find(" ", start, cut)
+        newline = self.buffer.find("\n", start, space if space >= 0 else cut)
+        if newline >= 0:
+            space = newline
+        return space + 1 if space >= 0 else start
+
+    def _emit(self, chunk: Optional[Chunk]) -> List[Chunk]:
+        """Hold chunk back and return the one held before it"""
+        if chunk is None:
+            return []
+        held, self.held = self.held, chunk
+        return [held] if held is not None else []
+
+    def feed(self, text: str, page_number: int) -> List[Chunk]:
+        """Add the next page; returns the chunks completed so far"""
+        # Drop the text already behind the next chunk start
+        self.buffer_start += self.position
+        self.buffer = self.buffer[self.position:]
+        self.position = 0
+        if self.page_starts:
+            self.buffer += PAGE_SEPARATOR
+        self.page_starts.append(self.buffer_start + len(self.buffer))
+        self.page_numbers.append(page_number)
+        self.buffer += text
+        new_text = max(0, len(self.buffer) - len(text) - 1)
+        found = {
+            probe for probe in set(PROBES.values()) - self.probes_found
+            if self.buffer.find(probe, new_text) >= 0
+        }
+        if found:
+            self.probes_found |= found
+            self.boundaries = self._active_boundaries()
+
+        chunks = []
+        # Only cut once the window is full, so a later page can't move the boundary
+        while len(self.buffer) - self.position > self.chunk_size:
+            cut = self._cut()
+            chunk = self._chunk(self.position, cut)
+            chunks += self._emit(chunk)
+            self.position = self._next_start(chunk, cut)
+        return chunks
+
+    def finish(self) -> List[Chunk]:
+        """The remaining chunks, once every page has been fed; the chunker is then reset"""
+        tail = self._chunk(self.position, len(self.buffer))
+        held = self.held
+        if held is not None and tail is not None and 0 < tail.end - held.end < self.min_chunk_size:
+            # Extend the previous chunk to the end of the document rather than keep a tiny tail
+            end = held.end - self.buffer_start
+            merged = held.text + self.buffer[end:tail.end - self.buffer_start]
+            chunks = [Chunk(merged, held.start, tail.end, held.page_start, tail.page_end)]
+        elif tail is not None and (held is None or tail.end > held.end):
+            chunks = [held, tail] if held is not None else [tail]
+        else:
+            chunks = [held] if held is not None else []
+        self.reset()
+        return chunks
@@ -0,0 +1,286 @@
+import asyncio
+import heapq
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from app.core.config import get_settings
+from app.services.embedding_cache import ChunkEmbeddingStore, QueryEmbeddingCache
+from app.services.embedding_pipeline import EmbeddingPipeline
+from app.services.embedding_service import StagedDocument, VectorStoreService
+from app.services.index_factory import index_dimension, is_reduced
+from app.services.llm_provider import llm_provider
+
+settings = get_settings()
+
+COLLECTION_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+COLLECTIONS_SUBDIR = "collections"
+
+
+def validate_collection_name(name: str) -> str:
+    """Collection names become directory names, so only a safe subset is accepted"""
+    if not COLLECTION_NAME_PATTERN.match(name or ""):
+        raise ValueError(
+            f"Invalid collection name {name!r}: use up to 64 letters, digits, '-' or '_'"
+        )
+    return name
+
+
+# ========== Collection Service ==========
+class CollectionService:
+    """
+    Named collections, each with its own FAISS index, BM25 postings and snapshot.
+
+    The default collection lives in FAISS_INDEX_DIR itself, where the single
+    store used to be, so existing snapshots load unchanged; other collections
+    live under FAISS_INDEX_DIR/collections/<name>. A query is embedded once and
+    fanned out to the selected collections in parallel worker threads, then
+    the per-collection top-k lists are merged by score. Dense scores are
+    cosine similarities and compare directly across collections; hybrid and
+    lexical scores are normalised per collection, so their merge is
+    approximate.
+
+    With VECTOR_STORE_MODE=reader every collection is read-only and
+    refresh() follows the snapshots published by the writer process,
+    including collections it creates.
+    """
+
+    def __init__(self):
+        self.query_cache = QueryEmbeddingCache(
+            max_entries=settings.QUERY_CACHE_SIZE,
+            ttl_seconds=settings.QUERY_CACHE_TTL,
+            path=settings.QUERY_CACHE_PATH
+        )
+        # Full chunk embeddings: ingestion dedupes against it, searches on a reduced index rescore from it
+        self.embedding_store = ChunkEmbeddingStore(settings.CHUNK_EMBEDDING_STORE_PATH)
+        # Packs batch queries into as few embeddings requests as the API limits allow
+        self.embedding_pipeline = EmbeddingPipeline(llm_provider)
+        self.read_only = settings.VECTOR_STORE_MODE == "reader"
+        self.stores: Dict[str, VectorStoreService] = {}
+        self.get_or_create(settings.DEFAULT_COLLECTION)
+
+    def directory(self, name: str) -> str:
+        if name == settings.DEFAULT_COLLECTION:
+            return settings.FAISS_INDEX_DIR
+        return os.path.join(settings.FAISS_INDEX_DIR, COLLECTIONS_SUBDIR, name)
+
+    def get(self, name: str) -> Optional[VectorStoreService]:
+        return self.stores.get(name)
+
+    def get_or_create(self, name: str) -> VectorStoreService:
+        store = self.stores.get(name)
+        if store is None:
+            store = VectorStoreService(
+                name=validate_collection_name(name),
+                directory=self.directory(name),
+                query_cache=self.query_cache,
+                read_only=self.read_only,
+                embedding_store=self.embedding_store
+            )
+            self.stores[name] = store
+        return store
+
+    @property
+    def version(self) -> int:
+        """Changes whenever any collection changes"""
+        return sum(store.version for store in self.stores.values())
+
+    def names_on_disk(self) -> List[str]:
+        names = [settings.DEFAULT_COLLECTION]
+        root = os.path.join(settings.FAISS_INDEX_DIR, COLLECTIONS_SUBDIR)
+        if os.path.isdir(root):
+            names += sorted(
+                name for name in os.listdir(root)
+                if COLLECTION_NAME_PATTERN.match(name) and os.path.isdir(os.path.join(root, name))
+            )
+        return names
+
+    def load(self) -> int:
+        """Restore every collection found under FAISS_INDEX_DIR; returns the total rows loaded"""
+        return sum(self.get_or_create(name).load() for name in self.names_on_disk())
+
+    def refresh(self) -> int:
+        """Follow new snapshot generations, loading collections created since; returns how many changed"""
+        changed = 0
+        for name in self.names_on_disk():
+            store = self.stores.get(name)
+            if store is None:
+                self.get_or_create(name).load()
+                changed += 1
+            elif store.refresh():
+                changed += 1
+        return changed
+
+    def has_document(self, collection: str, filename: str) -> bool:
+        store = self.stores.get(collection)
+        return store is not None and len(store.chunks.rows_for_files([filename])) > 0
+
+    def add_documents(self, collection: str, **kwargs) -> int:
+        """Add chunks to a collection, creating it on first use"""
+        return self.get_or_create(collection).add_documents(**kwargs)
+
+    def delete_document(self, collection: str, filename: str) -> int:
+        """Tombstone a file's chunks; returns 0 when the collection or file is unknown"""
+        store = self.stores.get(collection)
+        return store.delete_document(filename) if store is not None else 0
+
+    def replace_document(self, collection: str, filename: str, **kwargs) -> Tuple[int, int]:
+        """Replace a file's chunks with a new version; returns (added, deleted)"""
+        return self.get_or_create(collection).replace_document(filename, **kwargs)
+
+    def stage_document(self, collection: str, staged: StagedDocument, **kwargs) -> int:
+        """Add a batch to a staged file version; nothing is searchable until publish_document()"""
+        return self.get_or_create(collection).stage_document(staged, **kwargs)
+
+    def publish_document(self, collection: str, staged: StagedDocument) -> Tuple[int, int]:
+        """Swap a file's chunks for a staged version in one write; returns (added, deleted)"""
+        return self.get_or_create(collection).publish_document(staged)
+
+    async def embed_query(self, query: str) -> np.ndarray:
+        # Every collection shares the query cache, so any of them can embed
+        return await self.stores[settings.DEFAULT_COLLECTION].embed_query(query)
+
+    async def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Normalized (len(queries), dimension) embeddings of many queries:
+        cached ones are reused and the rest embedded together, one request
+        per EMBEDDING_BATCH_MAX_TOKENS / EMBEDDING_BATCH_MAX_INPUTS batch.
+        """
+        vectors = [self.query_cache.get(settings.EMBEDDING_MODEL, query) for query in queries]
+        missing = list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
+        if missing:
+            embedded = np.array(await self.embedding_pipeline.embed(missing), dtype=np.float32)
+            faiss.normalize_L2(embedded)
+            fresh = {}
+            for query, vector in zip(missing, embedded):
+                fresh[query] = vector.reshape(1, -1)
+                self.query_cache.put(settings.EMBEDDING_MODEL, query, fresh[query])
+            vectors = [fresh[query] if vector is None else vector for query, vector in zip(queries, vectors)]
+        return np.vstack([vector.reshape(1, -1) for vector in vectors])
+
+    async def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        mode: Optional[str] = None,
+        alpha: Optional[float] = None,
+        collections: Optional[List[str]] = None,
+        filenames: Optional[List[str]] = None
+    ) -> List[dict]:
+        """
+        Search the given collections (all when None), optionally only chunks
+        from the given files. Unknown collections contribute no results.
+        """
+        names = self.stores if collections is None else collections
+        stores = [
+            self.stores[name] for name in names
+            if name in self.stores and self.stores[name].chunks.live > 0
+        ]
+        if not stores:
+            return []
+
+        mode = mode or settings.SEARCH_MODE
+        query_vector = None if mode == "lexical" else await self.embed_query(query)
+        args = (query, query_vector, top_k, nprobe, ef_search, mode, alpha, filenames)
+
+        if len(stores) == 1:
+            # A scoped query only touches its own collection; no thread hop needed
+            return stores[0].search_vector(*args)
+
+        results = await asyncio.gather(*(asyncio.to_thread(store.search_vector, *args) for store in stores))
+        return heapq.nlargest(top_k, (hit for hits in results for hit in hits), key=lambda hit: hit["score"])
+
+    async def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        mode: Optional[str] = None,
+        alpha: Optional[float] = None,
+        collections: Optional[List[str]] = None,
+        filenames: Optional[List[str]] = None
+    ) -> List[List[dict]]:
+        """
+        search() for many queries sharing the same options: the queries are
+        embedded together and each collection is searched for all of them at
+        once, in one worker thread per collection. Results are in query order.
+        """
+        names = self.stores if collections is None else collections
+        stores = [
+            self.stores[name] for name in names
+            if name in self.stores and self.stores[name].chunks.live > 0
+        ]
+        if not stores:
+            return [[] for _ in queries]
+
+        mode = mode or settings.SEARCH_MODE
+        query_vectors = None if mode == "lexical" else await self.embed_queries(queries)
+        args = (queries, query_vectors, top_k, nprobe, ef_search, mode, alpha, filenames)
+
+        # A batch is heavy enough to keep off the event loop even for a single collection
+        results = await asyncio.gather(*(asyncio.to_thread(store.search_vectors, *args) for store in stores))
+        if len(stores) == 1:
+            return results[0]
+        return [
+            heapq.nlargest(top_k, (hit for hits in per_store for hit in hits), key=lambda hit: hit["score"])
+            for per_store in zip(*results)
+        ]
+
+    def stored_vectors(self, chunks: List[dict]) -> np.ndarray:
+        """
+        Vectors of search results, in order; zeros for chunks no longer indexed.
+
+        With a reduced index these are the full embeddings from the chunk
+        embedding store, so reranking compares chunks on every dimension; if
+        any of them is not stored, the index vectors of all of them instead.
+        """
+        positions: Dict[str, Dict[int, int]] = {}
+        for position, chunk in enumerate(chunks):
+            # Result chunk ids are "<collection>:<id>"
+            chunk_id = int(chunk["chunk_id"].rsplit(":", 1)[1])
+            positions.setdefault(chunk["collection"], {})[chunk_id] = position
+        stores = {name: self.stores.get(name) for name in positions}
+
+        if is_reduced():
+            vectors = np.zeros((len(chunks), settings.EMBEDDING_MODEL_DIM), dtype=np.float32)
+            complete = True
+            for name, ids in positions.items():
+                full = stores[name].full_vectors(list(ids)) if stores[name] is not None else None
+                if stores[name] is not None and full is None:
+                    complete = False
+                    break
+                if full is not None:
+                    vectors[list(ids.values())] = full
+            if complete:
+                return vectors
+
+        vectors = np.zeros((len(chunks), index_dimension()), dtype=np.float32)
+        for name, ids in positions.items():
+            if stores[name] is not None:
+                vectors[list(ids.values())] = stores[name].stored_vectors(list(ids))
+        return vectors
+
+    def list_collections(self) -> List[dict]:
+        return [
+            {
+                "name": name,
+                "total_chunks": store.chunks.live,
+                "filenames": sorted(filename for filename in store.chunks.file_names() if filename)
+            }
+            for name, store in sorted(self.stores.items())
+        ]
+
+    def get_stats(self) -> dict:
+        """Totals across collections plus per-collection statistics"""
+        stats = {name: store.get_stats() for name, store in sorted(self.stores.items())}
+        return {
+            "total_chunks": sum(item["total_chunks"] for item in stats.values()),
+            "indexed_vectors": sum(item["indexed_vectors"] for item in stats.values()),
+            "collections": stats,
+            "query_embedding_cache": self.query_cache.get_stats()
+        }
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Optional
+
+from app.core.config import get_settings
+from app.services.vector_service import vector_store
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+# ========== Compaction Service ==========
+class CompactionService:
+    """
+    Background compaction of collections with many deleted chunks.
+
+    Every COMPACTION_INTERVAL seconds (or when woken after a delete) each
+    collection whose tombstoned share of rows reaches
+    COMPACTION_TOMBSTONE_RATIO is compacted in a worker thread, so searches
+    keep being served from the old index meanwhile.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup = None
+        self.stopping = False
+
+    def notify(self):
+        """Check for work now instead of at the next interval"""
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def start(self):
+        self.wakeup = asyncio.Event()
+        self.stopping = False
+        self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.task is not None:
+            # wait_for() can swallow a cancel that lands as the event is set (Python 3.11),
+            # so the loop also exits on the flag
+            self.stopping = True
+            self.wakeup.set()
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run_once(self) -> int:
+        """Compact every collection over the threshold; returns the rows removed"""
+        removed = 0
+        for store in list(vector_store.stores.values()):
+            if store.chunks.deleted_rows.size and store.chunks.tombstone_ratio >= settings.COMPACTION_TOMBSTONE_RATIO:
+                removed += await asyncio.to_thread(store.compact)
+        return removed
+
+    async def _loop(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=settings.COMPACTION_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            if self.stopping:
+                break
+            self.wakeup.clear()
+            try:
+                await self.run_once()
+            except Exception as e:
+                # Tombstones keep results correct; compaction is retried on the next pass
+                logger.warning("Compaction failed: %s", e)
+
+
+compaction_service = CompactionService()
@@ -0,0 +1,74 @@
+from typing import Dict, List, Tuple
+
+from app.core.config import get_settings
+from app.services.tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens, truncate_tokens
+
+settings = get_settings()
+
+SOURCE_SEPARATOR = "\n\n"
+
+
+def page_label(chunk: dict) -> str:
+    """"3", or "3-4" for a chunk running across a page break"""
+    page, page_end = chunk.get("page_number"), chunk.get("page_end")
+    if page is None:
+        return "N/A"
+    return f"{page}-{page_end}" if page_end is not None and page_end != page else str(page)
+
+
+def source_block(number: int, chunk: dict) -> str:
+    """One retrieved chunk as it appears in the prompt"""
+    return f"[Source {number} - Page {page_label(chunk)}]\n{chunk['content']}"
+
+
+# ========== Context Packing ==========
+def pack_history(history: List[dict], budget: int, model: str) -> Tuple[List[dict], int]:
+    """
+    The most recent messages that fit in `budget` tokens, in their original
+    order, and the tokens they use. Older messages are dropped first; the
+    oldest one kept may be truncated to fill the budget.
+    """
+    kept, used = [], 0
+    for message in reversed(history):
+        cost = MESSAGE_OVERHEAD_TOKENS + count_tokens(message["content"], model)
+        if used + cost > budget:
+            remaining = budget - used - MESSAGE_OVERHEAD_TOKENS
+            if remaining >= settings.CONTEXT_MIN_CHUNK_TOKENS:
+                content = truncate_tokens(message["content"], remaining, model)
+                kept.append({**message, "content": content})
+                used += MESSAGE_OVERHEAD_TOKENS + count_tokens(content, model)
+            break
+        kept.append(message)
+        used += cost
+    return kept[::-1], used
+
+
+def pack_chunks(chunks: List[dict], budget: int, model: str) -> Tuple[List[dict], Dict[str, int]]:
+    """
+    Fill `budget` tokens with chunks in rank order (best first).
+
+    A chunk that does not fit is trimmed to the remaining budget if at least
+    CONTEXT_MIN_CHUNK_TOKENS of it would remain, otherwise dropped in favour
+    of later, shorter ones. Returns the chunks to send and packing counts.
+    """
+    packed, used, trimmed = [], 0, 0
+    separator = count_tokens(SOURCE_SEPARATOR, model)
+    for chunk in chunks:
+        remaining = budget - used - (separator if packed else 0)
+        cost = count_tokens(source_block(len(packed) + 1, chunk), model)
+        if cost > remaining:
+            header = count_tokens(source_block(len(packed) + 1, {**chunk, "content": ""}), model)
+            if remaining - header < settings.CONTEXT_MIN_CHUNK_TOKENS:
+                continue
+            chunk = {**chunk, "content": truncate_tokens(chunk["content"], remaining - header, model)}
+            cost = count_tokens(source_block(len(packed) + 1, chunk), model)
+            trimmed += 1
+        used += cost + (separator if packed else 0)
+        packed.append(chunk)
+
+    return packed, {
+        "context": used,
+        "chunks_used": len(packed),
+        "chunks_trimmed": trimmed,
+        "chunks_dropped": len(chunks) - len(packed)
+    }
@@ -1,4 +1,5 @@
 from app.services.document_service import DocumentProcessor
+from app.services.vector_service import vector_store
 
-# SINGLE shared instance
-doc_process = DocumentProcessor()
\ No newline at end of file
+# SINGLE shared instance, sharing the chunk embedding store searches rescore from
+doc_process = DocumentProcessor(embedding_store=vector_store.embedding_store)
\ No newline at end of file
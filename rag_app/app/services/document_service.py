@@ -1,44 +1,53 @@
-import PyPDF2
-from typing import List, Optional
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple
 import io, os
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 load_dotenv()
 
 # In app/services/document_service.py
 from app.core.config import get_settings
+from app.services.chunker import Chunk, DocumentChunker
+from app.services.embedding_cache import ChunkEmbeddingStore, content_hash
+from app.services.embedding_pipeline import EmbeddingPipeline
+from app.services.llm_provider import llm_provider
+from app.services.telemetry import observe, span
+from app.services import pdf_worker
 
 settings = get_settings()
 
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_pdf_executor() -> Optional[ProcessPoolExecutor]:
+    """Shared process pool for PDF extraction and chunking; None when PDF_PROCESS_WORKERS is 0"""
+    global _executor
+    if _executor is None and settings.PDF_PROCESS_WORKERS > 0:
+        _executor = ProcessPoolExecutor(max_workers=settings.PDF_PROCESS_WORKERS)
+    return _executor
+
+
+def shutdown_pdf_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
 
 
 # ========== Document Processing Service ==========
 class DocumentProcessor:
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, embedding_store: Optional[ChunkEmbeddingStore] = None):
         self.chunk_size = settings.CHUNK_SIZE
         self.chunk_overlap = settings.CHUNK_OVERLAP
-        # Initialize LangChain's RecursiveCharacterTextSplitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""],  # Try to split on paragraphs, then sentences, then words
-            is_separator_regex=False,
-        )
+        # LangChain's per-page RecursiveCharacterTextSplitter, for chunk_text; ingestion uses new_chunker()
+        self.text_splitter = pdf_worker.get_splitter(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+        self.embedding_store = embedding_store or ChunkEmbeddingStore(settings.CHUNK_EMBEDDING_STORE_PATH)
+        self.embedding_pipeline = EmbeddingPipeline(llm_provider)
 
     def extract_text_from_pdf(self, pdf_content: bytes) -> List[tuple]:
         """Extract text from PDF with page numbers"""
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
-        texts = []
-        
-        for page_num, page in enumerate(pdf_reader.pages, start=1):
-            text = page.extract_text()
-            if text.strip():
-                texts.append((text, page_num))
-        
-        return texts
+        return pdf_worker.extract_pages(pdf_content)
     
     def chunk_text(self, text: str) -> List[str]:
         """
@@ -54,40 +63,131 @@ class DocumentProcessor:
         chunks = self.text_splitter.split_text(text)
         return chunks
     
-    async def process_pdf(self, pdf_content: bytes, filename: str) -> dict:
-        """Process PDF: extract, chunk, embed"""
-        # Extract text
-        page_texts = self.extract_text_from_pdf(pdf_content)
+    def new_chunker(self) -> DocumentChunker:
+        """A document-level chunker for one document"""
+        return DocumentChunker(self.chunk_size, self.chunk_overlap, settings.CHUNK_MIN_SIZE)
+    
+    async def iter_page_chunks(self, pdf_path: str) -> AsyncIterator[Tuple[int, List[Chunk]]]:
+        """
+        Extract and chunk a PDF on disk, yielding (page_number, chunks completed by that page) in page order.
         
-        # Chunk each page
-        all_chunks = []
+        Page ranges of PDF_PAGES_PER_TASK are extracted across the process pool,
+        at most PDF_PREFETCH_TASKS of them running or waiting to be consumed at a
+        time, and each range is chunked as soon as it and every earlier range are
+        done. Workers read their pages from the file, so memory stays the same
+        whatever the page count. Chunking runs here, over the whole document in
+        page order, so chunks can cross page breaks; it is a linear pass, far
+        cheaper than extraction.
+        """
+        loop = asyncio.get_running_loop()
+        executor = get_pdf_executor()
+        chunker = self.new_chunker()
+        
+        page_count = await loop.run_in_executor(executor, pdf_worker.count_pages, pdf_path)
+        step = max(1, settings.PDF_PAGES_PER_TASK)
+        starts = iter(range(0, page_count, step))
+        tasks = deque()
+        
+        def submit_next():
+            start = next(starts, None)
+            if start is not None:
+                tasks.append(loop.run_in_executor(executor, pdf_worker.extract_range, pdf_path, start, start + step))
+        
+        for _ in range(max(1, settings.PDF_PREFETCH_TASKS)):
+            submit_next()
+        try:
+            while tasks:
+                texts, seconds = await tasks.popleft()
+                submit_next()
+                text_bytes = sum(len(text) for text, _ in texts)
+                observe("pdf_extract", seconds, bytes=text_bytes, items=len(texts))
+                with span("chunk", bytes=text_bytes) as chunking:
+                    pages = [(page_num, chunker.feed(text, page_num)) for text, page_num in texts]
+                    if not tasks:
+                        # Last range: the chunks still held back end on its last page
+                        rest = chunker.finish()
+                        if pages:
+                            pages[-1][1].extend(rest)
+                        elif rest:
+                            pages.append((rest[-1].page_end, rest))
+                    chunking.add(items=sum(len(chunks) for _, chunks in pages))
+                for page_num, chunks in pages:
+                    yield page_num, chunks
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def iter_batches(
+        self,
+        pdf_path: str,
+        filename: str,
+        batch_size: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Process a PDF on disk as a stream of embedded micro-batches: extract, chunk, embed
+        
+        Every batch_size (INGEST_BATCH_CHUNKS) chunks are embedded and yielded
+        as {"chunks", "embeddings", "metadata", "content_hashes",
+        "pages_parsed", "reused_embeddings", "new_embeddings"}, ready to index,
+        while later pages are still being extracted. pages_parsed is the last
+        page number read so far, so pages without text count too.
+        """
+        batch_size = max(1, batch_size or settings.INGEST_BATCH_CHUNKS)
+        chunks = []
         metadata = []
+        pages_parsed = 0
         
-        for page_text, page_num in page_texts:
-            chunks = self.chunk_text(page_text)
-            for chunk in chunks:
-                all_chunks.append(chunk)
+        async for page_num, page_chunks in self.iter_page_chunks(pdf_path):
+            # The tail flush repeats an earlier page number; don't count it again
+            pages_parsed = max(pages_parsed, page_num)
+            for chunk in page_chunks:
+                chunks.append(chunk.text)
                 metadata.append({
-                    "page_number": page_num,
+                    "page_number": chunk.page_start,
+                    "page_end": chunk.page_end,
+                    "char_start": chunk.start,
+                    "char_end": chunk.end,
                     "filename": filename
                 })
+                if len(chunks) >= batch_size:
+                    yield await self._embed_chunks(chunks, metadata, pages_parsed)
+                    chunks, metadata = [], []
         
-        if not all_chunks:
-            raise ValueError("No text extracted from PDF")
+        if chunks:
+            yield await self._embed_chunks(chunks, metadata, pages_parsed)
+    
+    async def _embed_chunks(self, chunks: List[str], metadata: List[dict], pages_parsed: int) -> dict:
+        """Embed one micro-batch, reusing any chunk whose content was embedded before"""
+        hashes = [content_hash(chunk) for chunk in chunks]
+        # SQLite lookups; keep them off the event loop
+        known = await asyncio.to_thread(self.embedding_store.get_many, settings.EMBEDDING_MODEL, hashes)
         
-        # Generate embeddings
-        embeddings = await self.embed_batch(all_chunks)
+        pending = {}
+        for chunk, h in zip(chunks, hashes):
+            if h not in known and h not in pending:
+                pending[h] = chunk
+        if pending:
+            pending_hashes = list(pending.keys())
+            
+            async def store_batch(positions: List[int], vectors: List[List[float]]):
+                # Persist per request so a failed upload keeps the work already paid for
+                await asyncio.to_thread(
+                    self.embedding_store.put_many, settings.EMBEDDING_MODEL, [pending_hashes[i] for i in positions], vectors
+                )
+            
+            new_embeddings = await self.embedding_pipeline.embed(list(pending.values()), on_batch=store_batch)
+            known.update(zip(pending_hashes, new_embeddings))
         
         return {
-            "chunks": all_chunks,
-            "embeddings": embeddings,
-            "metadata": metadata
+            "chunks": chunks,
+            "embeddings": [known[h] for h in hashes],
+            "metadata": metadata,
+            "content_hashes": hashes,
+            "pages_parsed": pages_parsed,
+            "reused_embeddings": len(chunks) - len(pending),
+            "new_embeddings": len(pending)
         }
     
     async def embed_batch(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts"""
-        response = await client.embeddings.create(
-            model=settings.EMBEDDING_MODEL,
-            input=texts
-        )
-        return [item.embedding for item in response.data]
\ No newline at end of file
+        """Generate embeddings for multiple texts in token-bounded, concurrent, rate-limited batches"""
+        return await self.embedding_pipeline.embed(texts)
\ No newline at end of file
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used as the cache key: NFKC, lowercased, whitespace collapsed"""
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+
+def content_hash(text: str) -> str:
+    """Content address of a chunk: 128-bit BLAKE2b of its exact UTF-8 text"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# ========== Query Embedding Cache ==========
+class QueryEmbeddingCache:
+    """
+    Bounded LRU + TTL cache of query embeddings keyed by (model, normalized text).
+
+    Vectors are stored as float32 arrays. When a path is given, entries are
+    also written through to a SQLite file so the cache survives restarts;
+    memory misses fall back to that tier before calling the API.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl_seconds: float = 3600, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, float]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT, query TEXT, vector BLOB, created REAL, PRIMARY KEY (model, query))"
+            )
+            self.db.commit()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created > self.ttl_seconds
+
+    def _remember(self, key: Tuple[str, str], vector: np.ndarray, created: float):
+        self.entries[key] = (vector, created)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = (model, normalize_query(text))
+        entry = self.entries.get(key)
+        if entry is not None:
+            vector, created = entry
+            if not self._expired(created):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            del self.entries[key]
+
+        if self.db is not None:
+            row = self.db.execute(
+                "SELECT vector, created FROM query_embeddings WHERE model = ? AND query = ?", key
+            ).fetchone()
+            if row is not None and not self._expired(row[1]):
+                vector = np.frombuffer(row[0], dtype=np.float32)
+                self._remember(key, vector, row[1])
+                self.disk_hits += 1
+                return vector
+
+        self.misses += 1
+        return None
+
+    def peek(self, model: str, text: str) -> Optional[np.ndarray]:
+        """Memory-tier lookup that does not touch the LRU order or the counters"""
+        entry = self.entries.get((model, normalize_query(text)))
+        if entry is None or self._expired(entry[1]):
+            return None
+        return entry[0]
+
+    def put(self, model: str, text: str, vector: np.ndarray):
+        key = (model, normalize_query(text))
+        vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(-1)
+        created = time.time()
+        self._remember(key, vector, created)
+        if self.db is not None:
+            self.db.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, vector, created) VALUES (?, ?, ?, ?)",
+                (key[0], key[1], vector.tobytes(), created)
+            )
+            self.db.commit()
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+        }
+
+
+# ========== Chunk Embedding Store ==========
+class ChunkEmbeddingStore:
+    """
+    Content-addressed store of chunk embeddings: (model, content hash) -> vector.
+
+    Backed by SQLite when a path is given, so re-uploading a document or an
+    overlapping revision only embeds chunks that have never been seen.
+    Without a path it degrades to a process-local dict. Ingestion writes and
+    search threads read (rescoring) through one connection, under a lock.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.memory: Dict[Tuple[str, str], np.ndarray] = {}
+        self.db = None
+        self.lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+                "model TEXT, hash TEXT, vector BLOB, PRIMARY KEY (model, hash))"
+            )
+            self.db.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Return the stored vectors for whichever hashes are known"""
+        if self.db is None:
+            return {h: self.memory[(model, h)] for h in hashes if (model, h) in self.memory}
+
+        found = {}
+        unique = list(set(hashes))
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self.lock:
+                rows = self.db.execute(
+                    f"SELECT hash, vector FROM chunk_embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+            for h, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, hashes: List[str], vectors: List[List[float]]):
+        if self.db is None:
+            for h, vector in zip(hashes, vectors):
+                self.memory[(model, h)] = np.asarray(vector, dtype=np.float32)
+            return
+        rows = [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in zip(hashes, vectors)]
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO chunk_embeddings (model, hash, vector) VALUES (?, ?, ?)", rows)
+            self.db.commit()
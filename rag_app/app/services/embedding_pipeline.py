@@ -0,0 +1,154 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import openai
+from app.core.config import get_settings
+from app.services.telemetry import span
+from app.services.tokens import count_tokens
+
+settings = get_settings()
+
+# Errors worth retrying: throttling, timeouts, dropped connections and 5xx
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+# ========== Token Bucket ==========
+class TokenBucket:
+    """Client-side limiter refilling `rate_per_minute` units per minute, up to one minute of burst"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.available = rate_per_minute
+        self.updated = time.monotonic()
+        self.lock = None
+
+    async def acquire(self, amount: float):
+        # A request larger than the bucket can never fit; let it through once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                await asyncio.sleep((amount - self.available) / self.rate)
+
+
+# ========== Embedding Pipeline ==========
+class EmbeddingPipeline:
+    """
+    Embed many texts as token-aware batches with bounded concurrency.
+
+    Texts are packed into batches under EMBEDDING_BATCH_MAX_TOKENS and
+    EMBEDDING_BATCH_MAX_INPUTS, and up to EMBEDDING_MAX_CONCURRENCY batches are
+    in flight at once. Requests and tokens per minute are paced by token
+    buckets; 429s, timeouts and 5xx are retried with exponential backoff and
+    jitter (honouring Retry-After). A batch rejected as a whole is split in
+    half so one bad input does not sink its neighbours.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.model = settings.EMBEDDING_MODEL
+        self.request_bucket = TokenBucket(settings.EMBEDDING_RPM_LIMIT)
+        self.token_bucket = TokenBucket(settings.EMBEDDING_TPM_LIMIT)
+        self.semaphore = None
+
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text positions into batches within the per-request token and input limits"""
+        batches = []
+        current, current_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text, self.model)
+            if current and (
+                current_tokens + tokens > settings.EMBEDDING_BATCH_MAX_TOKENS
+                or len(current) >= settings.EMBEDDING_BATCH_MAX_INPUTS
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _request(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(count_tokens(text, self.model) for text in texts)
+        for attempt in range(settings.EMBEDDING_MAX_RETRIES + 1):
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(tokens)
+            try:
+                with span("embed", tokens=tokens, bytes=sum(len(text) for text in texts), items=len(texts)):
+                    # Retries are handled here, so the SDK's own retry loop is disabled
+                    return await self.provider.embed(texts, model=self.model, max_retries=0)
+            except RETRYABLE_ERRORS as e:
+                if attempt == settings.EMBEDDING_MAX_RETRIES:
+                    raise
+                delay = settings.EMBEDDING_RETRY_BASE_DELAY * (2 ** attempt)
+                retry_after = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                await asyncio.sleep(delay * (0.5 + random.random()))
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        try:
+            return await self._request(texts)
+        except openai.BadRequestError:
+            # e.g. the batch exceeded a request limit: bisect until the offending input is isolated
+            if len(texts) == 1:
+                raise
+            middle = len(texts) // 2
+            return await self._embed_batch(texts[:middle]) + await self._embed_batch(texts[middle:])
+
+    async def embed(
+        self,
+        texts: List[str],
+        on_batch: Optional[Callable[[List[int], List[List[float]]], Awaitable[None]]] = None
+    ) -> List[List[float]]:
+        """
+        Embed texts, preserving order.
+
+        on_batch(positions, vectors) is awaited as each batch completes, so
+        callers can persist progress; if some batches still fail after
+        retries, the completed ones have already been handed over and a
+        RuntimeError reports how many texts are missing.
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        async def run(batch: List[int]):
+            async with self.semaphore:
+                vectors = await self._embed_batch([texts[i] for i in batch])
+            for i, vector in zip(batch, vectors):
+                results[i] = vector
+            if on_batch is not None:
+                await on_batch(batch, vectors)
+
+        outcomes = await asyncio.gather(
+            *(run(batch) for batch in self.make_batches(texts)),
+            return_exceptions=True
+        )
+        errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        if errors:
+            missing = sum(1 for vector in results if vector is None)
+            raise RuntimeError(
+                f"Embedding failed for {missing} of {len(texts)} chunks after retries: {errors[0]}"
+            ) from errors[0]
+        return results
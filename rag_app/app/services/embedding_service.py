@@ -1,91 +1,737 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple
 import openai
-from openai import AsyncOpenAI
 import os
 from dotenv import load_dotenv
 import PyPDF2
 import io
-import uuid
+import heapq
+import threading
 import numpy as np
 import faiss
-import pickle
 from app.core.config import get_settings
+from app.services.chunk_store import ChunkSegment, ChunkStore
+from app.services.index_store import IndexSnapshotStore
+from app.services.index_factory import (
+    apply_default_parameters,
+    build_index,
+    compact_index,
+    has_ids,
+    index_dimension,
+    is_reduced,
+    merge_indexes,
+    migrate_index,
+    reconstruct_ids,
+    reduce_dimension,
+    search_parameters,
+    should_migrate,
+    should_quantize,
+    storage_factory,
+    with_ids
+)
+from app.services.embedding_cache import ChunkEmbeddingStore, QueryEmbeddingCache, content_hash
+from app.services.llm_provider import llm_provider
+from app.services.telemetry import span
+from app.services.tokens import count_tokens
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion, weighted_fusion
 settings = get_settings()
 
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def merge_start(sizes: List[int]) -> int:
+    """
+    Position from which segments should be merged into one; len(sizes) when
+    no merge is due.
+
+    The first segment is the base, the rest are deltas from recent writes.
+    Deltas are merged together once there are more than
+    INDEX_MAX_DELTA_SEGMENTS of them, and into the base once they hold
+    INDEX_DELTA_MERGE_RATIO of its rows, so the base is rewritten only after
+    the corpus has grown by that share.
+    """
+    if len(sizes) > 1 and sum(sizes[1:]) >= settings.INDEX_DELTA_MERGE_RATIO * sizes[0]:
+        return 0
+    if len(sizes) - 1 > settings.INDEX_MAX_DELTA_SEGMENTS:
+        return 1
+    return len(sizes)
+
+
+# ========== Store View ==========
+class StoreView:
+    """
+    An immutable snapshot of one collection: FAISS index segments, chunk store and BM25 postings.
+    
+    Searches read self.view once and use only that object, so they need no
+    lock; writers build a new view and publish it with a single assignment.
+    """
+    
+    __slots__ = ("indexes", "chunks", "lexical_index", "version")
+    
+    def __init__(self, indexes: Tuple, chunks: ChunkStore, lexical_index: BM25Index, version: int):
+        self.indexes = indexes
+        self.chunks = chunks
+        self.lexical_index = lexical_index
+        self.version = version
+    
+    @property
+    def ntotal(self) -> int:
+        return sum(index.ntotal for index in self.indexes)
+
+
+class WriteBatch:
+    """The working copy queued writes are applied to before one view is published"""
+    
+    def __init__(self, view: StoreView):
+        self.chunks = view.chunks.copy()
+        self.segments: List[ChunkSegment] = []
+        self.vectors: List[np.ndarray] = []
+        self.texts: List[str] = []
+        self.changed = False
+    
+    def add(self, chunks: List[str], vectors: np.ndarray, metadata: List[dict], content_hashes: List[str]) -> int:
+        # Drop chunks already indexed for the same file (or repeated within this batch)
+        keep = self.chunks.new_rows(content_hashes, [meta.get("filename") for meta in metadata])
+        if not keep:
+            return 0
+        if len(keep) < len(chunks):
+            chunks = [chunks[i] for i in keep]
+            vectors = vectors[keep]
+            metadata = [metadata[i] for i in keep]
+            content_hashes = [content_hashes[i] for i in keep]
+        
+        self.segments.append(self.chunks.append(chunks, metadata, content_hashes))
+        self.vectors.append(vectors)
+        self.texts.extend(chunks)
+        self.changed = True
+        return len(chunks)
+    
+    def delete(self, filename: str) -> int:
+        deleted = len(self.chunks.delete_file(filename))
+        self.changed = self.changed or deleted > 0
+        return deleted
+    
+    def publish(self, staged: "StagedDocument") -> Tuple[int, int]:
+        # Delete first: the staged rows were only deduplicated against each other
+        deleted = self.delete(staged.filename)
+        self.segments.extend(self.chunks.extend(staged.chunks))
+        self.vectors.extend(staged.vectors)
+        self.texts.extend(staged.chunks.texts())
+        self.changed = self.changed or len(staged.chunks) > 0
+        return len(staged.chunks), deleted
+
+
+class StagedDocument:
+    """
+    The next version of a file, built up batch by batch where searches cannot see it.
+    
+    Rows are held in the form the index keeps them, columnar chunk segments
+    and indexed float32 vectors, and VectorStoreService.publish_document()
+    attaches those same segments in the write that deletes the old version.
+    Dropping the object discards the version.
+    """
+    
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.chunks = ChunkStore()
+        self.vectors: List[np.ndarray] = []
+    
+    def add(self, chunks: List[str], vectors: np.ndarray, metadata: List[dict], content_hashes: List[str]) -> int:
+        # Only repeats within this version are dropped; the old version is deleted when publishing
+        keep = self.chunks.new_rows(content_hashes, [meta.get("filename") for meta in metadata])
+        if not keep:
+            return 0
+        if len(keep) < len(chunks):
+            chunks = [chunks[i] for i in keep]
+            vectors = vectors[keep]
+            metadata = [metadata[i] for i in keep]
+            content_hashes = [content_hashes[i] for i in keep]
+        self.chunks.append(chunks, metadata, content_hashes)
+        self.vectors.append(vectors)
+        return len(chunks)
+
+
+class PendingWrite:
+    __slots__ = ("apply", "result", "error", "done")
+    
+    def __init__(self, apply: Callable[[WriteBatch], object]):
+        self.apply = apply
+        self.result = None
+        self.error = None
+        self.done = False
 
 
 # ========== Vector Store Service ==========
 class VectorStoreService:
-    def __init__(self):
-        self.dimension = settings.EMBEDDING_MODEL_DIM  # text-embedding-3-small dimension
-        self.index = None
-        self.chunks = []
-        self.chunk_ids = []
-        self.metadata = []
-    
-    def initialize_index(self):
-        """Initialize FAISS index"""
-        if self.index is None:
-            self.index = faiss.IndexFlatIP(self.dimension)  
+    """
+    One collection: FAISS index segments, its chunk sidecars and BM25 postings.
+    
+    directory is where its snapshots live; collections share one query
+    embedding cache and one chunk embedding store, passed in as query_cache
+    and embedding_store.
+    
+    The index may hold a reduced form of the embeddings: their first
+    INDEX_DIMENSION components, renormalized, and / or a base segment stored
+    as INDEX_QUANTIZATION codes. Dense searches then fetch RESCORE_MULTIPLIER
+    times more candidates and rescore them exactly on the full embeddings in
+    the chunk embedding store.
+    
+    Vectors are indexed under their chunk ids. Deleting a file tombstones its
+    rows, which searches filter out until compact() rebuilds the index and
+    chunk store without them.
+    
+    Reads never lock: everything a search touches hangs off self.view, an
+    immutable StoreView. Writes are queued and applied by whichever writer
+    holds the write lock, which drains the queue into one copy-on-write batch
+    (new rows get a small delta index segment and BM25 segment; the chunk
+    store is copied shallowly) and publishes it as the next view in a single
+    assignment, so a search sees every write of a batch or none of it.
+    
+    A read_only store (VECTOR_STORE_MODE=reader) never writes: it serves the
+    snapshots another process publishes, memory-mapped zero-copy so that
+    every worker shares one copy of the vectors, and refresh() picks up new
+    generations.
+    """
+    
+    def __init__(
+        self,
+        name: Optional[str] = None,
+        directory: Optional[str] = None,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        read_only: bool = False,
+        embedding_store: Optional[ChunkEmbeddingStore] = None
+    ):
+        self.name = name or settings.DEFAULT_COLLECTION
+        self.read_only = read_only
+        self.dimension = index_dimension()  # Dimensions held in the index; EMBEDDING_MODEL_DIM unless INDEX_DIMENSION is set
+        self.view = StoreView((), ChunkStore(), BM25Index(k1=settings.BM25_K1, b=settings.BM25_B), 0)
+        self.index_files: List[Optional[str]] = []  # Snapshot file of each index segment, None until written
+        self.write_lock = threading.Lock()  # Held by the writer applying queued writes, and by compaction
+        self.pending: List[PendingWrite] = []
+        self.pending_lock = threading.Lock()
+        self.query_cache = query_cache or QueryEmbeddingCache(
+            max_entries=settings.QUERY_CACHE_SIZE,
+            ttl_seconds=settings.QUERY_CACHE_TTL,
+            path=settings.QUERY_CACHE_PATH
+        )
+        self.embedding_store = embedding_store or ChunkEmbeddingStore(settings.CHUNK_EMBEDDING_STORE_PATH)
+        directory = directory or settings.FAISS_INDEX_DIR
+        self.snapshot = IndexSnapshotStore(directory) if settings.PERSIST_INDEX else None
+    
+    @property
+    def chunks(self) -> ChunkStore:
+        return self.view.chunks
+    
+    @property
+    def version(self) -> int:
+        """Bumped whenever the corpus changes; caches keyed on results check it"""
+        return self.view.version
+    
+    def load(self) -> int:
+        """Restore the index and chunk sidecars from the last snapshot in this collection's directory"""
+        if self.snapshot is None:
+            return 0
+        state = self.snapshot.load(self.dimension, mmap=settings.INDEX_MMAP, read_only=self.read_only)
+        if state is None:
+            return 0
+        with self.write_lock:
+            self._install(state)
+        return self.view.ntotal
+    
+    def refresh(self) -> bool:
+        """
+        Switch to a newer snapshot generation if one was published; returns True when it did.
+        
+        When the writer only appended rows, unchanged index segments are
+        reused and only the new chunk segments, tombstones and BM25 postings
+        are added to a copy of the current view; after a compaction the
+        snapshot is loaded in full.
+        """
+        if self.snapshot is None or self.snapshot.is_current():
+            return False
+        with self.write_lock:
+            view = self.view
+            state = self.snapshot.load(
+                self.dimension,
+                mmap=settings.INDEX_MMAP,
+                read_only=self.read_only,
+                reuse=dict(zip(self.index_files, view.indexes))
+            )
+            if state is None:
+                return False
+            self._install(state, view if state["appended"] else None)
+        return True
+    
+    def _install(self, state: dict, base: Optional[StoreView] = None):
+        """Publish a loaded snapshot as the next view; `base` is the view it appends to, if any. Caller holds write_lock"""
+        if self.read_only and not all(has_ids(index) for index in state["indexes"]):
+            # Converting would modify the zero-copy mapping
+            raise ValueError(
+                f"Snapshot in {self.snapshot.directory} predates chunk ids; load it once in standalone mode to convert it"
+            )
+        indexes = [with_ids(index) for index in state["indexes"]]
+        for index in indexes:
+            apply_default_parameters(index)
+        
+        if base is None:
+            chunks = ChunkStore()
+            lexical_index = BM25Index(k1=settings.BM25_K1, b=settings.BM25_B)
+        else:
+            chunks = base.chunks.copy()
+            lexical_index = base.lexical_index
+        start = len(chunks)
+        for segment in state["segments"]:
+            chunks.adopt(segment)
+        chunks.delete_ids(np.setdiff1d(state["tombstones"], chunks.deleted_ids))
+        
+        # The BM25 postings are derived data, rebuilt from the restored chunks
+        lexical_index = lexical_index.extended([chunks.text(row) for row in range(start, len(chunks))])
+        lexical_index = lexical_index.merged(merge_start([segment.num_docs for segment in lexical_index.segments]))
+        
+        self.view = StoreView(tuple(indexes), chunks, lexical_index, self.view.version + 1)
+        # Snapshots from before explicit ids: persist the converted index once
+        self.index_files = [
+            name if index is original else None
+            for name, index, original in zip(state["index_files"], indexes, state["indexes"])
+        ]
+        if None in self.index_files:
+            self._persist()
+    
+    def _persist(self, segments: List[ChunkSegment] = (), compacted: bool = False):
+        if self.snapshot is not None:
+            view = self.view
+            self.index_files = self.snapshot.save(
+                list(view.indexes),
+                self.index_files,
+                segments,
+                view.chunks.filenames,
+                tombstones=view.chunks.deleted_ids,
+                compacted=compacted
+            )
+    
+    def _merged_indexes(self, indexes: List, files: List[Optional[str]], vectors: np.ndarray, ids: np.ndarray):
+        """Index segments after adding a delta segment for new rows and merging per merge_start()"""
+        delta = build_index(self.dimension, "Flat")
+        delta.add_with_ids(vectors, ids)
+        indexes, files = indexes + [delta], files + [None]
+        
+        if should_migrate(indexes):
+            # Switch to the configured ANN index once the corpus is large enough to train it
+            return [migrate_index(merge_indexes(indexes))], [None]
+        
+        start = merge_start([index.ntotal for index in indexes])
+        if start < len(indexes) - 1:
+            merged = merge_indexes(indexes[start:])
+            if start == 0 and should_quantize(merged):
+                # The base is being rewritten anyway: store it as INDEX_QUANTIZATION codes. Deltas stay float
+                merged = migrate_index(merged, storage_factory())
+            indexes = indexes[:start] + [merged]
+            files = files[:start] + [None]
+        return indexes, files
+    
+    def _commit(self, batch: List[PendingWrite]):
+        """Apply queued writes to one working copy and publish it as the next view; caller holds write_lock"""
+        view = self.view
+        work = WriteBatch(view)
+        try:
+            for write in batch:
+                write.result = write.apply(work)
             
-    def add_documents(self, chunks: List[str], embeddings: List[List[float]], metadata: List[dict]):
-        """Add documents to the vector store"""
-        self.initialize_index()
+            if work.changed:
+                indexes, files = list(view.indexes), list(self.index_files)
+                lexical_index = view.lexical_index
+                if work.vectors:
+                    ids = np.concatenate([np.asarray(segment.ids) for segment in work.segments])
+                    indexes, files = self._merged_indexes(indexes, files, np.vstack(work.vectors), ids)
+                    lexical_index = lexical_index.extended(work.texts)
+                    lexical_index = lexical_index.merged(
+                        merge_start([segment.num_docs for segment in lexical_index.segments])
+                    )
+                
+                self.view = StoreView(tuple(indexes), work.chunks, lexical_index, view.version + 1)
+                self.index_files = files
+                # Persist only the new rows and any new index segment
+                self._persist(work.segments)
+        except Exception as e:
+            for write in batch:
+                write.error = e
+        finally:
+            for write in batch:
+                write.done = True
+    
+    def _write(self, apply: Callable[[WriteBatch], object]):
+        """
+        Queue a write and return its result once it is published.
         
-        # Convert to numpy array and normalize
-        vectors = np.array(embeddings, dtype=np.float32)
-        faiss.normalize_L2(vectors)
+        Writes queued while another batch is being applied are committed
+        together by the next writer to take the lock (group commit).
+        """
+        if self.read_only:
+            raise PermissionError(f"Collection {self.name!r} is read-only in this process; writes go through the ingest writer")
+        write = PendingWrite(apply)
+        with self.pending_lock:
+            self.pending.append(write)
+        with self.write_lock:
+            if not write.done:
+                with self.pending_lock:
+                    batch, self.pending = self.pending, []
+                self._commit(batch)
+        if write.error is not None:
+            raise write.error
+        return write.result
+    
+    def _vectors(self, embeddings: List[List[float]]) -> np.ndarray:
+        # Convert to numpy array, keep the indexed dimensions and normalize
+        vectors = np.array(embeddings, dtype=np.float32).reshape(-1, settings.EMBEDDING_MODEL_DIM)
+        return reduce_dimension(vectors, self.dimension)
+    
+    def add_documents(
+        self,
+        chunks: List[str],
+        embeddings: List[List[float]],
+        metadata: List[dict],
+        content_hashes: Optional[List[str]] = None
+    ):
+        """Add documents to the vector store, skipping chunks whose content is already indexed"""
+        if content_hashes is None:
+            content_hashes = [content_hash(chunk) for chunk in chunks]
+        vectors = self._vectors(embeddings)
+        return self._write(lambda work: work.add(chunks, vectors, metadata, content_hashes))
+    
+    def delete_document(self, filename: str) -> int:
+        """Tombstone every chunk of a file; returns how many were deleted"""
+        return self._write(lambda work: work.delete(filename))
+    
+    def replace_document(
+        self,
+        filename: str,
+        chunks: List[str],
+        embeddings: List[List[float]],
+        metadata: List[dict],
+        content_hashes: Optional[List[str]] = None
+    ) -> Tuple[int, int]:
+        """
+        Swap a file's chunks for a new version; returns (added, deleted).
         
-        # Add to FAISS
-        self.index.add(vectors)
+        Searches see either the old version or the new one, never a mix.
+        """
+        staged = StagedDocument(filename)
+        self.stage_document(staged, chunks, embeddings, metadata, content_hashes)
+        return self.publish_document(staged)
+    
+    def stage_document(
+        self,
+        staged: StagedDocument,
+        chunks: List[str],
+        embeddings: List[List[float]],
+        metadata: List[dict],
+        content_hashes: Optional[List[str]] = None
+    ) -> int:
+        """Add a batch to a staged file version; returns the chunks kept. Takes no lock"""
+        if content_hashes is None:
+            content_hashes = [content_hash(chunk) for chunk in chunks]
+        return staged.add(chunks, self._vectors(embeddings), metadata, content_hashes)
+    
+    def publish_document(self, staged: StagedDocument) -> Tuple[int, int]:
+        """
+        Swap a file's chunks for a staged version in one write; returns (added, deleted).
         
-        # Store chunks and metadata
-        chunk_ids = [str(uuid.uuid4()) for _ in chunks]
-        self.chunks.extend(chunks)
-        self.chunk_ids.extend(chunk_ids)
-        self.metadata.extend(metadata)
+        Searches see either the old version or the new one, never a mix.
+        """
+        return self._write(lambda work: work.publish(staged))
+    
+    def compact(self) -> int:
+        """
+        Drop tombstoned chunks from the index, chunk store and BM25 postings.
         
-        return len(chunks)
+        The new copies are built from the current view, which stays
+        searchable meanwhile; writes queue up and are committed after it.
+        Returns the rows removed.
+        """
+        if self.read_only:
+            return 0
+        with self.write_lock:
+            view = self.view
+            removed = view.chunks.deleted_ids
+            if not view.indexes or not len(removed):
+                return 0
+            
+            index = view.indexes[0] if len(view.indexes) == 1 else merge_indexes(list(view.indexes))
+            index = compact_index(index, removed)
+            if should_quantize(index):
+                index = migrate_index(index, storage_factory())
+            chunks = view.chunks.compacted()
+            lexical_index = BM25Index(k1=settings.BM25_K1, b=settings.BM25_B).extended(chunks.texts())
+            
+            self.view = StoreView((index,), chunks, lexical_index, view.version + 1)
+            self.index_files = [None]
+            self._persist(chunks.segments, compacted=True)
+        return len(removed)
     
-    async def search(self, query: str, top_k: int = 3) -> List[dict]:
-        """Search for similar chunks"""
-        if self.index is None or self.index.ntotal == 0:
-            return []
+    async def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query and return it as a normalized (1, dimension) float32 array"""
+        cached = self.query_cache.get(settings.EMBEDDING_MODEL, query)
+        if cached is not None:
+            return cached.reshape(1, -1)
         
-        # Generate query embedding
-        response = await client.embeddings.create(
-            model=settings.EMBEDDING_MODEL,
-            input=query
-        )
-        query_embedding = response.data[0].embedding
+        # A single short request on the critical path: hedged against slow responses
+        with span("query_embedding", tokens=count_tokens(query, settings.EMBEDDING_MODEL), bytes=len(query)):
+            query_embedding = (await llm_provider.embed([query], hedge=True))[0]
         
         # Convert to numpy and normalize
         query_vector = np.array([query_embedding], dtype=np.float32)
         faiss.normalize_L2(query_vector)
+        self.query_cache.put(settings.EMBEDDING_MODEL, query, query_vector)
+        return query_vector
+    
+    def dense_search(
+        self,
+        view: StoreView,
+        query_vector: np.ndarray,
+        top_k: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        within: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """FAISS search over every index segment of a view, returning (row, score) pairs, optionally restricted to the rows in `within`"""
+        return self.dense_search_many(view, query_vector, top_k, nprobe, ef_search, within)[0]
+    
+    def dense_search_many(
+        self,
+        view: StoreView,
+        query_vectors: np.ndarray,
+        top_k: int,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        within: Optional[np.ndarray] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """dense_search for every row of query_vectors, with one matrix search per index segment"""
+        ids = None if within is None else view.chunks.ids_of(within)
+        full_queries = query_vectors
+        if query_vectors.shape[1] > self.dimension:
+            query_vectors = reduce_dimension(query_vectors, self.dimension)
+        rescore = is_reduced() and settings.RESCORE_MULTIPLIER > 0 and full_queries.shape[1] == settings.EMBEDDING_MODEL_DIM
+        candidates = top_k * settings.RESCORE_MULTIPLIER if rescore else top_k
+        hits = [[] for _ in range(len(query_vectors))]
+        with span("faiss_search") as stage:
+            for index in view.indexes:
+                if index.ntotal == 0:
+                    continue
+                params = search_parameters(
+                    index,
+                    nprobe=nprobe,
+                    ef_search=ef_search,
+                    ids=ids,
+                    excluded_ids=view.chunks.deleted_ids
+                )
+                distances, labels = index.search(query_vectors, min(candidates, index.ntotal), params=params)
+                for query_hits, query_labels, query_distances in zip(hits, labels, distances):
+                    # ANN indexes pad with -1 when fewer than top_k candidates are found
+                    found = query_labels >= 0
+                    query_hits.extend(zip(query_labels[found].tolist(), query_distances[found].tolist()))
+            
+            hits = [heapq.nlargest(candidates, query_hits, key=lambda hit: hit[1]) for query_hits in hits]
+            stage.add(items=sum(len(query_hits) for query_hits in hits))
+        rows = view.chunks.rows_of(
+            np.array([chunk_id for query_hits in hits for chunk_id, _ in query_hits], dtype=np.int64)
+        ).tolist()
+        results, position = [], 0
+        for query_hits in hits:
+            results.append([(row, score) for row, (_, score) in zip(rows[position:], query_hits)])
+            position += len(query_hits)
+        return self._rescore(view, results, full_queries, top_k) if rescore else results
+    
+    def _rescore(
+        self,
+        view: StoreView,
+        hits: List[List[Tuple[int, float]]],
+        query_vectors: np.ndarray,
+        top_k: int
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        The top_k of each query's hits by exact cosine similarity with its full
+        query embedding. Candidate embeddings are read from the chunk
+        embedding store by content hash, in one lookup for all queries; hits
+        whose embedding is not stored keep their approximate score.
+        """
+        rows = np.array(sorted({row for query_hits in hits for row, _ in query_hits}), dtype=np.int64)
+        if not len(rows):
+            return hits
+        with span("rescore", items=len(rows)):
+            hashes = view.chunks.hashes_of(rows)
+            stored = self.embedding_store.get_many(settings.EMBEDDING_MODEL, hashes)
+            found = [i for i, content in enumerate(hashes) if content in stored]
+            exact = {}
+            if found:
+                vectors = np.vstack([stored[hashes[i]] for i in found]).reshape(len(found), -1)
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                # Every query against every candidate; the candidates are few
+                scores = query_vectors @ (vectors / norms).T
+                exact = {row: i for i, row in enumerate(rows[found].tolist())}
+            results = []
+            for q, query_hits in enumerate(hits):
+                rescored = [
+                    (row, float(scores[q, exact[row]]) if row in exact else score)
+                    for row, score in query_hits
+                ]
+                results.append(heapq.nlargest(top_k, rescored, key=lambda hit: hit[1]))
+        return results
+    
+    def stored_vectors(self, ids: List[int]) -> np.ndarray:
+        """Normalized vectors of chunks by id, read back from the index; zeros for ids no longer present"""
+        view = self.view
+        vectors = np.zeros((len(ids), self.dimension), dtype=np.float32)
+        missing = dict(zip(ids, range(len(ids))))
+        for index in view.indexes:
+            if not missing:
+                break
+            for chunk_id, vector in reconstruct_ids(index, list(missing)).items():
+                vectors[missing.pop(chunk_id)] = vector
+        return vectors
+    
+    def full_vectors(self, ids: List[int]) -> Optional[np.ndarray]:
+        """
+        Normalized full embeddings of chunks by id, read from the chunk
+        embedding store by content hash; zeros for ids no longer present.
+        None when an embedding is not stored, e.g. the store is disabled.
+        """
+        chunks = self.view.chunks
+        vectors = np.zeros((len(ids), settings.EMBEDDING_MODEL_DIM), dtype=np.float32)
+        if not len(ids) or not len(chunks):
+            return vectors
+        ids = np.asarray(ids, dtype=np.int64)
+        # rows_of() assumes the ids exist; compaction may have dropped some since the search
+        rows = np.clip(chunks.rows_of(ids), 0, len(chunks) - 1)
+        present = np.flatnonzero(chunks.ids_of(rows) == ids)
+        if not len(present):
+            return vectors
+        hashes = chunks.hashes_of(rows[present])
+        stored = self.embedding_store.get_many(settings.EMBEDDING_MODEL, hashes)
+        if not all(content in stored for content in hashes):
+            return None
+        found = np.vstack([stored[content] for content in hashes]).reshape(len(present), -1)
+        norms = np.linalg.norm(found, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors[present] = found / norms
+        return vectors
+    
+    def _build_result(self, view: StoreView, idx: int, score: float) -> dict:
+        result = view.chunks.row(idx)
+        # Integer ids are per collection; qualify them so results from several collections stay distinct
+        result["chunk_id"] = f"{self.name}:{result['chunk_id']}"
+        result["score"] = score
+        result["collection"] = self.name
+        return result
+    
+    def search_vector(
+        self,
+        query: str,
+        query_vector: Optional[np.ndarray],
+        top_k: int = 3,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        mode: Optional[str] = None,
+        alpha: Optional[float] = None,
+        filenames: Optional[List[str]] = None
+    ) -> List[dict]:
+        """
+        Search with a query that has already been embedded (query_vector may be
+        None in lexical mode). Safe to call from any thread; takes no lock.
+        """
+        return self.search_vectors([query], query_vector, top_k, nprobe, ef_search, mode, alpha, filenames)[0]
+    
+    def search_vectors(
+        self,
+        queries: List[str],
+        query_vectors: Optional[np.ndarray],
+        top_k: int = 3,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        mode: Optional[str] = None,
+        alpha: Optional[float] = None,
+        filenames: Optional[List[str]] = None
+    ) -> List[List[dict]]:
+        """
+        search_vector for several queries against one view, their vectors
+        the rows of query_vectors, so dense retrieval is one matrix search.
+        """
+        mode = mode or settings.SEARCH_MODE
+        alpha = settings.HYBRID_SEARCH_ALPHA if alpha is None else alpha
+        
+        view = self.view
+        if view.chunks.live == 0:
+            return [[] for _ in queries]
+        
+        within = None
+        if filenames is not None:
+            within = view.chunks.rows_for_files(filenames)
+            if len(within) == 0:
+                return [[] for _ in queries]
         
-        # Search
-        distances, indices = self.index.search(query_vector, min(top_k, self.index.ntotal))
+        excluded = view.chunks.deleted_rows
+        if mode == "lexical":
+            with span("bm25_search", bytes=sum(len(query) for query in queries)):
+                hits = [view.lexical_index.search(query, top_k, within=within, excluded=excluded) for query in queries]
+        elif mode == "dense":
+            hits = self.dense_search_many(view, query_vectors, top_k, nprobe=nprobe, ef_search=ef_search, within=within)
+        else:
+            # Over-fetch from both retrievers so fusion has overlapping candidates to work with
+            candidates = top_k * settings.HYBRID_CANDIDATE_MULTIPLIER
+            dense_hits = self.dense_search_many(view, query_vectors, candidates, nprobe=nprobe, ef_search=ef_search, within=within)
+            with span("bm25_search", bytes=sum(len(query) for query in queries)):
+                lexical_hits = [view.lexical_index.search(query, candidates, within=within, excluded=excluded) for query in queries]
+            if settings.HYBRID_FUSION == "rrf":
+                hits = [
+                    reciprocal_rank_fusion(dense, lexical, alpha, top_k, k=settings.RRF_K)
+                    for dense, lexical in zip(dense_hits, lexical_hits)
+                ]
+            else:
+                hits = [weighted_fusion(dense, lexical, alpha, top_k) for dense, lexical in zip(dense_hits, lexical_hits)]
         
         # Build results
-        results = []
-        for idx, score in zip(indices[0], distances[0]):
-            if idx < len(self.chunks):
-                results.append({
-                    "content": self.chunks[idx],
-                    "score": float(score),
-                    "chunk_id": self.chunk_ids[idx],
-                    "page_number": self.metadata[idx].get("page_number")
-                })
+        return [[self._build_result(view, idx, score) for idx, score in query_hits] for query_hits in hits]
+    
+    async def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        mode: Optional[str] = None,
+        alpha: Optional[float] = None,
+        filenames: Optional[List[str]] = None
+    ) -> List[dict]:
+        """
+        Search for similar chunks.
         
-        return results
+        mode: "dense" (FAISS only), "lexical" (BM25 only, no embedding call) or
+        "hybrid" (both, fused by HYBRID_FUSION with weight alpha on the dense side).
+        nprobe / ef_search override the IVF / HNSW search parameters for this query.
+        filenames restricts results to chunks from those files.
+        """
+        if self.view.chunks.live == 0:
+            return []
+        
+        mode = mode or settings.SEARCH_MODE
+        query_vector = None if mode == "lexical" else await self.embed_query(query)
+        return self.search_vector(query, query_vector, top_k, nprobe, ef_search, mode, alpha, filenames)
     
     def get_stats(self) -> dict:
         """Get vector store statistics"""
+        view = self.view
         return {
-            "total_chunks": len(self.chunks),
-            "indexed_vectors": self.index.ntotal if self.index else 0
-        }
\ No newline at end of file
+            "total_chunks": view.chunks.live,
+            "tombstones": len(view.chunks.deleted_rows),
+            "indexed_vectors": view.ntotal,
+            "index_type": type(faiss.downcast_index(view.indexes[0])).__name__ if view.indexes else None,
+            "index_segments": len(view.indexes),
+            "index_dimension": self.dimension,
+            "index_quantization": settings.INDEX_QUANTIZATION,
+            "files": len(view.chunks.file_rows),
+            "chunk_store_bytes": view.chunks.nbytes,
+            "lexical_terms": view.lexical_index.num_terms,
+            "lexical_segments": len(view.lexical_index.segments),
+            "generation": self.snapshot.manifest["generation"] if self.snapshot and self.snapshot.manifest else None,
+            "read_only": self.read_only
+        }
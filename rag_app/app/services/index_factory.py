@@ -0,0 +1,280 @@
+import threading
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from app.core.config import get_settings
+
+settings = get_settings()
+
+direct_map_lock = threading.Lock()  # Guards building IVF id -> position maps on shared indexes
+
+# INDEX_QUANTIZATION -> factory of the brute-force base index; codes per vector for d dimensions
+QUANTIZATION_FACTORIES = {
+    "none": "Flat",  # 4d bytes
+    "fp16": "SQfp16",  # 2d bytes
+    "sq8": "SQ8",  # d bytes, per-dimension ranges trained on the base's vectors
+    "binary": "RaBitQ",  # d / 8 bytes plus a few correction factors
+}
+
+
+# ========== Index Factory ==========
+def has_native_ids(index) -> bool:
+    """IVF indexes store arbitrary ids themselves; others need an IndexIDMap2 wrapper"""
+    return faiss.try_extract_index_ivf(index) is not None
+
+
+def unwrap(index):
+    """The index doing the actual search, below any IndexIDMap2 / IndexPreTransform wrapper"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap2):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def is_flat(index) -> bool:
+    """True for the exact brute-force index every store starts with"""
+    return isinstance(unwrap(index), faiss.IndexFlat)
+
+
+def is_brute_force(index) -> bool:
+    """True for a brute-force index, exact (Flat) or over quantized codes (INDEX_QUANTIZATION)"""
+    return isinstance(unwrap(index), (faiss.IndexFlat, faiss.IndexScalarQuantizer, faiss.IndexRaBitQ))
+
+
+# ========== Storage Modes ==========
+def index_dimension() -> int:
+    """Dimensions stored in the index: INDEX_DIMENSION, or the full embedding"""
+    return settings.INDEX_DIMENSION or settings.EMBEDDING_MODEL_DIM
+
+
+def storage_factory() -> str:
+    """Factory string of the brute-force base index for INDEX_QUANTIZATION"""
+    if settings.INDEX_QUANTIZATION not in QUANTIZATION_FACTORIES:
+        raise ValueError(
+            f"INDEX_QUANTIZATION {settings.INDEX_QUANTIZATION!r}: expected one of {', '.join(QUANTIZATION_FACTORIES)}"
+        )
+    return QUANTIZATION_FACTORIES[settings.INDEX_QUANTIZATION]
+
+
+def is_reduced() -> bool:
+    """True when the index holds fewer dimensions or coarser codes than the embeddings"""
+    return index_dimension() < settings.EMBEDDING_MODEL_DIM or storage_factory() != "Flat"
+
+
+def reduce_dimension(vectors: np.ndarray, dimension: int) -> np.ndarray:
+    """
+    The first `dimension` components of each row, L2-normalized again, as a
+    new float32 array. For text-embedding-3 models this is the shortened
+    embedding the API returns for `dimensions`.
+    """
+    reduced = np.array(vectors[:, :dimension], dtype=np.float32, order="C")
+    faiss.normalize_L2(reduced)
+    return reduced
+
+
+def should_quantize(index) -> bool:
+    """A float Flat base is stored in the INDEX_QUANTIZATION form whenever it is rewritten"""
+    return storage_factory() != "Flat" and is_flat(index)
+
+
+def build_index(dimension: int, factory: Optional[str] = None):
+    """
+    Build an empty inner-product index from a FAISS factory string.
+
+    Examples: "Flat", "HNSW32,Flat", "IVF1024,PQ64", "OPQ64,IVF4096,PQ64".
+    Vectors are added with explicit ids (the chunk ids), so indexes without
+    native id support are wrapped in an IndexIDMap2.
+    """
+    factory = factory or settings.INDEX_FACTORY
+    index = faiss.index_factory(dimension, factory, faiss.METRIC_INNER_PRODUCT)
+    if not has_native_ids(index):
+        if isinstance(index, faiss.IndexPreTransform):
+            # IndexIDMap2 does not pass id filters through a pre-transform to the index below it
+            raise ValueError(f"INDEX_FACTORY {factory!r}: pre-transforms (e.g. OPQ) are only supported with IVF indexes")
+        index = faiss.index_factory(dimension, "IDMap2," + factory, faiss.METRIC_INNER_PRODUCT)
+    apply_default_parameters(index)
+    return index
+
+
+def has_ids(index) -> bool:
+    """False for indexes from snapshots written before vectors were added under chunk ids"""
+    return has_native_ids(index) or isinstance(faiss.downcast_index(index), faiss.IndexIDMap2)
+
+
+def with_ids(index):
+    """
+    Give an index from an older snapshot explicit ids.
+
+    Those were positional, and chunk ids were assigned in row order, so row
+    positions are the ids; Flat / HNSW indexes are rebuilt under an IndexIDMap2.
+    """
+    if has_ids(index):
+        return index
+    vectors = index.reconstruct_n(0, index.ntotal)
+    inner = faiss.clone_index(index)
+    inner.reset()
+    target = faiss.IndexIDMap2(inner)
+    target.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    apply_default_parameters(target)
+    return target
+
+
+def apply_default_parameters(index):
+    """Set the configured nprobe / efSearch defaults on an index"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(settings.IVF_NPROBE, ivf.nlist)
+    hnsw = unwrap(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        hnsw.hnsw.efSearch = settings.HNSW_EF_SEARCH
+
+
+def should_migrate(indexes: List) -> bool:
+    """Flat index segments are migrated to INDEX_FACTORY once together they cross the threshold"""
+    return (
+        settings.INDEX_FACTORY != "Flat"
+        and is_brute_force(indexes[0])
+        and sum(index.ntotal for index in indexes) >= settings.INDEX_MIGRATION_THRESHOLD
+    )
+
+
+def stored_vectors(index):
+    """
+    (vectors, ids) held by an IndexIDMap2-wrapped brute-force or HNSW index,
+    in insertion order; decoded, so approximate for quantized codes
+    """
+    ids = faiss.vector_to_array(faiss.downcast_index(index).id_map)
+    return faiss.downcast_index(index).index.reconstruct_n(0, index.ntotal), ids
+
+
+def migrate_index(index, factory: Optional[str] = None):
+    """
+    Rebuild a brute-force index as an approximate or quantized one.
+
+    The stored vectors are reconstructed from the index, a random sample of
+    at most INDEX_TRAIN_SIZE rows trains the target (IVF centroids, PQ / OPQ
+    codebooks) and every vector is re-added under its original id.
+    """
+    vectors, ids = stored_vectors(index)
+    target = build_index(index.d, factory)
+
+    if not target.is_trained:
+        sample = vectors
+        if len(vectors) > settings.INDEX_TRAIN_SIZE:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), settings.INDEX_TRAIN_SIZE, replace=False)]
+        target.train(sample)
+
+    target.add_with_ids(vectors, ids)
+    return target
+
+
+def merge_indexes(indexes: List):
+    """
+    A new index holding the vectors of all of `indexes`, which are left untouched.
+
+    The first may be of any type; the rest are the small IndexIDMap2 Flat
+    segments new rows are indexed in, so their vectors can be read back.
+    """
+    target = faiss.clone_index(indexes[0])
+    for segment in indexes[1:]:
+        if segment.ntotal == 0:
+            continue
+        vectors, ids = stored_vectors(segment)
+        target.add_with_ids(vectors, ids)
+    apply_default_parameters(target)
+    return target
+
+
+def compact_index(index, removed_ids: np.ndarray):
+    """
+    A copy of the index without removed_ids; the original is left untouched,
+    so searches can keep using it until the copy is swapped in.
+    """
+    target = faiss.clone_index(index)
+    if isinstance(unwrap(index), faiss.IndexHNSW):
+        # HNSW graphs cannot drop nodes: rebuild from the remaining vectors
+        vectors, ids = stored_vectors(index)
+        keep = ~np.isin(ids, removed_ids)
+        target.reset()
+        target.add_with_ids(vectors[keep], ids[keep])
+    else:
+        ivf = faiss.try_extract_index_ivf(target)
+        if ivf is not None:
+            # A hashtable direct map (see reconstruct_ids) only supports removal by IDSelectorArray
+            ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+        target.remove_ids(faiss.IDSelectorBatch(removed_ids.astype(np.int64)))
+    apply_default_parameters(target)
+    return target
+
+
+def reconstruct_ids(index, ids: List[int]) -> Dict[int, np.ndarray]:
+    """
+    Stored vectors of those ids that are in this index, decoded from its codes
+    (approximate for PQ / SQ indexes).
+
+    IVF indexes get a hashtable id -> list position map on first use, about
+    16 bytes per vector; the index data itself is not modified.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        with direct_map_lock:
+            if ivf.direct_map.type != faiss.DirectMap.Hashtable:
+                ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    vectors = {}
+    for chunk_id in ids:
+        try:
+            vectors[chunk_id] = index.reconstruct(int(chunk_id))
+        except RuntimeError:
+            # Held by another segment, or deleted since it was retrieved
+            pass
+    return vectors
+
+
+def search_parameters(
+    index,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    ids: Optional[np.ndarray] = None,
+    excluded_ids: Optional[np.ndarray] = None
+):
+    """
+    Per-query search parameters for the index type, or None to use its defaults.
+
+    Passing these to index.search leaves the shared index untouched, so
+    concurrent queries can use different recall / latency trade-offs.
+    ids, if given, restricts the search to those ids; otherwise excluded_ids
+    (e.g. tombstones) are filtered out.
+    """
+    params = None
+    base = index.index if isinstance(index, faiss.IndexPreTransform) else index
+    ivf = faiss.try_extract_index_ivf(base)
+    hnsw = unwrap(index)
+
+    selector = None
+    if ids is not None:
+        selector = faiss.IDSelectorBatch(ids.astype(np.int64))
+    elif excluded_ids is not None and len(excluded_ids):
+        selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(excluded_ids.astype(np.int64)))
+    extra = {} if selector is None else {"sel": selector}
+
+    # Per-query parameters replace the index defaults wholesale, so carry those over
+    if ivf is not None and (nprobe is not None or extra):
+        params = faiss.SearchParametersIVF(nprobe=nprobe or ivf.nprobe, **extra)
+    elif isinstance(hnsw, faiss.IndexHNSW) and (ef_search is not None or extra):
+        params = faiss.SearchParametersHNSW(efSearch=ef_search or hnsw.hnsw.efSearch, **extra)
+    elif extra:
+        params = faiss.SearchParameters(**extra)
+
+    if params is not None and isinstance(index, faiss.IndexPreTransform):
+        inner = params
+        params = faiss.SearchParametersPreTransform(index_params=inner)
+        params.referenced_objects = [inner]
+    if selector is not None:
+        # Parameters only hold raw pointers to the selector / nested parameters
+        params.referenced_objects = getattr(params, "referenced_objects", []) + [selector]
+    return params
@@ -0,0 +1,289 @@
+import json
+import mmap as mmap_module
+import os
+from typing import List, Optional
+
+import faiss
+import numpy as np
+from app.services.chunk_store import SPAN_KEYS, ChunkSegment, hashes_from_hex
+from app.services.embedding_cache import content_hash
+
+MANIFEST_FILE = "manifest.json"
+SEGMENT_FILES = (".text", ".offsets.npy", ".pages.npy", ".spans.npy", ".files.npy", ".ids.npy", ".hashes.npy")
+
+
+def index_files_of(manifest: dict) -> List[str]:
+    """Index segment files of a manifest; older snapshots have a single index_file"""
+    if "index_files" in manifest:
+        return manifest["index_files"]
+    return [manifest["index_file"]] if manifest.get("index_file") else []
+
+
+# ========== Index Snapshot Store ==========
+class IndexSnapshotStore:
+    """
+    Persist the FAISS index segments and their chunk sidecars under a directory.
+
+    Layout:
+        manifest.json            -> current generation, index files and segment list
+        index.<gen>.faiss        -> one FAISS index segment written with faiss.write_index
+        seg-<n>.text             -> UTF-8 chunk texts, concatenated
+        seg-<n>.offsets.npy      -> int64 offsets into the text arena (rows + 1)
+        seg-<n>.pages.npy        -> int32 page numbers (-1 when missing)
+        seg-<n>.spans.npy        -> int64 (rows, 3) last page and character offsets in the document
+        seg-<n>.files.npy        -> int32 ids into the segment's filename list
+        seg-<n>.ids.npy          -> int64 chunk ids (uint8 (rows, 16) uuids in older snapshots)
+        seg-<n>.hashes.npy       -> uint8 (rows, 16) content hashes of the chunk texts
+        tombstones.<gen>.npy     -> int64 ids of deleted chunks not yet compacted away
+
+    Chunk and index segments are immutable, so a snapshot only writes the rows
+    added since the previous one (plus any merged index segment); compaction
+    rewrites the live rows as a single segment. Every file is written under a
+    temporary name and renamed into place, and the manifest is replaced last:
+    a crash at any point leaves the previous generation intact.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_manifest(self) -> Optional[dict]:
+        path = self._path(MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _replace(self, tmp_path: str, path: str):
+        """fsync a temporary file and atomically move it into place"""
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _write_array(self, name: str, array: np.ndarray):
+        tmp_path = self._path(name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        self._replace(tmp_path, self._path(name))
+
+    def _write_bytes(self, name: str, data: bytes):
+        tmp_path = self._path(name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        self._replace(tmp_path, self._path(name))
+
+    def _write_segment(self, name: str, segment: ChunkSegment, filenames: List[str]) -> dict:
+        """Write one append-only columnar segment and return its manifest entry"""
+        # On disk, file ids index the segment's own filename list
+        used, local_ids = np.unique(np.asarray(segment.file_ids), return_inverse=True)
+
+        self._write_bytes(f"{name}.text", bytes(segment.text))
+        self._write_array(f"{name}.offsets.npy", segment.offsets)
+        self._write_array(f"{name}.pages.npy", segment.pages)
+        self._write_array(f"{name}.spans.npy", segment.spans)
+        self._write_array(f"{name}.files.npy", local_ids.astype(np.int32))
+        self._write_array(f"{name}.ids.npy", segment.ids)
+        self._write_array(f"{name}.hashes.npy", segment.hashes)
+
+        return {"name": name, "rows": len(segment), "filenames": [filenames[i] for i in used]}
+
+    def _read_segment(self, entry: dict, mmap: bool) -> dict:
+        """Read a segment's columns, memory-mapped when requested"""
+        name = entry["name"]
+        mmap_mode = "r" if mmap else None
+        text_path = self._path(f"{name}.text")
+        with open(text_path, "rb") as f:
+            if mmap and os.path.getsize(text_path) > 0:
+                text = mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ)
+            else:
+                text = f.read()
+        offsets = np.load(self._path(f"{name}.offsets.npy"), mmap_mode=mmap_mode)
+
+        hashes_path = self._path(f"{name}.hashes.npy")
+        if os.path.exists(hashes_path):
+            hashes = np.load(hashes_path, mmap_mode=mmap_mode)
+        else:
+            # Segments written before content hashing was introduced
+            hashes = hashes_from_hex([
+                content_hash(text[offsets[i]:offsets[i + 1]].decode("utf-8")) for i in range(entry["rows"])
+            ])
+
+        spans_path = self._path(f"{name}.spans.npy")
+        if os.path.exists(spans_path):
+            spans = np.load(spans_path, mmap_mode=mmap_mode)
+        else:
+            # Segments written before chunks recorded their span
+            spans = np.full((entry["rows"], len(SPAN_KEYS)), -1, dtype=np.int64)
+
+        return {
+            "text": text,
+            "offsets": offsets,
+            "pages": np.load(self._path(f"{name}.pages.npy"), mmap_mode=mmap_mode),
+            "spans": spans,
+            "file_ids": np.load(self._path(f"{name}.files.npy"), mmap_mode=mmap_mode),
+            "filenames": entry["filenames"],
+            "ids": np.load(self._path(f"{name}.ids.npy"), mmap_mode=mmap_mode),
+            "hashes": hashes
+        }
+
+    def is_current(self) -> bool:
+        """True while the generation last loaded or saved is still the latest on disk"""
+        manifest = self._read_manifest()
+        if manifest is None or self.manifest is None:
+            return manifest is self.manifest
+        return manifest["generation"] == self.manifest["generation"]
+
+    def load(
+        self,
+        dimension: int,
+        mmap: bool = True,
+        read_only: bool = False,
+        reuse: Optional[dict] = None
+    ) -> Optional[dict]:
+        """
+        Load the last committed snapshot, memory-mapping the index and segments if requested.
+
+        read_only maps index files zero-copy (IO_FLAG_MMAP_IFC): vectors are
+        searched straight from the page cache, so every process mapping the
+        same file shares one copy, but the indexes must never be modified;
+        even their clones share the mapping.
+
+        reuse maps index file names to indexes already loaded from them, which
+        are returned instead of being read again. When the segment list extends
+        the one of the previously loaded generation, only the new segments are
+        read and "appended" is True in the returned state.
+        """
+        previous = self.manifest
+        manifest = self._read_manifest()
+        if manifest is None:
+            return None
+        if manifest["dimension"] != dimension:
+            raise ValueError(
+                f"Snapshot in {self.directory} has dimension {manifest['dimension']}, expected {dimension}; "
+                "after changing INDEX_DIMENSION, re-upload the documents into an empty FAISS_INDEX_DIR"
+            )
+
+        flags = 0
+        if mmap:
+            flags = faiss.IO_FLAG_MMAP_IFC if read_only else faiss.IO_FLAG_MMAP
+        reuse = reuse or {}
+        index_files = index_files_of(manifest)
+        indexes = [
+            reuse[name] if name in reuse else faiss.read_index(self._path(name), flags)
+            for name in index_files
+        ]
+
+        entries = manifest["segments"]
+        known = [entry["name"] for entry in previous["segments"]] if previous is not None else []
+        appended = bool(known) and [entry["name"] for entry in entries[:len(known)]] == known
+        if appended:
+            entries = entries[len(known):]
+        segments = [self._read_segment(entry, mmap) for entry in entries]
+
+        rows = sum(entry["rows"] for entry in manifest["segments"])
+        vectors = sum(index.ntotal for index in indexes)
+        if vectors != rows:
+            raise ValueError(
+                f"Snapshot in {self.directory} is inconsistent: {vectors} vectors, {rows} chunks"
+            )
+
+        tombstones = np.empty(0, dtype=np.int64)
+        if manifest.get("tombstones"):
+            tombstones = np.load(self._path(manifest["tombstones"]))
+
+        self.manifest = manifest
+        return {
+            "indexes": indexes,
+            "index_files": index_files,
+            "segments": segments,
+            "tombstones": tombstones,
+            "appended": appended
+        }
+
+    def _remove(self, name: str):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def save(
+        self,
+        indexes: List,
+        index_files: List[Optional[str]],
+        segments: List[ChunkSegment] = (),
+        filenames: Optional[List[str]] = None,
+        tombstones: Optional[np.ndarray] = None,
+        compacted: bool = False
+    ) -> List[str]:
+        """
+        Commit a new generation: append the chunk segments added since the
+        last one, write the index segments not on disk yet (index_files entry
+        None), record the tombstoned chunk ids, then swap the manifest.
+        filenames maps the segments' file ids to names. Returns the file name
+        of every index segment.
+
+        compacted=True replaces every earlier chunk segment with `segments`;
+        files the new manifest no longer references are removed after the swap.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if self.manifest is None:
+            self.manifest = self._read_manifest() or {
+                "generation": 0,
+                "dimension": indexes[0].d,
+                "index_files": [],
+                "segments": []
+            }
+
+        previous = self.manifest
+        generation = previous["generation"] + 1
+        entries = [] if compacted else list(previous["segments"])
+        for k, segment in enumerate(segment for segment in segments if len(segment)):
+            name = f"seg-{generation:06d}" if k == 0 else f"seg-{generation:06d}.{k}"
+            entries.append(self._write_segment(name, segment, filenames))
+
+        index_files = list(index_files)
+        written = 0
+        for position, index in enumerate(indexes):
+            if index_files[position] is None:
+                name = f"index.{generation:06d}.faiss" if written == 0 else f"index.{generation:06d}.{written}.faiss"
+                faiss.write_index(index, self._path(name + ".tmp"))
+                self._replace(self._path(name + ".tmp"), self._path(name))
+                index_files[position] = name
+                written += 1
+
+        # Tombstones only grow until compaction clears them, so an unchanged count means unchanged ids
+        tombstone_count = 0 if tombstones is None else len(tombstones)
+        tombstones_file = previous.get("tombstones")
+        if tombstone_count == 0:
+            tombstones_file = None
+        elif tombstone_count != previous.get("tombstone_count", 0) or compacted:
+            tombstones_file = f"tombstones.{generation:06d}.npy"
+            self._write_array(tombstones_file, np.asarray(tombstones, dtype=np.int64))
+
+        manifest = {
+            "generation": generation,
+            "dimension": indexes[0].d if indexes else previous["dimension"],
+            "index_files": index_files,
+            "segments": entries,
+            "tombstones": tombstones_file,
+            "tombstone_count": tombstone_count
+        }
+        tmp_path = self._path(MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        self._replace(tmp_path, self._path(MANIFEST_FILE))
+        self.manifest = manifest
+
+        # Old files are no longer referenced; mappings still open on them stay valid
+        for name in set(index_files_of(previous)) - set(index_files):
+            self._remove(name)
+        if previous.get("tombstones") and previous["tombstones"] != tombstones_file:
+            self._remove(previous["tombstones"])
+        if compacted:
+            for entry in previous["segments"]:
+                for suffix in SEGMENT_FILES:
+                    self._remove(entry["name"] + suffix)
+        return index_files
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import List, Optional
+
+from app.core.config import get_settings
+from app.services.doc_service import doc_process
+from app.services.embedding_service import StagedDocument
+from app.services.vector_service import vector_store
+from app.services.compaction_service import compaction_service
+from app.services.telemetry import span
+
+settings = get_settings()
+
+
+def new_job(filename: str, collection: Optional[str] = None, replace: bool = False, delete: bool = False) -> dict:
+    now = time.time()
+    return {
+        "job_id": uuid.uuid4().hex,
+        "filename": filename,
+        "collection": collection or settings.DEFAULT_COLLECTION,
+        "status": "queued",
+        "pages_parsed": 0,
+        "chunks_total": 0,
+        "chunks_embedded": 0,
+        "chunks_indexed": 0,
+        "reused_embeddings": 0,
+        "new_embeddings": 0,
+        "duplicate_chunks": 0,
+        "replace": replace,
+        "delete": delete,
+        "deleted_chunks": 0,
+        "error": None,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+# ========== Job Stores ==========
+class MemoryJobStore:
+    """Jobs held in process memory; lost on restart"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.queue = []
+
+    def create(self, job: dict):
+        self.jobs[job["job_id"]] = job
+        self.queue.append(job["job_id"])
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    def list(self, limit: int = 50) -> List[dict]:
+        jobs = sorted(self.jobs.values(), key=lambda job: job["created_at"], reverse=True)
+        return [dict(job) for job in jobs[:limit]]
+
+    def update(self, job_id: str, **fields):
+        self.jobs[job_id].update(fields, updated_at=time.time())
+
+    def claim_next(self) -> Optional[dict]:
+        while self.queue:
+            job = self.jobs.get(self.queue.pop(0))
+            if job and job["status"] == "queued":
+                job.update(status="processing", updated_at=time.time())
+                return dict(job)
+        return None
+
+    def requeue_interrupted(self) -> int:
+        return 0
+
+
+class SQLiteJobStore:
+    """Jobs in a local SQLite file, so queued uploads survive a restart"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS ingestion_jobs (job_id TEXT PRIMARY KEY, status TEXT, created_at REAL, data TEXT)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS ingestion_jobs_status ON ingestion_jobs (status, created_at)")
+
+    def create(self, job: dict):
+        self.db.execute(
+            "INSERT INTO ingestion_jobs (job_id, status, created_at, data) VALUES (?, ?, ?, ?)",
+            (job["job_id"], job["status"], job["created_at"], json.dumps(job))
+        )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self.db.execute("SELECT data FROM ingestion_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list(self, limit: int = 50) -> List[dict]:
+        rows = self.db.execute("SELECT data FROM ingestion_jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [json.loads(row[0]) for row in rows]
+
+    def update(self, job_id: str, **fields):
+        job = self.get(job_id)
+        job.update(fields, updated_at=time.time())
+        self.db.execute(
+            "UPDATE ingestion_jobs SET status = ?, data = ? WHERE job_id = ?",
+            (job["status"], json.dumps(job), job_id)
+        )
+
+    def claim_next(self) -> Optional[dict]:
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute(
+                "SELECT job_id FROM ingestion_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self.update(row[0], status="processing")
+            return self.get(row[0])
+        finally:
+            self.db.execute("COMMIT")
+
+    def requeue_interrupted(self) -> int:
+        """Jobs left 'processing' by a previous process are queued again"""
+        rows = self.db.execute("SELECT job_id FROM ingestion_jobs WHERE status = 'processing'").fetchall()
+        for (job_id,) in rows:
+            self.update(job_id, status="queued")
+        return len(rows)
+
+
+# ========== Ingestion Service ==========
+class IngestionService:
+    """
+    Background ingestion of uploaded PDFs.
+
+    Uploads are spooled to UPLOAD_DIR and recorded as jobs; INGEST_WORKERS
+    asyncio tasks claim queued jobs and run extract -> chunk -> embed -> index,
+    recording progress on the job as they go.
+
+    In reader mode API workers only queue jobs (in the shared SQLite store,
+    deletions included); the ingest writer process runs them.
+    """
+
+    def __init__(self):
+        if settings.INGEST_QUEUE_BACKEND == "sqlite":
+            self.store = SQLiteJobStore(settings.INGEST_QUEUE_PATH)
+        else:
+            self.store = MemoryJobStore()
+        self.workers: List[asyncio.Task] = []
+        self.wakeup = None
+        self.stopping = False
+
+    def check_backend(self):
+        """Reader workers and the writer process must share one job queue"""
+        if settings.INGEST_QUEUE_BACKEND != "sqlite":
+            raise RuntimeError(
+                f"INGEST_QUEUE_BACKEND={settings.INGEST_QUEUE_BACKEND!r}: separate API and writer processes need the sqlite backend"
+            )
+
+    def spool_path(self, job_id: str) -> str:
+        return os.path.join(settings.UPLOAD_DIR, f"{job_id}{settings.FILE_TYPE}")
+
+    def submit(self, job: dict) -> dict:
+        """Queue a job whose PDF has already been written to spool_path(job_id)"""
+        self.store.create(job)
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+    def list_jobs(self, limit: int = 50) -> List[dict]:
+        return self.store.list(limit)
+
+    async def start(self):
+        self.wakeup = asyncio.Event()
+        self.stopping = False
+        self.store.requeue_interrupted()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(settings.INGEST_WORKERS)]
+
+    async def stop(self):
+        # wait_for() can swallow a cancel that lands as the event is set (Python 3.11),
+        # so idle workers also exit on the flag; busy ones are cancelled mid-job
+        self.stopping = True
+        if self.wakeup is not None:
+            self.wakeup.set()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def _worker(self):
+        while not self.stopping:
+            job = self.store.claim_next()
+            if job is None:
+                self.wakeup.clear()
+                try:
+                    # Poll as well, so jobs queued by another process are picked up
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=settings.INGEST_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await (self._delete(job) if job.get("delete") else self._run(job))
+
+    async def _delete(self, job: dict):
+        try:
+            deleted = await asyncio.to_thread(
+                vector_store.delete_document, job.get("collection", settings.DEFAULT_COLLECTION), job["filename"]
+            )
+            self.store.update(job["job_id"], status="completed", deleted_chunks=deleted)
+            compaction_service.notify()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.store.update(job["job_id"], status="failed", error=str(e))
+
+    async def _run(self, job: dict):
+        """
+        Ingest a spooled PDF in micro-batches of INGEST_BATCH_CHUNKS chunks.
+
+        Each batch is indexed as soon as it is embedded, so the first pages are
+        searchable while the rest of the document is still being processed,
+        and memory stays bounded by the batch size rather than the document.
+        If the job fails, the chunks it indexed are deleted again unless the
+        file was already in the collection and the job only appended to it.
+
+        A replace job streams its batches into a StagedDocument instead, held
+        in the form the index keeps rows, and swaps the old version out in one
+        publish_document write after the last batch: searches never see a mix
+        of both versions, and a failure part-way drops the staged rows and
+        leaves the old version untouched.
+        """
+        job_id = job["job_id"]
+        path = self.spool_path(job_id)
+        collection = job.get("collection", settings.DEFAULT_COLLECTION)
+        filename = job["filename"]
+        counts = {
+            "pages_parsed": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+            "chunks_indexed": 0,
+            "reused_embeddings": 0,
+            "new_embeddings": 0,
+            "duplicate_chunks": 0,
+            "deleted_chunks": 0
+        }
+        replace = job.get("replace", False)
+        existed = vector_store.has_document(collection, filename)
+        staged = StagedDocument(filename) if replace else None
+        try:
+            async for batch in doc_process.iter_batches(path, filename):
+                documents = {key: batch[key] for key in ("chunks", "embeddings", "metadata", "content_hashes")}
+                counts["pages_parsed"] = batch["pages_parsed"]
+                counts["chunks_total"] += len(batch["chunks"])
+                counts["chunks_embedded"] += len(batch["chunks"])
+                counts["reused_embeddings"] += batch["reused_embeddings"]
+                counts["new_embeddings"] += batch["new_embeddings"]
+                if replace:
+                    await asyncio.to_thread(vector_store.stage_document, collection, staged, **documents)
+                else:
+                    # Indexing takes the store's write lock; keep it off the event loop
+                    with span("index", bytes=sum(len(chunk) for chunk in batch["chunks"]), items=len(batch["chunks"])):
+                        added = await asyncio.to_thread(vector_store.add_documents, collection, **documents)
+                    counts["chunks_indexed"] += added
+                    counts["duplicate_chunks"] += len(batch["chunks"]) - added
+                self.store.update(job_id, **counts)
+
+            if counts["chunks_total"] == 0:
+                raise ValueError("No text extracted from PDF")
+            if replace:
+                with span("index", bytes=staged.chunks.nbytes, items=len(staged.chunks)):
+                    added, counts["deleted_chunks"] = await asyncio.to_thread(
+                        vector_store.publish_document, collection, staged
+                    )
+                counts["chunks_indexed"] = added
+                counts["duplicate_chunks"] = counts["chunks_total"] - added
+            self.store.update(job_id, status="completed", **counts)
+        except asyncio.CancelledError:
+            # Shutdown mid-job: leave it 'processing' so the next start re-queues it.
+            # Re-running skips the chunks already indexed as duplicates.
+            raise
+        except Exception as e:
+            # A replace job indexes nothing until its final write: its staged rows are dropped with it
+            if counts["chunks_indexed"] and not existed:
+                # Don't leave half a document searchable
+                await asyncio.to_thread(vector_store.delete_document, collection, filename)
+                counts["chunks_indexed"] = 0
+                compaction_service.notify()
+            self.store.update(job_id, status="failed", error=str(e), **counts)
+
+        # Only reached once the job has finished, successfully or not
+        if os.path.exists(path):
+            os.remove(path)
+
+
+ingestion_service = IngestionService()
@@ -0,0 +1,205 @@
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; keeps numbers and identifiers like 'ISO-9001' as separate terms"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+# ========== BM25 Inverted Index ==========
+class BM25Segment:
+    """
+    Postings for a contiguous block of rows, immutable once built.
+
+    Postings are kept per term as two int32 arrays (local row ids and term
+    frequencies), so a million chunks cost a few bytes per posting instead of
+    a Python object each.
+    """
+
+    def __init__(self, texts: Iterable[str]):
+        self.vocabulary: Dict[str, int] = {}
+        postings_rows: List[array] = []
+        postings_tfs: List[array] = []
+        doc_lengths = array("i")
+
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_id = self.vocabulary.get(term)
+                if term_id is None:
+                    term_id = len(self.vocabulary)
+                    self.vocabulary[term] = term_id
+                    postings_rows.append(array("i"))
+                    postings_tfs.append(array("i"))
+                postings_rows[term_id].append(row)
+                postings_tfs[term_id].append(tf)
+
+        self.postings_rows = [np.frombuffer(rows, dtype=np.int32) for rows in postings_rows]
+        self.postings_tfs = [np.frombuffer(tfs, dtype=np.int32) for tfs in postings_tfs]
+        self.doc_lengths = np.frombuffer(doc_lengths, dtype=np.int32)
+        self.total_length = int(self.doc_lengths.sum())
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def merged(cls, segments: List["BM25Segment"]) -> "BM25Segment":
+        """One segment with the postings of consecutive segments, without re-tokenizing"""
+        merged = cls(())
+        offsets = np.cumsum([0] + [segment.num_docs for segment in segments])
+        parts: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+        for offset, segment in zip(offsets, segments):
+            for term, term_id in segment.vocabulary.items():
+                parts.setdefault(term, []).append((segment.postings_rows[term_id] + offset, segment.postings_tfs[term_id]))
+
+        for term_id, (term, postings) in enumerate(parts.items()):
+            merged.vocabulary[term] = term_id
+            merged.postings_rows.append(np.concatenate([rows for rows, _ in postings]).astype(np.int32))
+            merged.postings_tfs.append(np.concatenate([tfs for _, tfs in postings]))
+        merged.doc_lengths = np.concatenate([segment.doc_lengths for segment in segments])
+        merged.total_length = sum(segment.total_length for segment in segments)
+        return merged
+
+
+class BM25Index:
+    """
+    In-process inverted index scored with Okapi BM25, built from immutable segments.
+
+    Rows are appended in the same order as the chunk store, which lets both
+    retrievers share row positions. An index is never changed once built:
+    extended() returns a new one that shares the existing segments, so
+    searches can keep reading the old index while a writer builds the next.
+    Document frequencies and the average length are summed across segments,
+    so scores do not depend on how rows are split.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, segments: Tuple[BM25Segment, ...] = ()):
+        self.k1 = k1
+        self.b = b
+        self.segments = tuple(segments)
+        self.starts = np.cumsum([0] + [segment.num_docs for segment in self.segments])[:-1]
+        self.num_docs = sum(segment.num_docs for segment in self.segments)
+        self.total_length = sum(segment.total_length for segment in self.segments)
+
+    @property
+    def num_terms(self) -> int:
+        if len(self.segments) == 1:
+            return len(self.segments[0].vocabulary)
+        return len(set().union(*(segment.vocabulary for segment in self.segments)))
+
+    def extended(self, texts: Iterable[str]) -> "BM25Index":
+        """A new index with a segment for `texts` appended; row ids continue from the current size"""
+        segment = BM25Segment(texts)
+        if not segment.num_docs:
+            return self
+        return BM25Index(self.k1, self.b, self.segments + (segment,))
+
+    def merged(self, start: int = 0) -> "BM25Index":
+        """A new index with segments[start:] merged into one"""
+        if len(self.segments) - start < 2:
+            return self
+        tail = BM25Segment.merged(list(self.segments[start:]))
+        return BM25Index(self.k1, self.b, self.segments[:start] + (tail,))
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        within: Optional[np.ndarray] = None,
+        excluded: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Return (row, score) pairs for the best matching chunks, best first.
+
+        within restricts the candidate rows; excluded (e.g. tombstoned rows)
+        are never returned.
+        """
+        n = self.num_docs
+        if n == 0:
+            return []
+
+        avg_length = self.total_length / n if self.total_length else 1.0
+        scores = np.zeros(n, dtype=np.float32)
+
+        allowed = None
+        if within is not None:
+            allowed = np.zeros(n, dtype=bool)
+            allowed[within] = True
+
+        for term in set(tokenize(query)):
+            hits = [
+                (start, segment, segment.vocabulary[term])
+                for start, segment in zip(self.starts, self.segments)
+                if term in segment.vocabulary
+            ]
+            if not hits:
+                continue
+
+            df = sum(len(segment.postings_rows[term_id]) for _, segment, term_id in hits)
+            idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for start, segment, term_id in hits:
+                rows = segment.postings_rows[term_id]
+                tfs = segment.postings_tfs[term_id].astype(np.float32)
+                norm = self.k1 * (1.0 - self.b + self.b * segment.doc_lengths[rows] / avg_length)
+                # Each row appears at most once per term, so fancy-index += is safe
+                scores[start + rows] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+
+        if allowed is not None:
+            scores[~allowed] = 0.0
+        if excluded is not None and len(excluded):
+            scores[excluded] = 0.0
+
+        k = min(top_k, n)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(int(row), float(scores[row])) for row in candidates if scores[row] > 0]
+
+
+# ========== Rank Fusion ==========
+def _min_max(results: List[Tuple[int, float]]) -> Dict[int, float]:
+    if not results:
+        return {}
+    scores = [score for _, score in results]
+    low, high = min(scores), max(scores)
+    span = high - low
+    return {row: (score - low) / span if span > 0 else 1.0 for row, score in results}
+
+
+def weighted_fusion(
+    dense: List[Tuple[int, float]],
+    lexical: List[Tuple[int, float]],
+    alpha: float,
+    top_k: int
+) -> List[Tuple[int, float]]:
+    """Min-max normalise both lists and blend: alpha * dense + (1 - alpha) * lexical"""
+    dense_norm = _min_max(dense)
+    lexical_norm = _min_max(lexical)
+    fused = {
+        row: alpha * dense_norm.get(row, 0.0) + (1.0 - alpha) * lexical_norm.get(row, 0.0)
+        for row in dense_norm.keys() | lexical_norm.keys()
+    }
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+
+def reciprocal_rank_fusion(
+    dense: List[Tuple[int, float]],
+    lexical: List[Tuple[int, float]],
+    alpha: float,
+    top_k: int,
+    k: int = 60
+) -> List[Tuple[int, float]]:
+    """Alpha-weighted reciprocal rank fusion; ignores raw scores, so no normalisation is needed"""
+    fused: Dict[int, float] = {}
+    for weight, results in ((alpha, dense), (1.0 - alpha, lexical)):
+        for rank, (row, _) in enumerate(results):
+            fused[row] = fused.get(row, 0.0) + weight / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
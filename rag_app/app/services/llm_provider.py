@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import re
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+import openai
+from openai import AsyncOpenAI
+from app.core.config import get_settings
+from app.services.telemetry import registry
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:  # h2 is optional; the pool then speaks HTTP/1.1 with keep-alive
+    HTTP2_AVAILABLE = False
+
+settings = get_settings()
+
+hedges_total = registry.counter("rag_llm_hedged_requests_total", "Slow API calls sent a second time")
+
+
+# ========== Mock Backend ==========
+WORD_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r"^(?:Question|Current Query): (.*)$", re.MULTILINE)
+SOURCE_PATTERN = re.compile(r"\[Source (\d+)")
+
+
+def mock_embedding(text: str, dimension: int) -> List[float]:
+    """Hashed bag of words: deterministic, and texts sharing words get similar vectors"""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in WORD_PATTERN.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        vector[int.from_bytes(digest[:4], "little") % dimension] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+    else:
+        vector /= norm
+    return vector.tolist()
+
+
+def mock_reply(messages: List[dict], max_tokens: int) -> str:
+    """A deterministic reply to the last message, at most max_tokens words"""
+    prompt = messages[-1]["content"]
+    queries = QUERY_PATTERN.findall(prompt)
+    query = queries[-1].strip() if queries else prompt.strip()
+    if prompt.rstrip().endswith("Rewritten Query:"):
+        # Follow-up rewrite: treat every query as standalone
+        return query
+    sources = sorted(set(SOURCE_PATTERN.findall(prompt)), key=int)
+    reply = f"Mock answer to: {query}"
+    if sources:
+        reply += " " + " ".join(f"[Source {number}]" for number in sources)
+    return " ".join(reply.split(" ")[:max_tokens])
+
+
+class MockEmbeddings:
+    def __init__(self, dimension: int, latency: float):
+        self.dimension = dimension
+        self.latency = latency
+
+    async def create(self, model: str, input, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        texts = [input] if isinstance(input, str) else input
+        return SimpleNamespace(
+            model=model,
+            data=[
+                SimpleNamespace(index=i, embedding=mock_embedding(text, self.dimension))
+                for i, text in enumerate(texts)
+            ]
+        )
+
+
+class MockCompletions:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def create(self, model: str, messages: List[dict], max_tokens: Optional[int] = None, stream: bool = False, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = mock_reply(messages, max_tokens or settings.MAX_TOKENS)
+        if stream:
+            return self._stream(text)
+        message = SimpleNamespace(role="assistant", content=text)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")])
+
+    async def _stream(self, text: str):
+        for i, word in enumerate(text.split(" ")):
+            delta = SimpleNamespace(content=word if i == 0 else " " + word)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
+
+
+class MockClient:
+    """
+    Offline stand-in for AsyncOpenAI's embeddings and chat completions.
+
+    Same inputs give the same outputs, optionally after `latency` seconds,
+    so the whole pipeline can be load-tested without network or API costs.
+    """
+
+    def __init__(self, dimension: int, latency: float = 0.0):
+        self.embeddings = MockEmbeddings(dimension, latency)
+        self.chat = SimpleNamespace(completions=MockCompletions(latency))
+
+    def with_options(self, **kwargs) -> "MockClient":
+        return self
+
+    async def close(self):
+        pass
+
+
+# ========== LLM Provider ==========
+class LLMProvider:
+    """
+    The one gateway to the embeddings and chat APIs, shared by ingestion,
+    retrieval and answer generation.
+
+    All calls go through a single AsyncOpenAI client on one connection pool
+    (HTTP/2 when the h2 package is installed), each with the timeout for its
+    kind of call and at most LLM_MAX_CONCURRENCY in flight. Short idempotent
+    calls can be hedged: without a response after LLM_HEDGE_DELAY a duplicate
+    is sent and whichever answers first wins. LLM_BACKEND=mock swaps in a
+    deterministic local backend.
+    """
+
+    def __init__(self):
+        self._clients: Dict[Optional[int], object] = {}
+        self.semaphore = None
+        self.in_flight = 0
+        self.hedged_requests = 0
+
+    @property
+    def client(self):
+        """The shared client, built on first use"""
+        if None not in self._clients:
+            self._clients[None] = self._build_client()
+        return self._clients[None]
+
+    def _build_client(self):
+        if settings.LLM_BACKEND == "mock":
+            return MockClient(settings.EMBEDDING_MODEL_DIM, settings.MOCK_LLM_LATENCY)
+        http_client = openai.DefaultAsyncHttpxClient(
+            http2=settings.LLM_HTTP2 and HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=self._timeout(settings.LLM_CHAT_TIMEOUT)
+        )
+        return AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=http_client,
+            max_retries=settings.LLM_MAX_RETRIES
+        )
+
+    def _client_with(self, max_retries: Optional[int]):
+        """The shared client, or a view of it (same connection pool) with another retry count"""
+        if max_retries is None:
+            return self.client
+        if max_retries not in self._clients:
+            self._clients[max_retries] = self.client.with_options(max_retries=max_retries)
+        return self._clients[max_retries]
+
+    def _timeout(self, seconds: float) -> openai.Timeout:
+        return openai.Timeout(seconds, connect=settings.LLM_CONNECT_TIMEOUT)
+
+    @asynccontextmanager
+    async def _slot(self):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        async with self.semaphore:
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+
+    async def _attempt(self, request: Callable[[], Awaitable]):
+        async with self._slot():
+            return await request()
+
+    async def _call(self, request: Callable[[], Awaitable], hedge: bool):
+        if not hedge or settings.LLM_HEDGE_DELAY <= 0:
+            return await self._attempt(request)
+
+        tasks = {asyncio.ensure_future(self._attempt(request))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=settings.LLM_HEDGE_DELAY)
+            if not done and not self.semaphore.locked():
+                # Only hedge with spare capacity: duplicates under saturation add load where it hurts most
+                tasks.add(asyncio.ensure_future(self._attempt(request)))
+                self.hedged_requests += 1
+                hedges_total.inc()
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def embed(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        hedge: bool = False,
+        max_retries: Optional[int] = None
+    ) -> List[List[float]]:
+        """Embeddings of texts, in order"""
+        client = self._client_with(max_retries)
+        response = await self._call(
+            lambda: client.embeddings.create(
+                model=model or settings.EMBEDDING_MODEL,
+                input=texts,
+                timeout=self._timeout(settings.LLM_EMBED_TIMEOUT)
+            ),
+            hedge
+        )
+        return [item.embedding for item in response.data]
+
+    async def chat(self, messages: List[dict], model: Optional[str] = None, hedge: bool = False, **kwargs) -> str:
+        """Text of a chat completion"""
+        response = await self._call(
+            lambda: self.client.chat.completions.create(
+                model=model or settings.LLM_MODEL,
+                messages=messages,
+                timeout=self._timeout(settings.LLM_CHAT_TIMEOUT),
+                **kwargs
+            ),
+            hedge
+        )
+        return response.choices[0].message.content
+
+    async def chat_stream(self, messages: List[dict], model: Optional[str] = None, **kwargs) -> AsyncIterator[str]:
+        """Text deltas of a streamed chat completion; the concurrency slot is held until the stream ends"""
+        async with self._slot():
+            stream = await self.client.chat.completions.create(
+                model=model or settings.LLM_MODEL,
+                messages=messages,
+                timeout=self._timeout(settings.LLM_CHAT_TIMEOUT),
+                stream=True,
+                **kwargs
+            )
+            async for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+
+    async def close(self):
+        """Close the connection pool; the next call opens a new one"""
+        client = self._clients.get(None)
+        self._clients = {}
+        if client is not None:
+            await client.close()
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": settings.LLM_BACKEND,
+            "http2": settings.LLM_BACKEND != "mock" and settings.LLM_HTTP2 and HTTP2_AVAILABLE,
+            "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+            "in_flight": self.in_flight,
+            "hedged_requests": self.hedged_requests
+        }
+
+
+llm_provider = LLMProvider()
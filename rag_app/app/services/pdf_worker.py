@@ -0,0 +1,62 @@
+"""
+CPU-bound PDF work that runs inside ProcessPoolExecutor workers.
+
+Kept free of settings and API clients so it imports cheaply in a fresh
+worker process; everything a task needs is passed in as arguments.
+"""
+import io
+import time
+from functools import lru_cache
+from typing import List, Tuple
+
+import PyPDF2
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+
+@lru_cache(maxsize=4)
+def get_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""],  # Try to split on paragraphs, then sentences, then words
+        is_separator_regex=False,
+    )
+
+
+def count_pages(pdf_path: str) -> int:
+    with open(pdf_path, "rb") as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def read_pages(pdf_reader: PyPDF2.PdfReader, start: int = 0, stop: int = None) -> List[Tuple[str, int]]:
+    """Extract (text, page_number) for non-empty pages in [start, stop)"""
+    pages = pdf_reader.pages
+    stop = len(pages) if stop is None else min(stop, len(pages))
+
+    texts = []
+    for page_index in range(start, stop):
+        text = pages[page_index].extract_text()
+        if text.strip():
+            texts.append((text, page_index + 1))
+    return texts
+
+
+def extract_pages(pdf_content: bytes, start: int = 0, stop: int = None) -> List[Tuple[str, int]]:
+    """Extract (text, page_number) for non-empty pages in [start, stop) of an in-memory PDF"""
+    return read_pages(PyPDF2.PdfReader(io.BytesIO(pdf_content)), start, stop)
+
+
+def extract_range(pdf_path: str, start: int, stop: int) -> Tuple[List[Tuple[str, int]], float]:
+    """
+    Extract (text, page_number) for the non-empty pages of one page range of
+    a PDF on disk, and the seconds it took.
+
+    The reader is given an open file rather than the path, which PyPDF2 would
+    read into memory whole: objects are then parsed from disk on demand, so
+    only the pages of this range are loaded.
+    """
+    started = time.perf_counter()
+    with open(pdf_path, "rb") as f:
+        texts = read_pages(PyPDF2.PdfReader(f), start, stop)
+    return texts, time.perf_counter() - started
@@ -1,7 +1,15 @@
-from typing import List, Optional
+import asyncio
+import re
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import io, os
-from openai import AsyncOpenAI
 from app.services.vector_service import vector_store
+from app.services.llm_provider import llm_provider
+from app.services.answer_cache import answer_cache, history_fingerprint
+from app.services.rerank_service import rerank_service
+from app.services.context_packer import SOURCE_SEPARATOR, pack_chunks, pack_history, source_block
+from app.services.telemetry import span
+from app.services.tokens import count_message_tokens, count_tokens
 from app.core.config import get_settings
 settings = get_settings()
 
@@ -13,14 +21,211 @@ VECTOR_STORE = {
     "metadata": []   # Metadata (page numbers, etc.)
 }
 
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Words and phrases that usually mean a query leans on the previous turn
+FOLLOWUP_PATTERN = re.compile(
+    r"\b(it|its|it's|this|that|these|those|they|them|their|he|she|him|her|his|there|"
+    r"former|latter|above|previous|same|else|more|also|too)\b"
+    r"|^(and|but|so|or|what about|how about|why|tell me more|elaborate|continue|explain)\b",
+    re.IGNORECASE
+)
+
+
+def needs_rewrite(query: str, conversation_history: List[dict]) -> bool:
+    """
+    Cheap heuristic deciding whether the LLM rewrite is worth a round-trip.
+    
+    Standalone questions (no history, no anaphora, more than a few words) are
+    sent to retrieval as-is.
+    """
+    if not conversation_history:
+        return False
+    if len(query.split()) <= 3:
+        return True
+    return bool(FOLLOWUP_PATTERN.search(query.strip()))
+
+
+def merge_results(primary: List[dict], secondary: List[dict], top_k: int, k: int = 60) -> List[dict]:
+    """
+    Merge two ranked chunk lists by weighted reciprocal rank; primary counts double.
+    
+    Each chunk keeps its best score for display.
+    """
+    ranked: Dict[str, float] = {}
+    best: Dict[str, dict] = {}
+    for weight, results in ((2.0, primary), (1.0, secondary)):
+        for rank, chunk in enumerate(results):
+            chunk_id = chunk["chunk_id"]
+            ranked[chunk_id] = ranked.get(chunk_id, 0.0) + weight / (k + rank + 1)
+            if chunk_id not in best or chunk["score"] > best[chunk_id]["score"]:
+                best[chunk_id] = chunk
+    order = sorted(ranked, key=ranked.get, reverse=True)[:top_k]
+    return [best[chunk_id] for chunk_id in order]
 # vector_store = VectorStoreService()
 
 # ========== RAG Service ==========
 class SimpleRAGService:
-    async def retrieve_context(self, query: str, top_k: int = 6) -> List[dict]:
-        """Retrieve relevant context using vector search"""
-        return await vector_store.search(query, top_k)
+    async def retrieve_context(
+        self,
+        query: str,
+        top_k: int = 6,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        search_mode: Optional[str] = None,
+        alpha: Optional[float] = None,
+        collections: Optional[List[str]] = None,
+        filenames: Optional[List[str]] = None
+    ) -> List[dict]:
+        """Retrieve relevant context using dense, keyword or hybrid search, optionally scoped to collections / files"""
+        return await vector_store.search(
+            query,
+            top_k,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            mode=search_mode,
+            alpha=alpha,
+            collections=collections,
+            filenames=filenames
+        )
+    
+    async def retrieve_for_turn(
+        self,
+        query: str,
+        conversation_history: List[dict],
+        top_k: int = 6,
+        rerank: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+        rerank_candidates: Optional[int] = None,
+        **search_kwargs
+    ) -> Tuple[str, List[dict], Dict[str, float]]:
+        """
+        Retrieve for one conversational turn, then rerank.
+        
+        Retrieval over-fetches candidates for the rerank stage (see
+        RerankService), which cuts them down to at most top_k chunks.
+        
+        Returns (resolved_query, chunks, timings_ms).
+        """
+        started = time.perf_counter()
+        fetch_k = rerank_service.fetch_size(top_k, rerank, rerank_candidates)
+        resolved_query, chunks, timings = await self._retrieve_turn(query, conversation_history, fetch_k, **search_kwargs)
+        
+        with span("rerank", items=len(chunks)):
+            chunks, rerank_timings = await rerank_service.rerank(resolved_query, chunks, top_k, rerank, mmr_lambda)
+        timings.update(rerank_timings)
+        timings["retrieve_total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return resolved_query, chunks, timings
+    
+    async def retrieve_batch(
+        self,
+        queries: List[str],
+        top_k: int = 6,
+        rerank: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+        rerank_candidates: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        search_mode: Optional[str] = None,
+        alpha: Optional[float] = None,
+        collections: Optional[List[str]] = None,
+        filenames: Optional[List[str]] = None
+    ) -> Tuple[List[List[dict]], Dict[str, float]]:
+        """
+        Retrieve and rerank for many standalone queries sharing one set of
+        options. Queries are not rewritten: there is no conversation history.
+        
+        The queries are embedded together and searched as one matrix per
+        collection (see CollectionService.search_many), then every candidate
+        list is reranked. Returns (chunks per query, timings_ms).
+        """
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        fetch_k = rerank_service.fetch_size(top_k, rerank, rerank_candidates)
+        candidates = await vector_store.search_many(
+            queries,
+            fetch_k,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            mode=search_mode,
+            alpha=alpha,
+            collections=collections,
+            filenames=filenames
+        )
+        timings["retrieval_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        
+        rerank_started = time.perf_counter()
+        with span("rerank", items=sum(len(chunks) for chunks in candidates)):
+            reranked = await asyncio.gather(*(
+                rerank_service.rerank(query, chunks, top_k, rerank, mmr_lambda)
+                for query, chunks in zip(queries, candidates)
+            ))
+        timings["rerank_ms"] = round((time.perf_counter() - rerank_started) * 1000, 1)
+        timings["retrieve_total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return [chunks for chunks, _ in reranked], timings
+    
+    async def _retrieve_turn(
+        self,
+        query: str,
+        conversation_history: List[dict],
+        top_k: int,
+        **search_kwargs
+    ) -> Tuple[str, List[dict], Dict[str, float]]:
+        """
+        Rewrite (if needed) and retrieve for one conversational turn.
+        
+        Standalone queries skip the LLM rewrite entirely. Otherwise retrieval on
+        the raw query runs speculatively while the rewrite is in flight; if the
+        rewrite comes back unchanged that result is used directly, else a
+        second retrieval runs on the rewritten query and the two are merged.
+        
+        Returns (resolved_query, chunks, timings_ms).
+        """
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        
+        def elapsed(since: float) -> float:
+            return round((time.perf_counter() - since) * 1000, 1)
+        
+        if not settings.SPECULATIVE_RETRIEVAL:
+            resolved_query = await self._resolve_followup_query(query, conversation_history)
+            timings["rewrite_ms"] = elapsed(started)
+            retrieval_started = time.perf_counter()
+            chunks = await self.retrieve_context(resolved_query, top_k=top_k, **search_kwargs)
+            timings["retrieval_ms"] = elapsed(retrieval_started)
+            timings["retrieve_total_ms"] = elapsed(started)
+            return resolved_query, chunks, timings
+        
+        if not needs_rewrite(query, conversation_history):
+            chunks = await self.retrieve_context(query, top_k=top_k, **search_kwargs)
+            timings["rewrite_ms"] = 0.0
+            timings["retrieval_ms"] = elapsed(started)
+            timings["retrieve_total_ms"] = timings["retrieval_ms"]
+            return query, chunks, timings
+        
+        async def timed_retrieval(text: str, key: str) -> List[dict]:
+            retrieval_started = time.perf_counter()
+            result = await self.retrieve_context(text, top_k=top_k, **search_kwargs)
+            timings[key] = elapsed(retrieval_started)
+            return result
+        
+        speculative = asyncio.create_task(timed_retrieval(query, "retrieval_ms"))
+        try:
+            resolved_query = await self._resolve_followup_query(query, conversation_history)
+            timings["rewrite_ms"] = elapsed(started)
+            
+            if resolved_query.strip().lower() == query.strip().lower():
+                chunks = await speculative
+            else:
+                raw_chunks, rewritten_chunks = await asyncio.gather(
+                    speculative,
+                    timed_retrieval(resolved_query, "rewritten_retrieval_ms")
+                )
+                chunks = merge_results(rewritten_chunks, raw_chunks, top_k)
+        finally:
+            speculative.cancel()
+        
+        timings["retrieve_total_ms"] = elapsed(started)
+        return resolved_query, chunks, timings
     
     async def _resolve_followup_query(
         self, 
@@ -60,27 +265,30 @@ Return ONLY the query (original or rewritten), nothing else.
 
 Rewritten Query:"""
 
-        response = await client.chat.completions.create(
-            model=settings.LLM_MODEL,
-            messages=[{"role": "user", "content": rewrite_prompt}],
-            temperature=settings.TEMPERATURE,
-            max_tokens=settings.MAX_TOKENS
-        )
+        # Short and on the critical path: hedged against slow responses
+        messages = [{"role": "user", "content": rewrite_prompt}]
+        with span("rewrite", tokens=count_message_tokens(messages, settings.LLM_MODEL), bytes=len(rewrite_prompt)):
+            response = await llm_provider.chat(
+                messages,
+                hedge=True,
+                temperature=settings.TEMPERATURE,
+                max_tokens=settings.MAX_TOKENS
+            )
         
-        rewritten_query = response.choices[0].message.content.strip()
+        rewritten_query = response.strip()
         return rewritten_query
     
-    async def generate_answer(
-        self, 
-        query: str, 
+    def _build_messages(
+        self,
+        query: str,
         context_chunks: List[dict],
         conversation_history: List[dict]
-    ) -> str:
-        """Generate answer using LLM with retrieved context"""
+    ) -> List[dict]:
+        """Build the chat messages for answer generation"""
         
         # Build context string
-        context_text = "\n\n".join([
-            f"[Source {i+1} - Page {chunk.get('page_number', 'N/A')}]\n{chunk['content']}" 
+        context_text = SOURCE_SEPARATOR.join([
+            source_block(i + 1, chunk)
             for i, chunk in enumerate(context_chunks)
         ])
         
@@ -113,13 +321,122 @@ Question: {query}
 Please let the user know that you don't have information about this in the uploaded documents."""
         
         messages.append({"role": "user", "content": user_message})
+        return messages
+    
+    def pack_context(
+        self,
+        query: str,
+        context_chunks: List[dict],
+        conversation_history: List[dict]
+    ) -> Tuple[List[dict], List[dict], Dict[str, int]]:
+        """
+        Fit the answer prompt into CONTEXT_TOKEN_BUDGET tokens.
+        
+        Instructions and question always go in; history gets up to
+        HISTORY_TOKEN_BUDGET of the rest and the chunks fill what is left,
+        trimmed or dropped as needed. Returns (chunks, history, token_counts);
+        only the returned chunks should be shown as sources.
+        """
+        budget = settings.CONTEXT_TOKEN_BUDGET
+        with span("prompt_build") as stage:
+            fixed = count_message_tokens(self._build_messages(query, [], []), settings.LLM_MODEL)
+            history, history_tokens = pack_history(
+                conversation_history, min(settings.HISTORY_TOKEN_BUDGET, budget - fixed), settings.LLM_MODEL
+            )
+            chunks, counts = pack_chunks(context_chunks, budget - fixed - history_tokens, settings.LLM_MODEL)
+            
+            counts.update(
+                budget=budget,
+                prompt=count_message_tokens(self._build_messages(query, chunks, history), settings.LLM_MODEL),
+                history=history_tokens,
+                history_messages_dropped=len(conversation_history) - len(history)
+            )
+            stage.add(tokens=counts["prompt"], items=len(chunks))
+        return chunks, history, counts
+    
+    async def generate_answer(
+        self, 
+        query: str, 
+        context_chunks: List[dict],
+        conversation_history: List[dict]
+    ) -> str:
+        """Generate answer using LLM with retrieved context"""
+        messages = self._build_messages(query, context_chunks, conversation_history)
         
         # Call OpenAI
-        response = await client.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            messages=messages,
-            temperature=settings.TEMPERATURE,
-            max_tokens=settings.MAX_TOKENS
+        with span("llm_generate") as stage:
+            answer = await llm_provider.chat(
+                messages,
+                temperature=settings.TEMPERATURE,
+                max_tokens=settings.MAX_TOKENS
+            )
+            stage.add(tokens=count_tokens(answer, settings.LLM_MODEL), bytes=len(answer))
+        return answer
+    
+    def lookup_cached_answer(
+        self,
+        resolved_query: str,
+        context_chunks: List[dict],
+        conversation_history: List[dict]
+    ) -> Optional[str]:
+        """
+        Return a previously generated answer for a near-identical question, if any.
+        
+        Only uses a query embedding retrieval already produced, so a miss costs
+        no extra API call.
+        """
+        if not settings.ANSWER_CACHE_ENABLED:
+            return None
+        query_vector = vector_store.query_cache.peek(settings.EMBEDDING_MODEL, resolved_query)
+        if query_vector is None:
+            return None
+        entry = answer_cache.lookup(
+            query_vector,
+            [chunk["chunk_id"] for chunk in context_chunks],
+            history_fingerprint(conversation_history),
+            vector_store.version
+        )
+        return entry["answer"] if entry else None
+    
+    def cache_answer(
+        self,
+        resolved_query: str,
+        context_chunks: List[dict],
+        conversation_history: List[dict],
+        answer: str,
+        generation_ms: float
+    ):
+        if not settings.ANSWER_CACHE_ENABLED:
+            return
+        query_vector = vector_store.query_cache.peek(settings.EMBEDDING_MODEL, resolved_query)
+        if query_vector is None:
+            return
+        answer_cache.store(
+            query_vector,
+            [chunk["chunk_id"] for chunk in context_chunks],
+            history_fingerprint(conversation_history),
+            answer,
+            generation_ms,
+            vector_store.version
         )
+    
+    async def stream_answer(
+        self,
+        query: str,
+        context_chunks: List[dict],
+        conversation_history: List[dict]
+    ) -> AsyncIterator[str]:
+        """Generate the answer with stream=True, yielding text deltas as they arrive"""
+        messages = self._build_messages(query, context_chunks, conversation_history)
         
-        return response.choices[0].message.content
\ No newline at end of file
+        with span("llm_generate") as stage:
+            deltas = []
+            async for delta in llm_provider.chat_stream(
+                messages,
+                temperature=settings.TEMPERATURE,
+                max_tokens=settings.MAX_TOKENS
+            ):
+                deltas.append(delta)
+                yield delta
+            answer = "".join(deltas)
+            stage.add(tokens=count_tokens(answer, settings.LLM_MODEL), bytes=len(answer))
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from app.core.config import get_settings
+from app.services.index_factory import reduce_dimension
+from app.services.vector_service import vector_store
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:  # sentence-transformers is optional; the cross_encoder mode falls back to MMR
+    CrossEncoder = None
+
+settings = get_settings()
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    top_k: int,
+    lambda_mult: float,
+    duplicate_threshold: float = 1.0
+) -> List[int]:
+    """
+    Maximal marginal relevance: repeatedly pick the candidate maximising
+    lambda * relevance - (1 - lambda) * (highest similarity to a picked one).
+
+    vectors are normalized, so all pairwise similarities come from one
+    matrix product. Candidates at least duplicate_threshold similar to a
+    picked one are dropped, so fewer than top_k positions may be returned.
+    """
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(len(relevance), dtype=np.float32)
+    available = np.ones(len(relevance), dtype=bool)
+    selected = []
+    while len(selected) < top_k and available.any():
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available &= similarity[best] < duplicate_threshold
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
+
+def scaled(scores: np.ndarray) -> np.ndarray:
+    """Min-max scale scores to [0, 1]"""
+    low, high = scores.min(), scores.max()
+    return (scores - low) / (high - low) if high > low else np.ones_like(scores)
+
+
+# ========== Rerank Service ==========
+class RerankService:
+    """
+    Second retrieval stage cutting over-fetched candidates down to the context sent to the LLM.
+
+    "mmr" diversifies the candidates by maximal marginal relevance over
+    their vectors, read back from the index (no embedding call), and drops
+    near-duplicates; relevance is the cosine similarity to the query
+    embedding, or the retriever score for lexical searches. "cross_encoder"
+    first rescores query / chunk pairs with a local CPU model (RERANK_MODEL,
+    needs sentence-transformers) and diversifies on those scores. "none"
+    keeps the retriever's top_k.
+    """
+
+    def __init__(self):
+        self.model = None
+        self.model_lock = threading.Lock()
+
+    def fetch_size(self, top_k: int, mode: Optional[str] = None, candidates: Optional[int] = None) -> int:
+        """How many candidates retrieval should return for this rerank mode"""
+        if (mode or settings.RERANK_MODE) == "none":
+            return top_k
+        return max(top_k, candidates or settings.RERANK_CANDIDATES)
+
+    def _cross_encoder(self):
+        """The cross-encoder, loaded on first use; None when sentence-transformers is not installed"""
+        if CrossEncoder is None:
+            return None
+        with self.model_lock:
+            if self.model is None:
+                self.model = CrossEncoder(settings.RERANK_MODEL, device="cpu")
+        return self.model
+
+    def _cross_encoder_scores(self, query: str, chunks: List[dict]) -> Optional[np.ndarray]:
+        model = self._cross_encoder()
+        if model is None:
+            return None
+        logits = np.asarray(model.predict([(query, chunk["content"]) for chunk in chunks]), dtype=np.float32)
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    async def rerank(
+        self,
+        query: str,
+        chunks: List[dict],
+        top_k: int,
+        mode: Optional[str] = None,
+        mmr_lambda: Optional[float] = None
+    ) -> Tuple[List[dict], Dict[str, float]]:
+        """
+        Pick at most top_k of the candidate chunks for `query` (the query
+        retrieval ran on). Returns (chunks, timings_ms).
+        """
+        mode = mode or settings.RERANK_MODE
+        mmr_lambda = settings.RERANK_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+        started = time.perf_counter()
+        timings = {"rerank_candidates": float(len(chunks))}
+        if mode == "none" or len(chunks) <= 1:
+            return chunks[:top_k], timings
+
+        relevance = None
+        if mode == "cross_encoder":
+            encoder_started = time.perf_counter()
+            # CPU-bound model inference; keep it off the event loop
+            relevance = await asyncio.to_thread(self._cross_encoder_scores, query, chunks)
+            if relevance is not None:
+                timings["cross_encoder_ms"] = round((time.perf_counter() - encoder_started) * 1000, 1)
+
+        # Reads the chunk embedding store (SQLite) when the index is reduced; keep it off the event loop
+        vectors = await asyncio.to_thread(vector_store.stored_vectors, chunks)
+        if relevance is None:
+            query_vector = vector_store.query_cache.peek(settings.EMBEDDING_MODEL, query)
+            if query_vector is not None:
+                # Vectors may be index vectors truncated to INDEX_DIMENSION; compare like with like
+                relevance = vectors @ reduce_dimension(query_vector.reshape(1, -1), vectors.shape[1])[0]
+            else:
+                # Lexical search: no query embedding to compare with
+                relevance = scaled(np.array([chunk["score"] for chunk in chunks], dtype=np.float32))
+
+        selected = mmr_select(relevance, vectors, top_k, mmr_lambda, settings.RERANK_DUPLICATE_THRESHOLD)
+        timings["rerank_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return [chunks[i] for i in selected], timings
+
+
+rerank_service = RerankService()
@@ -0,0 +1,44 @@
+import asyncio
+import logging
+from typing import Optional
+
+from app.core.config import get_settings
+from app.services.vector_service import vector_store
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+# ========== Snapshot Watcher ==========
+class SnapshotWatcher:
+    """
+    Hot reload for API workers in reader mode.
+
+    Every INDEX_RELOAD_INTERVAL seconds the snapshot manifests are checked in
+    a worker thread; collections whose writer published a new generation
+    switch to it, while searches keep being served from the previous view.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(settings.INDEX_RELOAD_INTERVAL)
+            try:
+                await asyncio.to_thread(vector_store.refresh)
+            except Exception as e:
+                # e.g. files removed by the writer mid-reload; the next poll sees its newer generation
+                logger.warning("Snapshot reload failed: %s", e)
+
+
+snapshot_watcher = SnapshotWatcher()
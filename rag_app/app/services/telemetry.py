@@ -0,0 +1,313 @@
+"""
+Request tracing, per-stage latency metrics and the slow-request profiler.
+
+Pipeline stages run inside `span(stage)`; every span is aggregated into
+Prometheus histograms / counters served at /metrics, and the spans of the
+current HTTP request are collected so slow requests can be logged with their
+breakdown. Metrics are per process: with several API workers, scrape each.
+"""
+import bisect
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as Tally, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# ========== Metrics ==========
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts, sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if position < len(self.buckets):
+                series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, key, bucket)} {cumulative}")
+                bucket = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, bucket)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Histogram:
+        metric = Histogram(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+stage_seconds = registry.histogram("rag_stage_duration_seconds", "Duration of pipeline stages", ("stage",))
+stage_tokens = registry.counter("rag_stage_tokens_total", "Tokens processed by pipeline stages", ("stage",))
+stage_bytes = registry.counter("rag_stage_bytes_total", "Bytes of text processed by pipeline stages", ("stage",))
+stage_items = registry.counter("rag_stage_items_total", "Pages, chunks or vectors processed by pipeline stages", ("stage",))
+stage_errors = registry.counter("rag_stage_errors_total", "Pipeline stages that raised", ("stage",))
+request_seconds = registry.histogram("rag_http_request_duration_seconds", "HTTP request duration, until the response body is sent", ("method", "route"))
+requests_total = registry.counter("rag_http_requests_total", "HTTP requests by response status", ("method", "route", "status"))
+slow_requests = registry.counter("rag_slow_requests_total", "Requests slower than SLOW_REQUEST_SECONDS", ("route",))
+
+
+# ========== Spans ==========
+current_trace: ContextVar[Optional[list]] = ContextVar("current_trace", default=None)
+
+
+class Span:
+    __slots__ = ("stage", "tokens", "bytes", "items", "seconds")
+
+    def __init__(self, stage: str, tokens: int = 0, bytes: int = 0, items: int = 0):
+        self.stage, self.tokens, self.bytes, self.items = stage, tokens, bytes, items
+        self.seconds = 0.0
+
+    def add(self, tokens: int = 0, bytes: int = 0, items: int = 0):
+        """Count work only known once the stage has run, e.g. the tokens of a reply"""
+        self.tokens += tokens
+        self.bytes += bytes
+        self.items += items
+
+    def as_dict(self) -> dict:
+        counts = {key: getattr(self, key) for key in ("tokens", "bytes", "items") if getattr(self, key)}
+        return {"stage": self.stage, "ms": round(self.seconds * 1000, 1), **counts}
+
+
+def record(span: Span):
+    """Aggregate a finished span, and add it to the current request's trace"""
+    stage_seconds.observe(span.seconds, stage=span.stage)
+    if span.tokens:
+        stage_tokens.inc(span.tokens, stage=span.stage)
+    if span.bytes:
+        stage_bytes.inc(span.bytes, stage=span.stage)
+    if span.items:
+        stage_items.inc(span.items, stage=span.stage)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.append(span)
+
+
+def observe(stage: str, seconds: float, tokens: int = 0, bytes: int = 0, items: int = 0):
+    """Record a stage timed elsewhere, e.g. in a worker process"""
+    finished = Span(stage, tokens, bytes, items)
+    finished.seconds = seconds
+    record(finished)
+
+
+@contextmanager
+def span(stage: str, tokens: int = 0, bytes: int = 0, items: int = 0):
+    """
+    Time a pipeline stage. Works in coroutines and in worker threads started
+    with asyncio.to_thread, which inherit the request's trace.
+    """
+    current = Span(stage, tokens, bytes, items)
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        current.seconds = time.perf_counter() - started
+        record(current)
+
+
+# ========== Slow Request Profiler ==========
+def _folded(frame) -> str:
+    """A stack as one line of the collapsed format (root first, frames joined by ';')"""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class SlowRequestProfiler:
+    """
+    Opt-in sampling profiler (PROFILER_ENABLED).
+
+    While requests are in flight, a background thread samples the stack of
+    every thread each PROFILER_INTERVAL seconds. When a request takes longer
+    than SLOW_REQUEST_SECONDS, the samples taken during it are written to
+    PROFILER_DIR as collapsed stacks, the input of flamegraph.pl or
+    speedscope. Requests share the event loop, so concurrent requests show
+    up in each other's profiles.
+    """
+
+    def __init__(self):
+        self.samples = deque(maxlen=100_000)  # (time, folded stack)
+        self.active = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.sequence = itertools.count(1)
+
+    def begin(self):
+        with self.lock:
+            self.active += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._sample, name="slow-request-profiler", daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def end(self):
+        with self.lock:
+            self.active -= 1
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {}
+        while True:
+            if self.active == 0:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            now = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self.samples.append((now, f"{names.get(thread_id, thread_id)};{_folded(frame)}"))
+            time.sleep(settings.PROFILER_INTERVAL)
+
+    def dump(self, started: float, finished: float, label: str) -> Optional[str]:
+        """Write the samples taken in [started, finished]; returns the file path"""
+        stacks = Tally(stack for at, stack in list(self.samples) if started <= at <= finished)
+        if not stacks:
+            return None
+        os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+        label = re.sub(r"[^A-Za-z0-9]+", "_", label).strip("_") or "root"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{os.getpid()}-{next(self.sequence)}.folded"
+        path = os.path.join(settings.PROFILER_DIR, name)
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+profiler = SlowRequestProfiler()
+
+
+# ========== Request Middleware ==========
+class TelemetryMiddleware:
+    """
+    ASGI middleware timing every HTTP request until its last body chunk is
+    sent (so streamed answers count in full) and collecting its spans.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_and_track(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        trace = []
+        token = current_trace.set(trace)
+        if settings.PROFILER_ENABLED:
+            profiler.begin()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_track)
+        finally:
+            finished = time.perf_counter()
+            current_trace.reset(token)
+            if settings.PROFILER_ENABLED:
+                profiler.end()
+            # The route template, not the raw path, keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            elapsed = finished - started
+            request_seconds.observe(elapsed, method=scope["method"], route=route)
+            requests_total.inc(method=scope["method"], route=route, status=status)
+            if elapsed >= settings.SLOW_REQUEST_SECONDS:
+                self._report_slow(scope, route, elapsed, trace, started, finished)
+
+    def _report_slow(self, scope, route: str, elapsed: float, trace: List[Span], started: float, finished: float):
+        slow_requests.inc(route=route)
+        profile = None
+        if settings.PROFILER_ENABLED:
+            profile = profiler.dump(started, finished, route)
+        logger.warning(
+            "Slow request %s %s: %.0f ms, stages %s%s",
+            scope["method"], scope["path"], elapsed * 1000,
+            [item.as_dict() for item in trace],
+            f", profile {profile}" if profile else ""
+        )
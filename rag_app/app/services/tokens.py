@@ -0,0 +1,52 @@
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; fall back to a character estimate
+    tiktoken = None
+
+# Chat requests add a few tokens per message (role, separators) and prime the reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+
+@lru_cache(maxsize=16)
+def get_encoding(model: str):
+    """tiktoken encoding for a model, or None when tiktoken (or its BPE files) is unavailable"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # The BPE ranks are downloaded on first use; offline hosts get the estimate
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Count tokens with the model's tokenizer, or estimate ~3 characters per token"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 3 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    """The longest prefix of text that is at most max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:(max_tokens - 1) * 3]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def count_message_tokens(messages: list, model: str) -> int:
+    """Prompt tokens of a chat request, including the per-message overhead"""
+    return REPLY_PRIMING_TOKENS + sum(
+        MESSAGE_OVERHEAD_TOKENS + count_tokens(message["content"], model) for message in messages
+    )
@@ -1,4 +1,4 @@
-from app.services.embedding_service import VectorStoreService
+from app.services.collection_service import CollectionService
 
-# SINGLE shared instance
-vector_store = VectorStoreService()
+# SINGLE shared instance; each named collection is its own VectorStoreService
+vector_store = CollectionService()
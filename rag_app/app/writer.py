@@ -0,0 +1,59 @@
+"""
+Ingest writer for multi-worker deployments.
+
+The one process that modifies the collections: it runs the ingestion jobs
+(uploads, replacements and deletions) that API workers queue in the shared
+SQLite job store, compacts, and publishes every change as a new snapshot
+generation in FAISS_INDEX_DIR. API workers started with
+VECTOR_STORE_MODE=reader memory-map those snapshots read-only and reload
+when a new generation appears.
+
+    INGEST_QUEUE_BACKEND=sqlite python -m app.writer
+    VECTOR_STORE_MODE=reader INGEST_QUEUE_BACKEND=sqlite uvicorn app.main:app --workers 4
+"""
+import asyncio
+import logging
+import signal
+
+from app.core.config import get_settings
+from app.services.compaction_service import compaction_service
+from app.services.document_service import shutdown_pdf_executor
+from app.services.ingestion_service import ingestion_service
+from app.services.llm_provider import llm_provider
+from app.services.vector_service import vector_store
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    if vector_store.read_only:
+        raise SystemExit("The writer owns the index: run it without VECTOR_STORE_MODE=reader")
+    if not settings.PERSIST_INDEX:
+        raise SystemExit("The writer publishes snapshots for the API workers: PERSIST_INDEX must be enabled")
+    try:
+        ingestion_service.check_backend()
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+
+    rows = vector_store.load()
+    logger.info("Writer loaded %s vectors from %s", rows, settings.FAISS_INDEX_DIR)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await ingestion_service.start()
+    await compaction_service.start()
+    await stop.wait()
+    await compaction_service.stop()
+    await ingestion_service.stop()
+    await llm_provider.close()
+    shutdown_pdf_executor()
+
+
+if __name__ == "__main__":
+    # Run outside uvicorn, so nothing else configures logging
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Bulk question answering: one /query call per question vs. /query/batch.
+
+Pre-fills a corpus, then answers fresh questions both ways on the mock LLM
+backend (with --latency seconds per API call): as individual /query requests
+from --concurrency clients, the way evaluation scripts send them, and as one
+/query/batch request. Reports wall time, questions per second, and the
+embeddings requests and FAISS searches each way made, read from the
+in-process stage metrics.
+
+    cd rag_app && python -m benchmarks.batch_query --corpus 100000 --questions 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("EMBEDDING_MODEL_DIM", "384")
+os.environ.setdefault("CHUNK_EMBEDDING_STORE_PATH", "")
+os.environ["LLM_BACKEND"] = "mock"
+os.environ["PERSIST_INDEX"] = "false"
+
+
+def stage_counts() -> dict:
+    """Calls per stage so far: embeddings requests (query and pipeline) and FAISS searches"""
+    from app.services.telemetry import stage_seconds
+
+    counts = {stage: series[2] for (stage,), series in stage_seconds.series.items()}
+    return {
+        "embedding_requests": counts.get("query_embedding", 0) + counts.get("embed", 0),
+        "faiss_searches": counts.get("faiss_search", 0)
+    }
+
+
+def delta(before: dict, after: dict) -> dict:
+    return {key: after[key] - before[key] for key in after}
+
+
+async def run(corpus: int, questions: int, concurrency: int, top_k: int, search_mode: str) -> dict:
+    import httpx
+    from app.main import app
+    from benchmarks.suite import prefill
+    from benchmarks.synthetic import make_page_text
+
+    rng = random.Random(7)
+    single_questions = [make_page_text(rng, 1, 8)[0] for _ in range(questions)]
+    # Different questions for the batch, so neither run is served from the query or answer cache
+    batch_questions = [make_page_text(rng, 1, 8)[0] for _ in range(questions)]
+    options = {"top_k": top_k, "search_mode": search_mode}
+    report = {"corpus": corpus, "questions": questions, "top_k": top_k, "search_mode": search_mode}
+
+    async with app.router.lifespan_context(app):
+        prefill(corpus)
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None
+        ) as client:
+            pending = iter(single_questions)
+            errors = 0
+
+            async def user():
+                nonlocal errors
+                for text in pending:
+                    response = await client.post("/api/v1/message/query", json={"query": text, **options})
+                    errors += response.status_code != 200
+
+            before = stage_counts()
+            started = time.perf_counter()
+            await asyncio.gather(*(user() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+            report["single"] = {
+                "concurrency": concurrency,
+                "seconds": round(elapsed, 3),
+                "questions_per_second": round(questions / elapsed, 1),
+                "errors": errors,
+                **delta(before, stage_counts())
+            }
+
+            before = stage_counts()
+            started = time.perf_counter()
+            response = await client.post("/api/v1/message/query/batch", json={"queries": batch_questions, **options})
+            summary = json.loads(response.text.splitlines()[-1])
+            elapsed = time.perf_counter() - started
+            report["batch"] = {
+                "seconds": round(elapsed, 3),
+                "questions_per_second": round(questions / elapsed, 1),
+                "errors": summary.get("failed"),
+                "server_timings_ms": summary.get("timings"),
+                **delta(before, stage_counts())
+            }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=100_000, help="chunks pre-filled into the index")
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8, help="clients sending single /query requests")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--search-mode", default="hybrid", choices=["dense", "lexical", "hybrid"])
+    parser.add_argument("--latency", type=float, default=0.05, help="mock LLM latency per API call, seconds")
+    args = parser.parse_args()
+    os.environ["MOCK_LLM_LATENCY"] = str(args.latency)
+    print(json.dumps(asyncio.run(run(args.corpus, args.questions, args.concurrency, args.top_k, args.search_mode)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Memory and load time of chunk storage: Python lists of dicts vs ChunkStore.
+
+Builds the same synthetic corpus three ways and reports the Python heap it
+occupies (tracemalloc):
+
+- lists: the previous layout - chunk texts, uuid4 chunk ids, one metadata
+  dict per chunk, hex content hashes and a hash -> row dict
+- chunk_store: ChunkStore columns held in memory, one segment per upload
+- chunk_store_mmap: the same store restored from a snapshot with its columns
+  memory-mapped
+
+Load times compare decoding a snapshot into the old lists with adopting its
+segments as they are.
+
+    cd rag_app && python -m benchmarks.chunk_store_memory --chunks 1000000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import faiss
+
+from app.services.chunk_store import ChunkStore
+from app.services.embedding_cache import content_hash
+from app.services.index_store import IndexSnapshotStore
+from benchmarks.synthetic import make_page_text
+
+
+def make_corpus(chunks: int, chars: int, uploads: int):
+    """Yield (texts, metadata) batches, one per upload; texts are unique so none deduplicate"""
+    rng = random.Random(0)
+    pool = [" ".join(make_page_text(rng, 1, 40))[:chars] for _ in range(1000)]
+    per_upload = -(-chunks // uploads)
+    for upload in range(uploads):
+        start = upload * per_upload
+        stop = min(chunks, start + per_upload)
+        texts = [f"{pool[row % len(pool)]} {row}" for row in range(start, stop)]
+        metadata = [{"page_number": 1 + (row - start) // 4, "filename": f"doc-{upload}.pdf"} for row in range(start, stop)]
+        yield texts, metadata
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"heap_mb": round(current / 2 ** 20, 1), "seconds": round(elapsed, 2)}
+
+
+def build_lists(batches):
+    state = {"chunks": [], "chunk_ids": [], "metadata": [], "content_hashes": [], "hash_rows": {}}
+    for texts, metadata in batches:
+        hashes = [content_hash(text) for text in texts]
+        state["hash_rows"].update((h, len(state["chunks"]) + i) for i, h in enumerate(hashes))
+        state["content_hashes"].extend(hashes)
+        state["chunks"].extend(texts)
+        state["chunk_ids"].extend(str(uuid.uuid4()) for _ in texts)
+        state["metadata"].extend(metadata)
+    return state
+
+
+def build_store(batches):
+    store = ChunkStore()
+    for texts, metadata in batches:
+        store.append(texts, metadata, [content_hash(text) for text in texts])
+    return store
+
+
+def load_as_lists(snapshot: IndexSnapshotStore):
+    """What loading cost before: every row decoded into Python objects"""
+    state = snapshot.load(1, mmap=True)
+    chunks, chunk_ids, metadata, content_hashes = [], [], [], []
+    for segment in state["segments"]:
+        offsets, text = segment["offsets"], segment["text"]
+        for i in range(len(segment["pages"])):
+            chunks.append(text[offsets[i]:offsets[i + 1]].decode("utf-8"))
+            chunk_ids.append(str(uuid.UUID(int=int(segment["ids"][i]))))
+            metadata.append({"page_number": int(segment["pages"][i]), "filename": segment["filenames"][segment["file_ids"][i]]})
+            content_hashes.append(segment["hashes"][i].tobytes().hex())
+    return chunks, chunk_ids, metadata, content_hashes
+
+
+def load_as_store(snapshot: IndexSnapshotStore):
+    state = snapshot.load(1, mmap=True)
+    store = ChunkStore()
+    for segment in state["segments"]:
+        store.adopt(segment)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--chars", type=int, default=300, help="approximate characters per chunk")
+    parser.add_argument("--uploads", type=int, default=100, help="batches (segments) the corpus arrives in")
+    args = parser.parse_args()
+
+    report = {"chunks": args.chunks, "chars_per_chunk": args.chars, "uploads": args.uploads}
+
+    state, report["lists"] = measure(lambda: build_lists(make_corpus(args.chunks, args.chars, args.uploads)))
+    report["lists"]["text_mb"] = round(sum(len(text.encode("utf-8")) for text in state["chunks"]) / 2 ** 20, 1)
+    del state
+
+    store, report["chunk_store"] = measure(lambda: build_store(make_corpus(args.chunks, args.chars, args.uploads)))
+    report["chunk_store"]["column_mb"] = round(store.nbytes / 2 ** 20, 1)
+
+    directory = tempfile.mkdtemp(prefix="chunk_store_bench_")
+    try:
+        # A 1-d flat index keeps the snapshot consistent without costing real vectors
+        snapshot = IndexSnapshotStore(directory)
+        indexes, index_files = [], []
+        started = time.perf_counter()
+        for segment in store.segments:
+            indexes.append(faiss.IndexFlatIP(1))
+            indexes[-1].add(faiss.rand((len(segment), 1)))
+            index_files = snapshot.save(indexes, index_files + [None], [segment], store.filenames)
+        report["snapshot_write_seconds"] = round(time.perf_counter() - started, 2)
+        del store
+
+        lists, report["load_lists"] = measure(lambda: load_as_lists(IndexSnapshotStore(directory)))
+        del lists
+        mapped, report["chunk_store_mmap"] = measure(lambda: load_as_store(IndexSnapshotStore(directory)))
+
+        # Spot-check random row lookups against the mapped store
+        rng = random.Random(1)
+        rows = [rng.randrange(len(mapped)) for _ in range(100_000)]
+        started = time.perf_counter()
+        for row in rows:
+            mapped.row(row)
+        report["chunk_store_mmap"]["row_lookup_us"] = round((time.perf_counter() - started) / len(rows) * 1e6, 2)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
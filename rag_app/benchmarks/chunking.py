@@ -0,0 +1,89 @@
+"""
+Chunking: LangChain's per-page recursive splitter vs the document-level chunker.
+
+Extracts the pages of a synthetic PDF once, then chunks them both ways with
+the configured CHUNK_SIZE / CHUNK_OVERLAP and reports, per document:
+pages chunked per second (chunking only, best of --repeat runs), chunks
+produced, their size spread, chunks under CHUNK_MIN_SIZE, chunks crossing a
+page break and the tokens an embedding pass would bill.
+
+    cd rag_app && python -m benchmarks.chunking --pages 500
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services import pdf_worker
+from app.services.chunker import DocumentChunker
+from app.services.tokens import count_tokens
+from benchmarks.synthetic import make_pdf
+
+settings = get_settings()
+
+
+def recursive_chunks(pages):
+    """The previous behaviour: every page split on its own"""
+    splitter = pdf_worker.get_splitter(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+    return [(chunk, page_num, page_num) for text, page_num in pages for chunk in splitter.split_text(text)]
+
+
+def document_chunks(pages):
+    chunker = DocumentChunker(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, settings.CHUNK_MIN_SIZE)
+    chunks = []
+    for text, page_num in pages:
+        chunks += chunker.feed(text, page_num)
+    chunks += chunker.finish()
+    return [(chunk.text, chunk.page_start, chunk.page_end) for chunk in chunks]
+
+
+def measure(name: str, chunk, pages, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = chunk(pages)
+        timings.append(time.perf_counter() - started)
+    sizes = np.array([len(text) for text, _, _ in chunks])
+    best = min(timings)
+    return {
+        "chunker": name,
+        "pages_per_s": round(len(pages) / best, 1),
+        "chunk_ms": round(best * 1000, 2),
+        "chunks": len(chunks),
+        "chunk_chars_p5": int(np.percentile(sizes, 5)),
+        "chunk_chars_p50": int(np.percentile(sizes, 50)),
+        "chunk_chars_max": int(sizes.max()),
+        "chunks_under_min_size": int((sizes < settings.CHUNK_MIN_SIZE).sum()),
+        "chunks_crossing_pages": sum(start != end for _, start, end in chunks),
+        "embedding_tokens": sum(count_tokens(text, settings.EMBEDDING_MODEL) for text, _, _ in chunks),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500, help="pages in the synthetic PDF")
+    parser.add_argument("--lines", type=int, default=45, help="lines of text per page")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per chunker; the fastest is reported")
+    args = parser.parse_args()
+
+    pages = pdf_worker.extract_pages(make_pdf(args.pages, lines_per_page=args.lines))
+    results = [
+        measure("recursive_per_page", recursive_chunks, pages, args.repeat),
+        measure("document_linear", document_chunks, pages, args.repeat),
+    ]
+    print(json.dumps({
+        "pages": len(pages),
+        "text_chars": sum(len(text) for text, _ in pages),
+        "chunk_size": settings.CHUNK_SIZE,
+        "chunk_overlap": settings.CHUNK_OVERLAP,
+        "results": results
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Concurrent stress test of VectorStoreService: lock-free searches during writes.
+
+Reader threads search a pre-filled store nonstop while writer threads add
+files, delete them, replace live files with new versions and compact. Every
+result is checked for consistency:
+
+- content matches the filename and chunk it is reported under, with no duplicates
+- a stored vector finds its own chunk first (base files are never modified)
+- files whose delete returned before the search started never appear
+- a search restricted to one live file sees a single version of it, never
+  a mix of old and new chunks from a replace in progress
+
+Throughput and latency are reported with readers only and with writers
+running, followed by a final consistency check of the store.
+
+    cd rag_app && python -m benchmarks.concurrent_search --readers 4 --writers 2 --seconds 10
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("PERSIST_INDEX", "false")
+os.environ.setdefault("CHUNK_EMBEDDING_STORE_PATH", "")
+os.environ.setdefault("EMBEDDING_MODEL_DIM", "384")
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.embedding_service import VectorStoreService
+from benchmarks.query_latency_under_ingest import percentiles
+from benchmarks.synthetic import make_page_text
+
+EMBEDDING_DIM = get_settings().EMBEDDING_MODEL_DIM  # Full embeddings; the store may index fewer dimensions (INDEX_DIMENSION)
+
+
+def make_file(rng: random.Random, np_rng: np.random.Generator, filename: str, version: int, rows: int, dimension: int):
+    """Chunks tagged with their filename, version and position, so results can be checked"""
+    texts = [f"{filename} v{version} #{k} " + " ".join(make_page_text(rng, 2)) for k in range(rows)]
+    vectors = np_rng.standard_normal((rows, dimension), dtype=np.float32)
+    metadata = [{"page_number": 1 + k // 4, "filename": filename} for k in range(rows)]
+    return texts, vectors, metadata
+
+
+class Stress:
+    def __init__(self, store: VectorStoreService, base_vectors: dict, live_files: list, batch: int):
+        self.store = store
+        self.base_vectors = base_vectors  # filename -> normalized vectors of a base file
+        self.live_files = live_files  # Files that are replaced, never deleted
+        self.batch = batch
+        self.deleted_at = {}  # filename -> time its delete returned
+        self.errors = Counter()
+        self.examples = []
+        self.latencies = []
+        self.writes = Counter()
+        self.stop = threading.Event()
+
+    def fail(self, kind: str, detail):
+        self.errors[kind] += 1
+        if len(self.examples) < 10:
+            self.examples.append({"kind": kind, "detail": str(detail)[:200]})
+
+    def check_results(self, results, started: float):
+        chunk_ids = [result["chunk_id"] for result in results]
+        if len(chunk_ids) != len(set(chunk_ids)):
+            self.fail("duplicate_results", chunk_ids)
+        for result in results:
+            if not result["content"].startswith(result["filename"] + " v"):
+                self.fail("content_mismatch", (result["filename"], result["content"][:40]))
+            deleted = self.deleted_at.get(result["filename"])
+            if deleted is not None and deleted < started:
+                self.fail("deleted_file_returned", result["filename"])
+
+    def reader(self, seed: int):
+        rng = random.Random(seed)
+        names = list(self.base_vectors)
+        while not self.stop.is_set():
+            kind = rng.random()
+            started = time.perf_counter()
+            if kind < 0.5:
+                # A stored vector must find its own chunk
+                filename = rng.choice(names)
+                k = rng.randrange(len(self.base_vectors[filename]))
+                results = self.store.search_vector("", self.base_vectors[filename][k:k + 1], 5, mode="dense")
+                if not results or not results[0]["content"].startswith(f"{filename} v0 #{k} "):
+                    self.fail("self_match", (filename, k, results[0]["content"][:40] if results else None))
+            elif kind < 0.75:
+                query = " ".join(make_page_text(rng, 1, 4))
+                vector = np.random.default_rng(rng.randrange(2 ** 32)).standard_normal((1, EMBEDDING_DIM), dtype=np.float32)
+                results = self.store.search_vector(query, vector, 10, mode="hybrid")
+            else:
+                # One file at a time: a replace must be all-or-nothing
+                filename = rng.choice(self.live_files)
+                vector = np.random.default_rng(rng.randrange(2 ** 32)).standard_normal((1, EMBEDDING_DIM), dtype=np.float32)
+                results = self.store.search_vector("", vector, 10, mode="dense", filenames=[filename])
+                versions = {result["content"].split(" ", 2)[1] for result in results}
+                if len(versions) > 1:
+                    self.fail("mixed_versions", (filename, sorted(versions)))
+                if not results:
+                    self.fail("live_file_missing", filename)
+            self.latencies.append(time.perf_counter() - started)
+            self.check_results(results, started)
+
+    def writer(self, seed: int):
+        rng = random.Random(seed)
+        np_rng = np.random.default_rng(1000 + seed)  # Distinct from the base corpus vectors
+        dimension = EMBEDDING_DIM
+        owned, versions, counter = [], Counter(), 0
+        while not self.stop.is_set():
+            action = rng.random()
+            if action < 0.45 or not owned:
+                filename = f"churn-{seed}-{counter}.pdf"
+                counter += 1
+                texts, vectors, metadata = make_file(rng, np_rng, filename, 0, self.batch, dimension)
+                self.store.add_documents(texts, vectors, metadata)
+                owned.append(filename)
+                self.writes["add"] += 1
+                self.writes["rows_added"] += len(texts)
+            elif action < 0.75:
+                filename = owned.pop(rng.randrange(len(owned)))
+                self.store.delete_document(filename)
+                self.deleted_at[filename] = time.perf_counter()
+                self.writes["delete"] += 1
+            else:
+                filename = rng.choice([name for name in self.live_files if name.startswith(f"live-{seed}-")])
+                versions[filename] += 1
+                texts, vectors, metadata = make_file(rng, np_rng, filename, versions[filename], self.batch // 2, dimension)
+                self.store.replace_document(filename, texts, vectors, metadata)
+                self.writes["replace"] += 1
+                self.writes["rows_added"] += len(texts)
+
+    def compactor(self, interval: float):
+        while not self.stop.wait(interval):
+            if self.store.compact():
+                self.writes["compact"] += 1
+
+    def run(self, readers: int, writers: int, seconds: float, compact_interval: float) -> dict:
+        self.latencies = []
+        self.writes = Counter()
+        threads = [threading.Thread(target=self.reader, args=(i,)) for i in range(readers)]
+        if writers:
+            threads += [threading.Thread(target=self.writer, args=(i,)) for i in range(writers)]
+            threads.append(threading.Thread(target=self.compactor, args=(compact_interval,)))
+
+        self.stop.clear()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            "readers": readers,
+            "writers": writers,
+            "seconds": round(elapsed, 2),
+            "queries_per_second": round(len(self.latencies) / elapsed, 1),
+            "query_latency": percentiles(self.latencies),
+            "writes": dict(self.writes),
+            "rows_added_per_second": round(self.writes["rows_added"] / elapsed, 1)
+        }
+
+
+def final_check(store: VectorStoreService) -> dict:
+    view = store.view
+    chunks = view.chunks
+    live_rows = np.setdiff1d(np.arange(len(chunks)), chunks.deleted_rows)
+    file_rows = sum(len(rows) for rows in chunks.file_rows.values())
+    return {
+        "vectors_match_rows": view.ntotal == len(chunks),
+        "bm25_docs_match_rows": view.lexical_index.num_docs == len(chunks),
+        "file_rows_match_live": file_rows == len(live_rows) == chunks.live,
+        "ids_round_trip": bool(np.array_equal(chunks.rows_of(chunks.ids_of(live_rows)), live_rows)),
+        "index_segments": len(view.indexes),
+        "lexical_segments": len(view.lexical_index.segments),
+        "live_chunks": chunks.live,
+        "tombstones": len(chunks.deleted_rows)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=20_000, help="chunks pre-loaded into the store")
+    parser.add_argument("--files", type=int, default=50, help="base files the corpus is split into")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=200, help="chunks per file added by a writer")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration of each phase")
+    parser.add_argument("--compact-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    store = VectorStoreService()
+    rng, np_rng = random.Random(0), np.random.default_rng(0)
+    base_vectors = {}
+    per_file = args.corpus // args.files
+    for i in range(args.files):
+        filename = f"base-{i}.pdf"
+        texts, vectors, metadata = make_file(rng, np_rng, filename, 0, per_file, EMBEDDING_DIM)
+        store.add_documents(texts, vectors, metadata)
+        base_vectors[filename] = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    live_files = []
+    for w in range(max(args.writers, 1)):
+        for j in range(3):
+            filename = f"live-{w}-{j}.pdf"
+            store.add_documents(*make_file(rng, np_rng, filename, 0, args.batch // 2, EMBEDDING_DIM))
+            live_files.append(filename)
+
+    stress = Stress(store, base_vectors, live_files, args.batch)
+    report = {
+        "corpus": args.corpus,
+        "dimension": store.dimension,
+        "readers_only": stress.run(args.readers, 0, args.seconds, args.compact_interval),
+        "with_writers": stress.run(args.readers, args.writers, args.seconds, args.compact_interval),
+        "errors": dict(stress.errors),
+        "error_examples": stress.examples,
+        "final": final_check(store)
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
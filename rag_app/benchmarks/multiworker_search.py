@@ -0,0 +1,155 @@
+"""
+Search throughput and memory of several reader processes sharing one snapshot.
+
+Builds a snapshot once, then for each worker count starts that many
+processes in VECTOR_STORE_MODE=reader, each loading the snapshot and running
+dense searches for a fixed time, the way uvicorn workers would. Reported per
+run:
+
+- queries_per_second: summed over the workers
+- rss_mb: summed resident memory; counts pages shared through the page cache
+  once per worker
+- pss_mb: summed proportional memory, where a page shared by n workers counts
+  1/n per worker; the real footprint of the deployment
+- index_file_mb / anonymous_mb: file-backed (mmapped) and private memory per worker
+
+Runs with INDEX_MMAP on (vectors mapped zero-copy, one copy for all workers)
+and off (every worker reads its own copy into its heap).
+
+    cd rag_app && python -m benchmarks.multiworker_search --corpus 200000 --workers 1 2 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("CHUNK_EMBEDDING_STORE_PATH", "")
+os.environ.setdefault("EMBEDDING_MODEL_DIM", "384")
+
+import faiss
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.embedding_service import VectorStoreService
+from benchmarks.synthetic import make_page_text
+
+
+def memory_mb() -> dict:
+    """Totals from /proc/self/smaps_rollup, in MB"""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "anonymous": fields.get("Anonymous", 0.0),
+        "file": fields.get("Rss", 0.0) - fields.get("Anonymous", 0.0)
+    }
+
+
+def build_snapshot(directory: str, corpus: int, files: int, factory: str) -> int:
+    """Write a snapshot the way the ingest writer would, one file per upload"""
+    get_settings().INDEX_FACTORY = factory
+    store = VectorStoreService(directory=directory)
+    rng, np_rng = random.Random(0), np.random.default_rng(0)
+    per_file = corpus // files
+    for i in range(files):
+        texts = [" ".join(make_page_text(rng, 1)) for _ in range(per_file)]
+        vectors = np_rng.standard_normal((per_file, store.dimension), dtype=np.float32)
+        metadata = [{"page_number": 1, "filename": f"file-{i}.pdf"}] * per_file
+        store.add_documents(texts, vectors, metadata)
+    return store.view.ntotal
+
+
+def worker(directory: str, seconds: float, seed: int, ready, start, results):
+    # One search thread per process, as in one uvicorn worker per core
+    faiss.omp_set_num_threads(1)
+    store = VectorStoreService(directory=directory, read_only=True)
+    store.load()
+    queries = np.random.default_rng(seed).standard_normal((256, store.dimension), dtype=np.float32)
+    faiss.normalize_L2(queries)
+    store.search_vector("", queries[:1], 10, mode="dense")  # Touch the index before measuring
+
+    ready.wait()
+    start.wait()
+    done, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        store.search_vector("", queries[done % len(queries):done % len(queries) + 1], 10, mode="dense")
+        done += 1
+    results.put({"queries": done, "memory": memory_mb()})
+
+
+def run(directory: str, workers: int, seconds: float) -> dict:
+    context = multiprocessing.get_context("spawn")
+    ready, start = context.Barrier(workers + 1), context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(directory, seconds, seed, ready, start, results))
+        for seed in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    ready.wait()
+    started = time.perf_counter()
+    start.wait()
+    reports = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    memory = [report["memory"] for report in reports]
+    return {
+        "workers": workers,
+        "queries_per_second": round(sum(report["queries"] for report in reports) / elapsed, 1),
+        "rss_mb": round(sum(item["rss"] for item in memory), 1),
+        "pss_mb": round(sum(item["pss"] for item in memory), 1),
+        "index_file_mb": [round(item["file"], 1) for item in memory],
+        "anonymous_mb": [round(item["anonymous"], 1) for item in memory]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=200_000, help="chunks in the snapshot")
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--factory", default="Flat", help="INDEX_FACTORY of the snapshot's base index")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=5.0, help="search time per run")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="multiworker-")
+    # Spawned workers read their settings from the environment
+    os.environ["INDEX_FACTORY"] = args.factory
+    os.environ["VECTOR_STORE_MODE"] = "reader"
+    try:
+        report = {
+            "corpus": args.corpus,
+            "dimension": int(os.environ["EMBEDDING_MODEL_DIM"]),
+            "factory": args.factory,
+            "cpus": os.cpu_count(),
+            "index_bytes": 0,
+            "runs": {}
+        }
+        build_snapshot(directory, args.corpus, args.files, args.factory)
+        report["index_bytes"] = sum(
+            os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory) if name.endswith(".faiss")
+        )
+        for mmap in ("true", "false"):
+            os.environ["INDEX_MMAP"] = mmap
+            key = "mmap" if mmap == "true" else "heap_copy"
+            report["runs"][key] = [run(directory, workers, args.seconds) for workers in args.workers]
+        print(json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
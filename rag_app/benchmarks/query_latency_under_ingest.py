@@ -0,0 +1,103 @@
+"""
+Query latency while PDFs are being ingested.
+
+Runs a steady stream of keyword queries (no network) against a pre-filled
+vector store while several uploads are extracted and chunked, once with the
+work done inline on the event loop and once through the PDF process pool.
+
+    cd rag_app && python -m benchmarks.query_latency_under_ingest --pages 200 --uploads 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("PERSIST_INDEX", "false")
+os.environ.setdefault("CHUNK_EMBEDDING_STORE_PATH", "")
+
+import numpy as np
+
+from app.services.document_service import DocumentProcessor, shutdown_pdf_executor
+from app.services.embedding_service import VectorStoreService
+from benchmarks.synthetic import make_page_text, make_pdf
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+async def ingest_inline(processor: DocumentProcessor, pdf: bytes, path: str):
+    """The pre-pool behaviour: extraction and splitting block the event loop"""
+    for text, _ in processor.extract_text_from_pdf(pdf):
+        processor.chunk_text(text)
+        await asyncio.sleep(0)
+
+
+async def ingest_pool(processor: DocumentProcessor, pdf: bytes, path: str):
+    async for _ in processor.iter_page_chunks(path):
+        pass
+
+
+async def run(mode: str, store: VectorStoreService, processor: DocumentProcessor, pdfs, paths, interval: float):
+    latencies = []
+    done = asyncio.Event()
+
+    async def query_loop():
+        rng = random.Random(1)
+        while not done.is_set():
+            # Latency is measured from the moment the query was due, so event-loop stalls count
+            due = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            await store.search(" ".join(make_page_text(rng, 1, 4)), top_k=5, mode="lexical")
+            latencies.append(time.perf_counter() - due)
+
+    ingest = ingest_inline if mode == "inline" else ingest_pool
+    query_task = asyncio.create_task(query_loop())
+    started = time.perf_counter()
+    await asyncio.gather(*(ingest(processor, pdf, path) for pdf, path in zip(pdfs, paths)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await query_task
+    return {"mode": mode, "ingest_seconds": round(elapsed, 3), "query_latency": percentiles(latencies)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100, help="pages per synthetic PDF")
+    parser.add_argument("--uploads", type=int, default=4, help="concurrent uploads")
+    parser.add_argument("--corpus", type=int, default=20_000, help="chunks pre-loaded into the store")
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between queries")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    store = VectorStoreService()
+    texts = [" ".join(make_page_text(rng, 3)) for _ in range(args.corpus)]
+    vectors = np.random.default_rng(0).random((args.corpus, store.dimension), dtype=np.float32)
+    store.add_documents(texts, vectors, [{"page_number": 1, "filename": "corpus.pdf"}] * args.corpus)
+
+    processor = DocumentProcessor()
+    pdfs = [make_pdf(args.pages, seed=i) for i in range(args.uploads)]
+    with tempfile.TemporaryDirectory() as spool:
+        # The pool reads uploads from disk, as ingestion jobs do
+        paths = [os.path.join(spool, f"upload-{i}.pdf") for i in range(len(pdfs))]
+        for pdf, path in zip(pdfs, paths):
+            with open(path, "wb") as f:
+                f.write(pdf)
+        results = [await run(mode, store, processor, pdfs, paths, args.interval) for mode in ("inline", "pool")]
+    shutdown_pdf_executor()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,157 @@
+"""
+Recall vs memory of the index storage modes (INDEX_DIMENSION x INDEX_QUANTIZATION).
+
+Builds the brute-force index of every mode over one corpus, searches it with
+held-out queries and reports, per mode: index bytes per vector and the
+reduction against full float32, recall@k against exact search on the full
+embeddings, without and with the exact rescoring pass (RESCORE_MULTIPLIER
+times k candidates rescored on the full vectors), and search latency.
+
+The corpus is read from a chunk embedding store (--store, the
+CHUNK_EMBEDDING_STORE_PATH SQLite file of a real deployment), with --queries
+of its vectors held out as queries; without one, synthetic clustered vectors
+whose variance decays along the dimensions, as in Matryoshka-trained models
+like text-embedding-3, so truncated prefixes keep most of the signal.
+Rescoring reads full vectors from memory here; the service reads them from
+the chunk embedding store, which adds its lookup time.
+
+    cd rag_app && python -m benchmarks.storage_modes --corpus 100000 --dimensions 1536 512 256
+    python -m benchmarks.storage_modes --store faiss_index/chunk_embeddings.db --dimensions 1536 512 256
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import faiss
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.index_factory import QUANTIZATION_FACTORIES, build_index, reduce_dimension
+from benchmarks.query_latency_under_ingest import percentiles
+from benchmarks.suite import clustered_vectors
+
+settings = get_settings()
+
+
+def synthetic_corpus(rows: int, dimension: int, seed: int) -> np.ndarray:
+    """Clustered vectors with most of their variance in the leading dimensions"""
+    vectors = clustered_vectors(rows, dimension, seed)
+    vectors *= 1 / np.sqrt(1 + np.arange(dimension, dtype=np.float32) / 32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def stored_corpus(path: str, model: str) -> np.ndarray:
+    """Every embedding of `model` in a chunk embedding store, normalized"""
+    db = sqlite3.connect(path)
+    try:
+        blobs = [blob for blob, in db.execute("SELECT vector FROM chunk_embeddings WHERE model = ?", (model,))]
+    finally:
+        db.close()
+    if not blobs:
+        raise SystemExit(f"No {model} embeddings in {path}")
+    vectors = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), -1).copy()
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def index_bytes(index) -> int:
+    with tempfile.NamedTemporaryFile(suffix=".faiss") as f:
+        faiss.write_index(index, f.name)
+        return os.path.getsize(f.name)
+
+
+def measure(vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, dimension: int, quantization: str, top_k: int, multiplier: int) -> dict:
+    full_dimension = vectors.shape[1]
+    reduced = reduce_dimension(vectors, dimension)
+    index = build_index(dimension, QUANTIZATION_FACTORIES[quantization])
+    started = time.perf_counter()
+    if not index.is_trained:
+        sample = np.random.default_rng(0).choice(len(reduced), min(len(reduced), settings.INDEX_TRAIN_SIZE), replace=False)
+        index.train(reduced[sample])
+    index.add_with_ids(reduced, np.arange(len(reduced), dtype=np.int64))
+    build_seconds = time.perf_counter() - started
+    size = index_bytes(index)
+    del reduced
+
+    reduced_queries = reduce_dimension(queries, dimension)
+    candidates = top_k * multiplier
+    plain, rescored, latencies, rescore_latencies = [], [], [], []
+    # One query per call, as the API searches
+    for i in range(len(queries)):
+        started = time.perf_counter()
+        _, ids = index.search(reduced_queries[i:i + 1], top_k)
+        latencies.append(time.perf_counter() - started)
+        plain.append(ids[0])
+
+        started = time.perf_counter()
+        _, ids = index.search(reduced_queries[i:i + 1], candidates)
+        ids = ids[0][ids[0] >= 0]
+        scores = vectors[ids] @ queries[i]
+        rescored.append(ids[np.argsort(-scores, kind="stable")[:top_k]])
+        rescore_latencies.append(time.perf_counter() - started)
+
+    def recall(found) -> float:
+        return round(float(np.mean([len(set(ids.tolist()) & set(expected.tolist())) / top_k for ids, expected in zip(found, truth)])), 4)
+
+    return {
+        "dimension": dimension,
+        "quantization": quantization,
+        "index_mb": round(size / 2**20, 2),
+        "bytes_per_vector": round(size / len(vectors), 1),
+        "reduction": round(len(vectors) * full_dimension * 4 / size, 1),
+        "build_seconds": round(build_seconds, 3),
+        "recall_at_k": recall(plain),
+        "recall_at_k_rescored": recall(rescored),
+        "latency": percentiles(latencies),
+        "latency_rescored": percentiles(rescore_latencies)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", help="chunk embedding store (SQLite) to take the corpus from; synthetic vectors otherwise")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL, help="embedding model of the stored vectors")
+    parser.add_argument("--corpus", type=int, default=100_000, help="synthetic corpus size")
+    parser.add_argument("--dimension", type=int, default=settings.EMBEDDING_MODEL_DIM, help="synthetic embedding dimension")
+    parser.add_argument("--queries", type=int, default=500, help="held-out queries")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--multiplier", type=int, default=max(settings.RESCORE_MULTIPLIER, 1), help="rescoring over-fetch")
+    parser.add_argument("--dimensions", type=int, nargs="+", help="index dimensions to try (default: full, 512, 256)")
+    parser.add_argument("--quantizations", nargs="+", default=list(QUANTIZATION_FACTORIES), choices=list(QUANTIZATION_FACTORIES))
+    args = parser.parse_args()
+
+    if args.store:
+        vectors = stored_corpus(args.store, args.model)
+        held_out = np.random.default_rng(0).permutation(len(vectors))
+        queries, vectors = vectors[held_out[:args.queries]], vectors[held_out[args.queries:]]
+    else:
+        vectors = synthetic_corpus(args.corpus, args.dimension, seed=1)
+        queries = synthetic_corpus(args.queries, args.dimension, seed=2)
+    full_dimension = vectors.shape[1]
+    dimensions = sorted({d for d in (args.dimensions or [full_dimension, 512, 256]) if d <= full_dimension}, reverse=True)
+    _, truth = faiss.knn(queries, vectors, args.top_k, faiss.METRIC_INNER_PRODUCT)
+
+    results = [
+        measure(vectors, queries, truth, dimension, quantization, args.top_k, args.multiplier)
+        for dimension in dimensions
+        for quantization in args.quantizations
+    ]
+    print(json.dumps({
+        "corpus": len(vectors),
+        "source": args.store or "synthetic",
+        "full_dimension": full_dimension,
+        "queries": len(queries),
+        "top_k": args.top_k,
+        "rescore_candidates": args.top_k * args.multiplier,
+        "results": results
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""
+Reproducible load test of the ingest and query paths, written out as JSON.
+
+Runs offline: PDFs come from benchmarks.synthetic and embeddings / answers
+from the mock LLM backend (LLM_BACKEND=mock), so the numbers reflect this
+service only. Every stage runs in a fresh process, so its peak RSS is its own:
+
+- ingest: synthetic PDFs uploaded through POST /api/v1/document/upload and
+  processed by the ingestion workers (extract, chunk, embed, index, snapshot);
+  pages and chunks per second
+- search: FAISS search latency percentiles, recall@k against exact search,
+  build time and index size per index type and corpus size
+- query: POST /api/v1/message/query end to end over a pre-filled corpus at
+  several concurrency levels; p50 / p95 / p99 latency, throughput and the
+  median of each server-side timing
+
+The report (git commit, environment, arguments, results) is written to
+--output. --compare prints how the headline metrics moved against an earlier
+report and exits non-zero when one regressed by more than --threshold.
+
+    cd rag_app && python -m benchmarks.suite --corpus 1000 10000 100000
+    python -m benchmarks.suite --stages query --query-corpus 1000000 --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from statistics import median
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("EMBEDDING_MODEL_DIM", "384")
+os.environ.setdefault("CHUNK_EMBEDDING_STORE_PATH", "")
+os.environ["LLM_BACKEND"] = "mock"
+
+import numpy as np
+
+from benchmarks.query_latency_under_ingest import percentiles
+from benchmarks.synthetic import make_page_text, make_pdf
+
+DEFAULT_FACTORIES = ["Flat", "HNSW32,Flat", "IVF{nlist},Flat", "IVF{nlist},SQ8"]
+
+
+# ========== Ingest ==========
+async def _wait_for_jobs(client, job_ids):
+    jobs = {}
+    while len(jobs) < len(job_ids):
+        await asyncio.sleep(0.05)
+        for job_id in job_ids:
+            if job_id not in jobs:
+                job = (await client.get(f"/api/v1/document/jobs/{job_id}")).json()
+                if job["status"] in ("completed", "failed"):
+                    jobs[job_id] = job
+    return list(jobs.values())
+
+
+async def ingest_stage(pages: int, uploads: int) -> dict:
+    import httpx
+    from app.main import app
+
+    pdfs = [make_pdf(pages, seed=i) for i in range(uploads)]
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+            started = time.perf_counter()
+            job_ids = []
+            for i, pdf in enumerate(pdfs):
+                response = await client.post(
+                    "/api/v1/document/upload",
+                    files={"file": (f"benchmark-{i}.pdf", pdf, "application/pdf")}
+                )
+                response.raise_for_status()
+                job_ids.append(response.json()["job_id"])
+            jobs = await _wait_for_jobs(client, job_ids)
+            elapsed = time.perf_counter() - started
+
+    failed = [job["error"] for job in jobs if job["status"] == "failed"]
+    pages_parsed = sum(job["pages_parsed"] for job in jobs)
+    chunks = sum(job["chunks_indexed"] for job in jobs)
+    return {
+        "uploads": uploads,
+        "pages": pages_parsed,
+        "chunks": chunks,
+        "failed": len(failed),
+        "errors": failed[:3],
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages_parsed / elapsed, 1),
+        "chunks_per_second": round(chunks / elapsed, 1),
+        "pdf_mb": round(sum(len(pdf) for pdf in pdfs) / 2**20, 1)
+    }
+
+
+# ========== FAISS Search ==========
+def clustered_vectors(rows: int, dimension: int, seed: int, clusters: int = 1000) -> np.ndarray:
+    """Normalized vectors around shared random centers; closer to real embeddings than pure noise"""
+    centers = np.random.default_rng(0).standard_normal((clusters, dimension), dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    vectors = np.empty((rows, dimension), dtype=np.float32)
+    for start in range(0, rows, 100_000):
+        block = vectors[start:start + 100_000]
+        block[:] = centers[rng.integers(clusters, size=len(block))]
+        block += 0.5 * rng.standard_normal(block.shape, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def factory_string(factory: str, corpus: int) -> str:
+    """Fill in {nlist}: about 4 * sqrt(n) lists, with at least 39 training points per list"""
+    return factory.format(nlist=max(1, min(int(4 * math.sqrt(corpus)), corpus // 39)))
+
+
+def search_stage(factory: str, corpus: int, queries: int, top_k: int, threads: int) -> dict:
+    import faiss
+    from app.core.config import get_settings
+    from app.services.index_factory import build_index
+
+    faiss.omp_set_num_threads(threads)
+    dimension = get_settings().EMBEDDING_MODEL_DIM
+    factory = factory_string(factory, corpus)
+    vectors = clustered_vectors(corpus, dimension, seed=1)
+    query_vectors = clustered_vectors(queries, dimension, seed=2)
+    _, truth = faiss.knn(query_vectors, vectors, top_k, faiss.METRIC_INNER_PRODUCT)
+
+    started = time.perf_counter()
+    index = build_index(dimension, factory)
+    if not index.is_trained:
+        sample_size = min(corpus, get_settings().INDEX_TRAIN_SIZE)
+        index.train(vectors[np.random.default_rng(0).choice(corpus, sample_size, replace=False)])
+    index.add_with_ids(vectors, np.arange(corpus, dtype=np.int64))
+    build_seconds = time.perf_counter() - started
+
+    with tempfile.NamedTemporaryFile(suffix=".faiss") as f:
+        faiss.write_index(index, f.name)
+        index_bytes = os.path.getsize(f.name)
+    del vectors
+
+    # One query per call, as the API searches
+    latencies, found = [], []
+    for i in range(queries):
+        started = time.perf_counter()
+        _, ids = index.search(query_vectors[i:i + 1], top_k)
+        latencies.append(time.perf_counter() - started)
+        found.append(ids[0])
+    recall = np.mean([len(set(ids) & set(expected)) / top_k for ids, expected in zip(found, truth)])
+    return {
+        "factory": factory,
+        "corpus": corpus,
+        "dimension": dimension,
+        "build_seconds": round(build_seconds, 3),
+        "index_mb": round(index_bytes / 2**20, 1),
+        "recall_at_k": round(float(recall), 4),
+        "latency": percentiles(latencies)
+    }
+
+
+# ========== End-to-end Query ==========
+def prefill(corpus: int, batch: int = 10_000) -> None:
+    """Index `corpus` chunks with mock embeddings of their text, so queries find related chunks"""
+    from app.core.config import get_settings
+    from app.services.llm_provider import mock_embedding
+    from app.services.vector_service import vector_store
+
+    settings = get_settings()
+    rng = random.Random(0)
+    for start in range(0, corpus, batch):
+        rows = min(batch, corpus - start)
+        texts = [" ".join(make_page_text(rng, 8)) for _ in range(rows)]
+        vectors = [mock_embedding(text, settings.EMBEDDING_MODEL_DIM) for text in texts]
+        metadata = [{"page_number": 1 + k % 50, "filename": f"corpus-{(start + k) // 1000}.pdf"} for k in range(rows)]
+        vector_store.add_documents(settings.DEFAULT_COLLECTION, chunks=texts, embeddings=vectors, metadata=metadata)
+
+
+async def query_stage(corpus: int, concurrency: list, requests: int, top_k: int, search_mode: str) -> dict:
+    import httpx
+    from app.main import app
+
+    report = {"corpus": corpus, "top_k": top_k, "search_mode": search_mode, "runs": []}
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        prefill(corpus)
+        report["prefill_seconds"] = round(time.perf_counter() - started, 3)
+
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None
+        ) as client:
+            async def send(text: str):
+                return await client.post(
+                    "/api/v1/message/query",
+                    json={"query": text, "top_k": top_k, "search_mode": search_mode}
+                )
+
+            rng = random.Random(1)
+            for _ in range(5):  # Warm-up
+                await send(make_page_text(rng, 1, 8)[0])
+
+            for level in concurrency:
+                # Fresh questions per level, so no run is served from the query embedding cache
+                pending = iter([make_page_text(rng, 1, 8)[0] for _ in range(requests)])
+                latencies, timings, errors = [], {}, 0
+
+                async def user():
+                    nonlocal errors
+                    for text in pending:
+                        sent = time.perf_counter()
+                        response = await send(text)
+                        if response.status_code != 200:
+                            errors += 1
+                            continue
+                        latencies.append(time.perf_counter() - sent)
+                        for key, value in response.json()["timings"].items():
+                            timings.setdefault(key, []).append(value)
+
+                started = time.perf_counter()
+                await asyncio.gather(*(user() for _ in range(level)))
+                elapsed = time.perf_counter() - started
+                report["runs"].append({
+                    "concurrency": level,
+                    "requests": requests,
+                    "errors": errors,
+                    "requests_per_second": round(requests / elapsed, 1),
+                    "latency": percentiles(latencies) if latencies else None,
+                    "server_timings_p50_ms": {key: round(median(values), 3) for key, values in timings.items()}
+                })
+    return report
+
+
+# ========== Runner ==========
+STAGES = {"ingest": ingest_stage, "search": search_stage, "query": query_stage}
+
+
+def _run_in_child(stage: str, kwargs: dict, results):
+    function = STAGES[stage]
+    # The API prints per request; keep that out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        result = function(**kwargs)
+        if asyncio.iscoroutine(result):
+            result = asyncio.run(result)
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    results.put(result)
+
+
+def run_stage(stage: str, env: dict, **kwargs) -> dict:
+    """Run a stage in a fresh spawned process, with `env` on top of this one's environment"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_in_child, args=(stage, kwargs, results))
+    saved = dict(os.environ)
+    os.environ.update(env)  # Spawned children read their settings from the environment
+    try:
+        process.start()
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+    try:
+        while True:
+            try:
+                return results.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError(f"{stage} stage exited with code {process.exitcode}")
+    finally:
+        process.join()
+
+
+def environment() -> dict:
+    import faiss
+
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "faiss": faiss.__version__,
+        "numpy": np.__version__,
+        "dimension": int(os.environ["EMBEDDING_MODEL_DIM"])
+    }
+
+
+# ========== Comparison ==========
+HIGHER_IS_BETTER = ("per_second", "recall")
+
+
+def headline_metrics(report: dict) -> dict:
+    """Flat name -> value map of the metrics compared between reports"""
+    metrics = {}
+    ingest = report["results"].get("ingest")
+    if ingest:
+        for key in ("pages_per_second", "chunks_per_second", "peak_rss_mb"):
+            metrics[f"ingest.{key}"] = ingest[key]
+    for run in report["results"].get("search", []):
+        name = f"search[{run['factory']} n={run['corpus']}]"
+        metrics[f"{name}.recall_at_k"] = run["recall_at_k"]
+        metrics[f"{name}.peak_rss_mb"] = run["peak_rss_mb"]
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            metrics[f"{name}.{key}"] = run["latency"][key]
+    query = report["results"].get("query")
+    if query:
+        metrics["query.peak_rss_mb"] = query["peak_rss_mb"]
+        for run in query["runs"]:
+            name = f"query[c={run['concurrency']}]"
+            metrics[f"{name}.requests_per_second"] = run["requests_per_second"]
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                if run["latency"]:
+                    metrics[f"{name}.{key}"] = run["latency"][key]
+    return metrics
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Print the change of every metric both reports have; returns the regressed ones"""
+    before, after = headline_metrics(baseline), headline_metrics(current)
+    regressions = []
+    print(f"{'metric':<52} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        change = (new - old) / old if old else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ""
+        if worse > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<52} {old:>12} {new:>12} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--pages", type=int, default=100, help="pages per synthetic PDF (ingest)")
+    parser.add_argument("--uploads", type=int, default=4, help="PDFs uploaded at once (ingest)")
+    parser.add_argument("--factories", nargs="+", default=DEFAULT_FACTORIES, help="FAISS factory strings; {nlist} scales with the corpus (search)")
+    parser.add_argument("--corpus", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="corpus sizes (search)")
+    parser.add_argument("--search-queries", type=int, default=1000, help="queries per index (search)")
+    parser.add_argument("--threads", type=int, default=1, help="FAISS threads (search)")
+    parser.add_argument("--query-corpus", type=int, default=10_000, help="chunks pre-loaded for the query stage")
+    parser.add_argument("--query-factory", default="Flat", help="INDEX_FACTORY for the query stage")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="concurrent clients (query)")
+    parser.add_argument("--requests", type=int, default=500, help="queries per concurrency level (query)")
+    parser.add_argument("--search-mode", default="hybrid", choices=["dense", "lexical", "hybrid"])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds of simulated latency per mock LLM call")
+    parser.add_argument("--output", help="report path (default benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    report = {"environment": environment(), "arguments": vars(args), "results": {}}
+    workdir = tempfile.mkdtemp(prefix="benchmark-suite-")
+    base_env = {
+        "MOCK_LLM_LATENCY": str(args.llm_latency),
+        "ANSWER_CACHE_ENABLED": "false",  # Measure generation on every query
+        "INGEST_QUEUE_BACKEND": "memory"
+    }
+    try:
+        if "ingest" in args.stages:
+            print(f"ingest: {args.uploads} x {args.pages} pages", file=sys.stderr)
+            report["results"]["ingest"] = run_stage("ingest", {
+                **base_env,
+                "PERSIST_INDEX": "true",
+                "FAISS_INDEX_DIR": os.path.join(workdir, "ingest", "index"),
+                "UPLOAD_DIR": os.path.join(workdir, "ingest", "uploads")
+            }, pages=args.pages, uploads=args.uploads)
+
+        if "search" in args.stages:
+            report["results"]["search"] = []
+            for corpus in args.corpus:
+                for factory in args.factories:
+                    print(f"search: {factory_string(factory, corpus)} over {corpus} vectors", file=sys.stderr)
+                    report["results"]["search"].append(run_stage(
+                        "search", base_env, factory=factory, corpus=corpus,
+                        queries=args.search_queries, top_k=args.top_k, threads=args.threads
+                    ))
+
+        if "query" in args.stages:
+            print(f"query: {args.query_corpus} chunks, concurrency {args.concurrency}", file=sys.stderr)
+            report["results"]["query"] = run_stage("query", {
+                **base_env,
+                "PERSIST_INDEX": "false",
+                "INDEX_FACTORY": args.query_factory,
+                "FAISS_INDEX_DIR": os.path.join(workdir, "query", "index"),
+                "UPLOAD_DIR": os.path.join(workdir, "query", "uploads")
+            }, corpus=args.query_corpus, concurrency=args.concurrency, requests=args.requests,
+                top_k=args.top_k, search_mode=args.search_mode)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output
+    if output is None:
+        commit = (report["environment"]["commit"] or "unknown")[:10]
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(os.path.dirname(__file__), "results", f"{stamp}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    print(f"Report written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            sys.exit(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Synthetic inputs for the benchmarks: text PDFs generated without a PDF library"""
+import random
+from typing import List
+
+WORDS = (
+    "retrieval augmented generation vector index embedding chunk page document query answer "
+    "latency throughput memory recall precision invoice contract policy clause section table "
+    "figure revenue quarter customer support network storage compute cluster shard replica"
+).split()
+
+
+def make_page_text(rng: random.Random, lines: int = 45, words_per_line: int = 12) -> List[str]:
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_line)) + "." for _ in range(lines)]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: int, seed: int = 0, lines_per_page: int = 45) -> bytes:
+    """Build a minimal valid PDF with `pages` pages of random text in Helvetica"""
+    rng = random.Random(seed)
+    objects = []  # object bodies; object n is objects[n - 1]
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")  # patched once the page tree exists
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for _ in range(pages):
+        lines = make_page_text(rng, lines_per_page)
+        stream = "BT /F1 9 Tf 11 TL 50 760 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        data = stream.encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids).encode()
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref)
+    return bytes(out)
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# Settings are read once at import, so point the app at throwaway state before any test imports it
+_state = tempfile.mkdtemp(prefix="rag-app-tests-")
+os.environ.update({
+    "LLM_BACKEND": "mock",
+    "OPENAI_API_KEY": "test",
+    "EMBEDDING_MODEL_DIM": "64",
+    "FAISS_INDEX_DIR": os.path.join(_state, "faiss_index"),
+    "UPLOAD_DIR": os.path.join(_state, "uploads"),
+    "CHUNK_EMBEDDING_STORE_PATH": "",
+    "PERSIST_INDEX": "false",
+    "PDF_PROCESS_WORKERS": "0",
+    "INGEST_BATCH_CHUNKS": "8",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,45 @@
+import numpy as np
+
+from app.services.answer_cache import SemanticAnswerCache, history_fingerprint
+
+DIMENSION = 8
+CHUNKS = ["default:1", "default:2"]
+
+
+def at_similarity(similarity: float) -> np.ndarray:
+    """Unit vector with the given cosine similarity to the first axis"""
+    vector = np.zeros(DIMENSION, dtype=np.float32)
+    vector[0], vector[1] = similarity, np.sqrt(1 - similarity ** 2)
+    return vector
+
+
+def filled_cache() -> SemanticAnswerCache:
+    cache = SemanticAnswerCache(DIMENSION, max_entries=10, threshold=0.95)
+    cache.store(at_similarity(1.0), CHUNKS, history_fingerprint([]), "cached answer", 120.0, corpus_version=1)
+    return cache
+
+
+def test_hit_above_threshold():
+    cache = filled_cache()
+    entry = cache.lookup(at_similarity(0.97), CHUNKS, history_fingerprint([]), corpus_version=1)
+    assert entry is not None and entry["answer"] == "cached answer"
+    assert cache.get_stats()["saved_generation_ms"] == 120.0
+
+
+def test_miss_below_threshold():
+    cache = filled_cache()
+    assert cache.lookup(at_similarity(0.9), CHUNKS, history_fingerprint([]), corpus_version=1) is None
+    assert cache.get_stats()["hits"] == 0
+
+
+def test_miss_when_context_differs():
+    cache = filled_cache()
+    history = [{"role": "user", "content": "earlier question"}]
+    assert cache.lookup(at_similarity(1.0), CHUNKS[:1], history_fingerprint([]), corpus_version=1) is None
+    assert cache.lookup(at_similarity(1.0), CHUNKS, history_fingerprint(history), corpus_version=1) is None
+
+
+def test_corpus_change_clears_the_cache():
+    cache = filled_cache()
+    assert cache.lookup(at_similarity(1.0), CHUNKS, history_fingerprint([]), corpus_version=2) is None
+    assert cache.get_stats()["entries"] == 0
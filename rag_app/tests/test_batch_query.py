@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app.api.routes import messages
+from app.core.config import get_settings
+from app.main import app
+from app.services.llm_provider import mock_embedding
+from app.services.vector_service import vector_store
+
+settings = get_settings()
+COLLECTION = "batch-test"
+QUESTIONS = ["what is the refund policy?", "how is revenue reported?", "which network storage is used?"]
+
+
+def fill_collection():
+    chunks = [
+        "The refund policy allows returns within 30 days.",
+        "Quarterly revenue is reported per customer segment.",
+        "The cluster uses replicated network storage with three shards."
+    ]
+    metadata = [{"page_number": i + 1, "filename": "policy.pdf"} for i in range(len(chunks))]
+    vector_store.add_documents(
+        COLLECTION,
+        chunks=chunks,
+        embeddings=[mock_embedding(chunk, settings.EMBEDDING_MODEL_DIM) for chunk in chunks],
+        metadata=metadata
+    )
+
+
+def post_batch(client: TestClient, **body) -> list:
+    response = client.post("/api/v1/message/query/batch", json={"collections": [COLLECTION], **body})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_results_stream_in_completion_order_then_summary(monkeypatch):
+    generate_answer = messages.rag_service.generate_answer
+
+    async def slow_first(query, context_chunks, conversation_history):
+        if query == QUESTIONS[0]:
+            await asyncio.sleep(0.2)
+        return await generate_answer(query=query, context_chunks=context_chunks, conversation_history=conversation_history)
+
+    monkeypatch.setattr(messages.rag_service, "generate_answer", slow_first)
+    with TestClient(app) as client:
+        fill_collection()
+        lines = post_batch(client, queries=QUESTIONS)
+
+    results, summary = lines[:-1], lines[-1]
+    # Each line is sent as its answer completes; `index` maps it back to the question
+    assert [result["index"] for result in results][-1] == 0
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+    for result in results:
+        assert result["query"] == QUESTIONS[result["index"]]
+        assert result["answer"].startswith(f"Mock answer to: {result['query']}")
+        assert result["sources"] and result["error"] is None
+    assert summary["done"] is True
+    assert (summary["queries"], summary["failed"]) == (3, 0)
+    assert "total_ms" in summary["timings"]
+
+
+def test_failed_question_does_not_stop_the_batch(monkeypatch):
+    # Worded differently from the other tests, so no answer comes from the answer cache
+    questions = [question.replace("?", " exactly?") for question in QUESTIONS]
+
+    async def fail_second(query, context_chunks, conversation_history):
+        if query == questions[1]:
+            raise RuntimeError("generation failed")
+        return "ok"
+
+    monkeypatch.setattr(messages.rag_service, "generate_answer", fail_second)
+    with TestClient(app) as client:
+        fill_collection()
+        lines = post_batch(client, queries=questions)
+
+    by_index = {line["index"]: line for line in lines[:-1]}
+    assert by_index[1]["answer"] is None and "generation failed" in by_index[1]["error"]
+    assert by_index[0]["answer"] == by_index[2]["answer"] == "ok"
+    assert (lines[-1]["queries"], lines[-1]["failed"]) == (3, 1)
+
+
+def test_sources_only_and_batch_limit(monkeypatch):
+    with TestClient(app) as client:
+        fill_collection()
+        lines = post_batch(client, queries=QUESTIONS[:2], generate=False)
+        assert all(line["answer"] is None and line["sources"] for line in lines[:-1])
+
+        monkeypatch.setattr(settings, "BATCH_QUERY_MAX_QUERIES", 2)
+        response = client.post("/api/v1/message/query/batch", json={"queries": QUESTIONS})
+        assert response.status_code == 400
@@ -0,0 +1,32 @@
+from app.services.chunk_store import ChunkStore
+from app.services.embedding_cache import content_hash
+
+
+def add(store: ChunkStore, filename: str, chunks: list) -> int:
+    hashes = [content_hash(chunk) for chunk in chunks]
+    keep = store.new_rows(hashes, [filename] * len(chunks))
+    if keep:
+        store.append([chunks[i] for i in keep], [{"filename": filename} for _ in keep], [hashes[i] for i in keep])
+    return len(keep)
+
+
+def test_same_content_in_another_file_is_indexed():
+    store = ChunkStore()
+    assert add(store, "x.pdf", ["alpha", "beta", "alpha"]) == 2
+    assert add(store, "x.pdf", ["alpha", "gamma"]) == 1
+    assert add(store, "y.pdf", ["alpha", "beta"]) == 2
+    assert len(store.rows_for_files(["y.pdf"])) == 2
+
+    store.delete_file("x.pdf")
+    assert store.live == 2
+    assert sorted(store.text(int(row)) for row in store.rows_for_files(["y.pdf"])) == ["alpha", "beta"]
+
+
+def test_deleted_content_can_be_added_again():
+    store = ChunkStore()
+    add(store, "x.pdf", ["alpha"])
+    add(store, "y.pdf", ["alpha"])
+    store.delete_file("x.pdf")
+    assert add(store, "x.pdf", ["alpha"]) == 1
+    assert add(store, "y.pdf", ["alpha"]) == 0
+    assert add(store.compacted(), "y.pdf", ["alpha"]) == 0
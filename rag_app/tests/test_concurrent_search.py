@@ -0,0 +1,35 @@
+import random
+
+import numpy as np
+
+from app.services.embedding_service import VectorStoreService
+from benchmarks.concurrent_search import EMBEDDING_DIM, Stress, final_check, make_file
+
+
+def test_searches_stay_consistent_during_writes():
+    """Lock-free searches while writers add, delete, replace and compact (see benchmarks.concurrent_search)"""
+    store = VectorStoreService()
+    rng, np_rng = random.Random(0), np.random.default_rng(0)
+    base_vectors = {}
+    for i in range(8):
+        filename = f"base-{i}.pdf"
+        texts, vectors, metadata = make_file(rng, np_rng, filename, 0, 100, EMBEDDING_DIM)
+        store.add_documents(texts, vectors, metadata)
+        base_vectors[filename] = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    live_files = []
+    for w in range(2):
+        for j in range(3):
+            filename = f"live-{w}-{j}.pdf"
+            store.add_documents(*make_file(rng, np_rng, filename, 0, 20, EMBEDDING_DIM))
+            live_files.append(filename)
+
+    stress = Stress(store, base_vectors, live_files, batch=40)
+    report = stress.run(readers=3, writers=2, seconds=2.0, compact_interval=0.2)
+
+    assert dict(stress.errors) == {}, stress.examples
+    assert report["writes"]["add"] and report["writes"]["delete"] and report["writes"]["replace"]
+    assert report["query_latency"]["count"] > 0
+    final = final_check(store)
+    assert final["vectors_match_rows"] and final["bm25_docs_match_rows"]
+    assert final["file_rows_match_live"] and final["ids_round_trip"]
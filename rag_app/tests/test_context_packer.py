@@ -0,0 +1,57 @@
+from app.core.config import get_settings
+from app.services.context_packer import SOURCE_SEPARATOR, pack_chunks, pack_history, source_block
+from app.services.tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+settings = get_settings()
+MODEL = "gpt-4o"
+
+
+def chunk(words: int, page: int = 1) -> dict:
+    return {"content": " ".join(f"word{i}" for i in range(words)), "page_number": page}
+
+
+def packed_tokens(packed: list) -> int:
+    separator = count_tokens(SOURCE_SEPARATOR, MODEL)
+    return sum(count_tokens(source_block(i + 1, c), MODEL) for i, c in enumerate(packed)) + separator * (len(packed) - 1)
+
+
+def test_chunks_fill_the_budget_in_rank_order():
+    chunks = [chunk(50, 1), chunk(2000, 2), chunk(50, 3)]
+    first = count_tokens(source_block(1, chunks[0]), MODEL)
+    budget = first + count_tokens(SOURCE_SEPARATOR, MODEL) + settings.CONTEXT_MIN_CHUNK_TOKENS * 3
+
+    packed, counts = pack_chunks(chunks, budget, MODEL)
+
+    assert counts["context"] == packed_tokens(packed) <= budget
+    assert packed[0] == chunks[0]
+    # The long second chunk is trimmed to what is left; nothing fits after it
+    assert packed[1]["page_number"] == 2
+    assert chunks[1]["content"].startswith(packed[1]["content"]) and packed[1]["content"] != chunks[1]["content"]
+    assert counts == {"context": counts["context"], "chunks_used": 2, "chunks_trimmed": 1, "chunks_dropped": 1}
+
+
+def test_chunk_too_big_for_the_remainder_is_dropped_for_a_shorter_one():
+    short = {"content": "ok", "page_number": 3}
+    chunks = [chunk(50, 1), chunk(2000, 2), short]
+    budget = (
+        count_tokens(source_block(1, chunks[0]), MODEL)
+        + count_tokens(SOURCE_SEPARATOR, MODEL)
+        + count_tokens(source_block(2, short), MODEL)
+    )
+
+    packed, counts = pack_chunks(chunks, budget, MODEL)
+
+    assert packed == [chunks[0], short]
+    assert counts["context"] == packed_tokens(packed) <= budget
+    assert (counts["chunks_trimmed"], counts["chunks_dropped"]) == (0, 1)
+
+
+def test_history_keeps_the_most_recent_messages_within_budget():
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": chunk(40)["content"]} for i in range(6)]
+    cost = MESSAGE_OVERHEAD_TOKENS + count_tokens(history[0]["content"], MODEL)
+
+    kept, used = pack_history(history, cost * 2, MODEL)
+
+    assert kept == history[-2:]
+    assert used == cost * 2
+    assert pack_history(history, 0, MODEL) == ([], 0)
@@ -0,0 +1,37 @@
+import pytest
+
+from app.services.lexical_index import reciprocal_rank_fusion, weighted_fusion
+
+DENSE = [(1, 0.9), (2, 0.5), (3, 0.1)]
+LEXICAL = [(3, 10.0), (4, 5.0), (5, 0.0)]
+
+
+def rows(hits):
+    return [row for row, _ in hits]
+
+
+def test_weighted_fusion_follows_alpha():
+    assert rows(weighted_fusion(DENSE, LEXICAL, 0.7, 5)) == [1, 2, 3, 4, 5]
+    assert rows(weighted_fusion(DENSE, LEXICAL, 0.3, 5)) == [3, 4, 1, 2, 5]
+    assert rows(weighted_fusion(DENSE, LEXICAL, 0.3, 2)) == [3, 4]
+
+
+def test_weighted_fusion_min_max_normalises_each_list():
+    fused = dict(weighted_fusion(DENSE, LEXICAL, 1.0, 5))
+    assert fused[1] == pytest.approx(1.0)
+    assert fused[2] == pytest.approx(0.5)
+    assert fused[3] == pytest.approx(0.0)
+    assert fused[4] == 0.0
+
+
+def test_reciprocal_rank_fusion_ranks_by_position_only():
+    dense = [(1, 0.9), (2, 0.8), (3, 0.7)]
+    lexical = [(3, 40.0), (1, 2.0), (4, 1.0)]
+    hits = reciprocal_rank_fusion(dense, lexical, 0.5, 4, k=60)
+    # Found by both retrievers beats found by one
+    assert rows(hits) == [1, 3, 2, 4]
+    assert hits[0][1] == pytest.approx(0.5 / 61 + 0.5 / 62)
+
+    rescaled = [(row, score * 1000) for row, score in lexical]
+    assert rows(reciprocal_rank_fusion(dense, rescaled, 0.5, 4, k=60)) == rows(hits)
+    assert rows(reciprocal_rank_fusion(dense, lexical, 1.0, 4, k=60))[:3] == [1, 2, 3]
@@ -0,0 +1,121 @@
+import asyncio
+import os
+
+from app.services.chunker import Chunk
+from app.services.doc_service import doc_process
+from app.services.ingestion_service import ingestion_service, new_job
+from app.services.vector_service import vector_store
+from benchmarks.synthetic import make_pdf
+
+
+def ingest(filename: str, pdf: bytes, collection: str, replace: bool = False) -> dict:
+    """Run one ingestion job to completion, as a worker would"""
+    job = new_job(filename, collection, replace=replace)
+    os.makedirs(os.path.dirname(ingestion_service.spool_path(job["job_id"])), exist_ok=True)
+    with open(ingestion_service.spool_path(job["job_id"]), "wb") as f:
+        f.write(pdf)
+    ingestion_service.submit(job)
+    ingestion_service.store.claim_next()
+    asyncio.run(ingestion_service._run(job))
+    return ingestion_service.get_job(job["job_id"])
+
+
+def file_chunks(collection: str, filename: str) -> list:
+    store = vector_store.get(collection)
+    return sorted(store.chunks.text(int(row)) for row in store.chunks.rows_for_files([filename]))
+
+
+def test_replace_swaps_versions():
+    job = ingest("doc.pdf", make_pdf(6, seed=1), "replace-ok")
+    assert job["status"] == "completed" and job["chunks_indexed"] > 0
+    old = file_chunks("replace-ok", "doc.pdf")
+
+    job = ingest("doc.pdf", make_pdf(4, seed=2), "replace-ok", replace=True)
+    assert job["status"] == "completed"
+    assert job["deleted_chunks"] == len(old)
+    new = file_chunks("replace-ok", "doc.pdf")
+    assert len(new) == job["chunks_indexed"]
+    assert not set(new) & set(old)
+
+
+def test_replace_failing_midway_keeps_old_version(monkeypatch):
+    job = ingest("doc.pdf", make_pdf(6, seed=3), "replace-fail")
+    old = file_chunks("replace-fail", "doc.pdf")
+    assert job["status"] == "completed" and old
+
+    embed = doc_process.embedding_pipeline.embed
+    calls = 0
+
+    async def fail_second_batch(texts, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise RuntimeError("embeddings API unavailable")
+        return await embed(texts, **kwargs)
+
+    monkeypatch.setattr(doc_process.embedding_pipeline, "embed", fail_second_batch)
+    job = ingest("doc.pdf", make_pdf(6, seed=4), "replace-fail", replace=True)
+
+    assert calls == 2
+    assert job["status"] == "failed"
+    assert job["chunks_indexed"] == 0
+    assert file_chunks("replace-fail", "doc.pdf") == old
+
+
+def test_replace_is_hidden_until_published(monkeypatch):
+    job = ingest("doc.pdf", make_pdf(6, seed=7), "replace-hidden")
+    old = file_chunks("replace-hidden", "doc.pdf")
+    store = vector_store.get("replace-hidden")
+
+    embed = doc_process.embedding_pipeline.embed
+    seen = []
+
+    async def watch_batches(texts, **kwargs):
+        # Runs before each batch is embedded, after the previous ones were staged
+        seen.append((file_chunks("replace-hidden", "doc.pdf"), store.chunks.live))
+        return await embed(texts, **kwargs)
+
+    monkeypatch.setattr(doc_process.embedding_pipeline, "embed", watch_batches)
+    job = ingest("doc.pdf", make_pdf(6, seed=8), "replace-hidden", replace=True)
+
+    assert job["status"] == "completed" and len(seen) > 1
+    assert all(chunks == old and live == len(old) for chunks, live in seen)
+    assert len(file_chunks("replace-hidden", "doc.pdf")) == job["chunks_indexed"] == store.chunks.live
+
+
+def test_failed_new_upload_leaves_nothing_indexed(monkeypatch):
+    embed = doc_process.embedding_pipeline.embed
+    calls = 0
+
+    async def fail_second_batch(texts, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise RuntimeError("embeddings API unavailable")
+        return await embed(texts, **kwargs)
+
+    monkeypatch.setattr(doc_process.embedding_pipeline, "embed", fail_second_batch)
+    job = ingest("new.pdf", make_pdf(6, seed=5), "upload-fail")
+
+    assert job["status"] == "failed"
+    assert not vector_store.has_document("upload-fail", "new.pdf")
+
+
+def test_pages_parsed_matches_page_count():
+    job = ingest("pages.pdf", make_pdf(5, seed=6), "pages")
+    assert job["status"] == "completed"
+    assert job["pages_parsed"] == 5
+
+
+def test_pages_parsed_ignores_the_tail_flush(monkeypatch):
+    async def page_chunks(pdf_path):
+        # Page 3 has no text; the chunker's held-back tail is flushed under page 2 again
+        yield 1, [Chunk("one", 0, 3, 1, 1)]
+        yield 2, [Chunk("two", 4, 7, 2, 2)]
+        yield 2, [Chunk("tail", 8, 12, 2, 2)]
+
+    async def batches():
+        return [batch async for batch in doc_process.iter_batches("unused.pdf", "tail.pdf", batch_size=1)]
+
+    monkeypatch.setattr(doc_process, "iter_page_chunks", page_chunks)
+    assert [batch["pages_parsed"] for batch in asyncio.run(batches())] == [1, 2, 2]
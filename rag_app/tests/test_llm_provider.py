@@ -0,0 +1,69 @@
+import asyncio
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.llm_provider import LLMProvider
+
+settings = get_settings()
+
+
+def test_mock_embeddings_are_deterministic_and_normalized():
+    provider = LLMProvider()
+    texts = ["refund policy for orders", "refund policy", "network storage cluster"]
+    first = np.array(asyncio.run(provider.embed(texts)))
+    second = np.array(asyncio.run(provider.embed(texts[::-1])))[::-1]
+
+    assert first.shape == (3, settings.EMBEDDING_MODEL_DIM)
+    assert np.allclose(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0)
+    # Texts sharing words are closer than unrelated ones
+    assert first[0] @ first[1] > first[0] @ first[2]
+
+
+def test_mock_chat_and_stream_agree():
+    provider = LLMProvider()
+    messages = [{"role": "user", "content": "[Source 1 - Page 2]\nSome text\n\nQuestion: what is covered?"}]
+
+    async def both():
+        reply = await provider.chat(messages)
+        streamed = "".join([delta async for delta in provider.chat_stream(messages)])
+        return reply, streamed
+
+    reply, streamed = asyncio.run(both())
+    assert reply == "Mock answer to: what is covered? [Source 1]"
+    assert streamed == reply
+
+
+def test_slow_call_is_hedged(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY", 0.05)
+    provider = LLMProvider()
+    attempts = []
+
+    async def request():
+        attempts.append(len(attempts))
+        # The first attempt stalls; the hedge answers at once
+        await asyncio.sleep(5 if len(attempts) == 1 else 0)
+        return len(attempts)
+
+    assert asyncio.run(asyncio.wait_for(provider._call(request, hedge=True), timeout=2)) == 2
+    assert provider.hedged_requests == 1
+    assert asyncio.run(provider._call(request, hedge=False)) == 3
+
+
+def test_calls_in_flight_are_capped(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY", 2)
+    provider = LLMProvider()
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        peak = max(peak, provider.in_flight)
+        await asyncio.sleep(0.01)
+
+    async def burst():
+        await asyncio.gather(*(provider._call(request, hedge=False) for _ in range(8)))
+
+    asyncio.run(burst())
+    assert peak == 2
+    assert provider.in_flight == 0
@@ -0,0 +1,64 @@
+import types
+
+import numpy as np
+
+from app.services import embedding_cache
+from app.services.embedding_cache import QueryEmbeddingCache
+
+MODEL = "text-embedding-3-small"
+
+
+def fake_clock(monkeypatch, start: float = 1000.0) -> types.SimpleNamespace:
+    clock = types.SimpleNamespace(now=start)
+    monkeypatch.setattr(embedding_cache, "time", types.SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_hit_on_normalized_query(monkeypatch):
+    fake_clock(monkeypatch)
+    cache = QueryEmbeddingCache(max_entries=10, ttl_seconds=60)
+    vector = np.arange(4, dtype=np.float32)
+    assert cache.get(MODEL, "What is  the refund policy?") is None
+    cache.put(MODEL, "What is  the refund policy?", vector)
+
+    assert np.array_equal(cache.get(MODEL, "  what is the REFUND policy? "), vector)
+    assert cache.get("another-model", "what is the refund policy?") is None
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = fake_clock(monkeypatch)
+    cache = QueryEmbeddingCache(max_entries=10, ttl_seconds=60)
+    cache.put(MODEL, "refund policy", np.ones(4, dtype=np.float32))
+
+    clock.now += 59
+    assert cache.get(MODEL, "refund policy") is not None
+    clock.now += 2
+    assert cache.get(MODEL, "refund policy") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_disk_tier_survives_restart_but_not_ttl(monkeypatch, tmp_path):
+    clock = fake_clock(monkeypatch)
+    path = str(tmp_path / "query_cache.db")
+    QueryEmbeddingCache(ttl_seconds=60, path=path).put(MODEL, "refund policy", np.ones(4, dtype=np.float32))
+
+    restarted = QueryEmbeddingCache(ttl_seconds=60, path=path)
+    assert restarted.get(MODEL, "refund policy") is not None
+    assert restarted.get_stats()["disk_hits"] == 1
+
+    clock.now += 61
+    assert QueryEmbeddingCache(ttl_seconds=60, path=path).get(MODEL, "refund policy") is None
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    fake_clock(monkeypatch)
+    cache = QueryEmbeddingCache(max_entries=2, ttl_seconds=0)
+    for text in ("a", "b"):
+        cache.put(MODEL, text, np.ones(4, dtype=np.float32))
+    cache.get(MODEL, "a")
+    cache.put(MODEL, "c", np.ones(4, dtype=np.float32))
+    assert cache.get(MODEL, "b") is None
+    assert cache.get(MODEL, "a") is not None
+    assert cache.get_stats()["evictions"] == 1
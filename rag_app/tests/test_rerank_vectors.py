@@ -0,0 +1,44 @@
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.embedding_cache import content_hash
+from app.services.vector_service import vector_store
+
+settings = get_settings()
+
+
+def add_chunks(collection: str, count: int, store_embeddings: bool) -> tuple:
+    chunks = [f"{collection} chunk {i}" for i in range(count)]
+    hashes = [content_hash(chunk) for chunk in chunks]
+    embeddings = np.random.default_rng(count).standard_normal((count, settings.EMBEDDING_MODEL_DIM)).astype(np.float32)
+    if store_embeddings:
+        vector_store.embedding_store.put_many(settings.EMBEDDING_MODEL, hashes, embeddings)
+    vector_store.add_documents(
+        collection,
+        chunks=chunks,
+        embeddings=embeddings,
+        metadata=[{"filename": "doc.pdf", "page_number": 1}] * count,
+        content_hashes=hashes
+    )
+    results = [{"chunk_id": f"{collection}:{chunk_id}", "collection": collection} for chunk_id in range(count)]
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True), results
+
+
+def test_reduced_index_reranks_on_full_embeddings(monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_DIMENSION", 16)
+    full, results = add_chunks("reduced-full", 6, store_embeddings=True)
+
+    vectors = vector_store.stored_vectors(results + [{"chunk_id": "reduced-full:99", "collection": "reduced-full"}])
+    assert vectors.shape == (7, settings.EMBEDDING_MODEL_DIM)
+    assert np.allclose(vectors[:6], full, atol=1e-6)
+    assert not vectors[6].any()
+
+
+def test_reduced_index_falls_back_to_index_vectors(monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_DIMENSION", 16)
+    full, results = add_chunks("reduced-unstored", 5, store_embeddings=False)
+
+    vectors = vector_store.stored_vectors(results)
+    truncated = full[:, :16] / np.linalg.norm(full[:, :16], axis=1, keepdims=True)
+    assert vectors.shape == (5, 16)
+    assert np.allclose(vectors, truncated, atol=1e-6)
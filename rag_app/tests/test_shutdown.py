@@ -0,0 +1,28 @@
+import asyncio
+
+from app.services.compaction_service import compaction_service
+from app.services.ingestion_service import ingestion_service
+
+
+def test_compaction_stops_when_woken_in_the_same_tick():
+    async def cycle():
+        for _ in range(50):
+            await compaction_service.start()
+            await asyncio.sleep(0)
+            compaction_service.notify()
+            await asyncio.wait_for(compaction_service.stop(), timeout=5)
+
+    asyncio.run(cycle())
+    assert compaction_service.task is None
+
+
+def test_ingestion_workers_stop_when_woken_in_the_same_tick():
+    async def cycle():
+        for _ in range(50):
+            await ingestion_service.start()
+            await asyncio.sleep(0)
+            ingestion_service.wakeup.set()
+            await asyncio.wait_for(ingestion_service.stop(), timeout=5)
+
+    asyncio.run(cycle())
+    assert ingestion_service.workers == []
@@ -0,0 +1,33 @@
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.embedding_service import VectorStoreService
+
+settings = get_settings()
+
+
+def test_snapshot_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PERSIST_INDEX", True)
+    monkeypatch.setattr(settings, "FAISS_INDEX_DIR", str(tmp_path))
+    vectors = np.random.default_rng(0).standard_normal((20, settings.EMBEDDING_MODEL_DIM)).astype(np.float32)
+    chunks = [f"chunk {i}" for i in range(20)]
+    metadata = [{"page_number": 1 + i // 4, "filename": "a.pdf" if i < 12 else "b.pdf"} for i in range(20)]
+
+    store = VectorStoreService()
+    # Two uploads: two sidecar segments
+    store.add_documents(chunks[:12], vectors[:12], metadata[:12])
+    store.add_documents(chunks[12:], vectors[12:], metadata[12:])
+
+    restored = VectorStoreService()
+    assert restored.load() == 20
+    assert list(restored.chunks.texts()) == chunks
+    assert sorted(restored.chunks.file_names()) == ["a.pdf", "b.pdf"]
+
+    queries = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    for i in range(20):
+        before = store.search_vector("", queries[i:i + 1], 1, mode="dense")[0]
+        after = restored.search_vector("", queries[i:i + 1], 1, mode="dense")[0]
+        assert after["content"] == chunks[i]
+        assert after["filename"] == metadata[i]["filename"]
+        assert after["page_number"] == metadata[i]["page_number"]
+        assert after["chunk_id"] == before["chunk_id"]